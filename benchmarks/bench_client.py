@@ -0,0 +1,38 @@
+"""
+Cost of building a client per request, as in the Flask example.
+
+    python benchmarks/bench_client.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from spotify import Client, OAuth  # noqa: E402
+
+TOKEN = {'access_token': 'x', 'token_type': 'Bearer', 'expires_in': 3600,
+         'expires_at': 2 ** 40, 'refresh_token': 'y'}
+
+
+def get_auth(token=None):
+    auth = OAuth('CLIENT_ID', 'CLIENT_SECRET', redirect_uri='http://127.0.0.1:5000/callback')
+    auth.token = token
+    return auth
+
+
+def main(number=20000):
+    auth = get_auth(TOKEN)
+    per_client = timeit.timeit(lambda: Client(auth), number=number) / number
+    per_request = timeit.timeit(lambda: Client(get_auth(TOKEN)), number=number) / number
+    print('Client(auth):                {:8.2f} us'.format(per_client * 1e6))
+    print('Client(get_auth(token)):     {:8.2f} us'.format(per_request * 1e6))
+
+    a, b = Client(get_auth(TOKEN)), Client(get_auth(TOKEN))
+    print('Session shared by clients:   {}'.format(a.session is b.session))
+    print('Connection pools shared:     {}'.format(
+        a.session.get_adapter(a.prefix) is b.session.get_adapter(b.prefix)))
+
+
+if __name__ == '__main__':
+    main()
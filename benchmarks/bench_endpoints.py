@@ -0,0 +1,39 @@
+"""
+Import time of the endpoints module and cost of building request specs.
+
+    python benchmarks/bench_endpoints.py
+"""
+import os
+import sys
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from spotify import endpoints  # noqa: E402
+
+
+def import_time(number=200):
+    # Seconds to execute the module body, compiled once as it would be from a .pyc
+    with open(endpoints.__file__) as f:
+        code = compile(f.read(), endpoints.__file__, 'exec')
+
+    def execute():
+        exec(code, {'__name__': endpoints.__name__, '__package__': 'spotify'})
+    return timeit.timeit(execute, number=number) / number
+
+
+def main(number=200000):
+    print('import spotify.endpoints:     {:8.2f} us'.format(import_time() * 1e6))
+    calls = [
+        ('album(id, market)', lambda: endpoints.album('6ra4GIOgCZQZMOaUECftGN', market='US')),
+        ('search(q, type)', lambda: endpoints.search('frank zappa', 'artist')),
+        ('tracks(ids)', lambda: endpoints.tracks(['6ra4GIOgCZQZMOaUECftGN'] * 50)),
+    ]
+    for name, call in calls:
+        seconds = timeit.timeit(call, number=number) / number
+        print('{:28s} {:8.2f} us'.format(name + ':', seconds * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Throughput and latency of the clients against the local mock server.
+
+Measures requests per second and p50/p99 latency of single lookups (one thread,
+many threads, asyncio), id list chunking, paginate prefetching and retrying
+through injected 429s, plus memory per 10k loaded tracks and client
+construction cost. Quote its numbers with every performance change.
+
+The server runs in this process and shares the GIL with the client, use
+`--latency` for numbers closer to a real network.
+
+    python benchmarks/bench_throughput.py
+    python benchmarks/bench_throughput.py --latency 0.02 --markets 80 --only threads,asyncio
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import timeit
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from mock_server import MockSpotify, derive_id  # noqa: E402
+from spotify import Client, models  # noqa: E402
+from spotify.scheduler import RequestScheduler  # noqa: E402
+
+TOKEN = {'access_token': 'x', 'token_type': 'Bearer', 'expires_in': 3600,
+         'expires_at': 2 ** 40, 'refresh_token': 'y'}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def report(name, requests, seconds, latencies=(), unit='req'):
+    line = '{:34s} {:9.0f} {}/s'.format(name, requests / seconds, unit)
+    if latencies:
+        latencies = sorted(latencies)
+        line += '   p50 {:7.2f} ms   p99 {:7.2f} ms'.format(
+            percentile(latencies, 0.5) * 1e3, percentile(latencies, 0.99) * 1e3
+        )
+    print(line)
+
+
+def timed(call, latencies):
+    start = time.perf_counter()
+    call()
+    latencies.append(time.perf_counter() - start)
+
+
+def ids(n, kind='track'):
+    return [derive_id(kind, i) for i in range(n)]
+
+
+def bench_sequential(server, args):
+    client = server.client()
+    track_ids = ids(args.requests)
+    latencies = []
+    start = time.perf_counter()
+    for id in track_ids:
+        timed(lambda: client.api.track(id), latencies)
+    report('track(), 1 thread', len(track_ids), time.perf_counter() - start, latencies)
+
+
+def bench_threads(server, args):
+    client = server.client(max_workers=args.threads)
+    track_ids = ids(args.requests)
+    latencies = []
+    parts = [track_ids[i::args.threads] for i in range(args.threads)]
+
+    def work(part):
+        for id in part:
+            timed(lambda: client.api.track(id), latencies)
+    threads = [threading.Thread(target=work, args=(part,)) for part in parts]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report('track(), {} threads'.format(args.threads), len(track_ids),
+           time.perf_counter() - start, latencies)
+
+
+def bench_asyncio(server, args):
+    from spotify.aio import AsyncClient
+
+    async def run():
+        client = server.client(client_class=AsyncClient)
+        latencies = []
+        semaphore = asyncio.Semaphore(args.threads)
+
+        async def one(id):
+            async with semaphore:
+                start = time.perf_counter()
+                await client.api.track(id)
+                latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        await asyncio.gather(*(one(id) for id in ids(args.requests)))
+        seconds = time.perf_counter() - start
+        await client.close()
+        return seconds, latencies
+    seconds, latencies = asyncio.run(run())
+    report('track(), asyncio x{}'.format(args.threads), args.requests, seconds, latencies)
+
+
+def bench_chunked(server, args):
+    client = server.client(max_workers=args.threads)
+    track_ids = ids(1000)
+    rounds = max(1, args.requests // 20)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(rounds):
+        timed(lambda: client.api.tracks(track_ids), latencies)
+    report('tracks(1000 ids)', rounds * len(track_ids), time.perf_counter() - start,
+           latencies, unit='obj')
+
+
+def bench_paginate(server, args):
+    client = server.client(max_workers=args.threads)
+    items = 0
+    start = time.perf_counter()
+    for _ in range(3):
+        for _ in client.paginate(client.api.me_tracks, limit=50, prefetch=args.threads):
+            items += 1
+    report('paginate(me_tracks)', items, time.perf_counter() - start, unit='obj')
+
+
+def bench_throttled(server, args):
+    server.throttle, server.retry_after = args.throttle, 0.05
+    try:
+        client = server.client(max_workers=args.threads, scheduler=RequestScheduler())
+        track_ids = ids(args.requests)
+        latencies = []
+        start = time.perf_counter()
+        list(client.executor.map(
+            lambda id: timed(lambda: client.api.track(id), latencies), track_ids
+        ))
+        report('track(), {:.0%} 429s'.format(args.throttle), len(track_ids),
+               time.perf_counter() - start, latencies)
+        print('{:34s} {}'.format('', client.scheduler.stats()))
+    finally:
+        server.throttle = 0.0
+
+
+def bench_memory(server, args):
+    body = json.dumps({'tracks': [server.catalog.track(id) for id in ids(10000)]})
+    for name, load in (('dicts', json.loads), ('models', lambda b: models.load(json.loads(b)))):
+        tracemalloc.start()
+        loaded = load(body)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del loaded
+        print('{:34s} {:9.1f} MB'.format('10k tracks as ' + name, size / 2 ** 20))
+
+
+def bench_construction(server, args):
+    auth = server.auth(TOKEN)
+    number = 20000
+    seconds = timeit.timeit(lambda: Client(auth), number=number) / number
+    print('{:34s} {:9.2f} us'.format('Client(auth)', seconds * 1e6))
+
+
+BENCHMARKS = {
+    'sequential': bench_sequential,
+    'threads': bench_threads,
+    'asyncio': bench_asyncio,
+    'chunked': bench_chunked,
+    'paginate': bench_paginate,
+    'throttled': bench_throttled,
+    'memory': bench_memory,
+    'construction': bench_construction,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds the mock server adds to every response')
+    parser.add_argument('--markets', type=int, default=20,
+                        help='Length of available_markets lists, scales payloads')
+    parser.add_argument('--throttle', type=float, default=0.02,
+                        help='Fraction of 429 responses in the throttled benchmark')
+    parser.add_argument('--only', default=','.join(BENCHMARKS),
+                        help='Comma separated benchmarks, of: ' + ', '.join(BENCHMARKS))
+    args = parser.parse_args()
+
+    with MockSpotify(latency=args.latency, markets=args.markets, total=2000, seed=0) as server:
+        for name in args.only.split(','):
+            BENCHMARKS[name](server, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,686 @@
+"""
+Local stand-in for the Spotify accounts and web API, for tests and benchmarks.
+
+Serves `POST /api/token` and the `/v1` routes of `spotify.endpoints` with
+synthetic catalog data derived from the requested ids, so the same id always
+returns the same object. Latency, 429 and 5xx injection and payload size are
+configurable and can be changed while the server runs.
+
+ex.
+    with MockSpotify(latency=0.02, throttle=0.01) as server:
+        client = server.client()
+        client.api.track('4uLU6hMCjMI75M1A2tKUQC')
+
+    python benchmarks/mock_server.py --port 8080 --latency 0.05
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import requests
+import requests.adapters
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from spotify.ids import decode as decode_id  # noqa: E402
+
+MARKETS = ('AD', 'AR', 'AT', 'AU', 'BE', 'BG', 'BO', 'BR', 'CA', 'CH', 'CL', 'CO', 'CR',
+           'CY', 'CZ', 'DE', 'DK', 'DO', 'EC', 'EE', 'ES', 'FI', 'FR', 'GB', 'GR', 'GT')
+GENRES = ('rock', 'jazz', 'pop', 'metal', 'folk', 'techno', 'soul', 'blues', 'punk')
+SEARCH_OFFSET_LIMIT = 1000
+SEARCH_YEAR = re.compile(r'\s*\byear:(\d{4})(?:-(\d{4}))?')
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # Benchmarks open many connections at once
+
+
+@lru_cache(maxsize=65536)
+def derive_id(*parts):
+    """
+    Deterministic 22 character base62 id derived from `parts`, a 128 bit
+    number written like Spotify's ids (`spotify.ids.decode`).
+    """
+    return decode_id(int.from_bytes(hashlib.md5(repr(parts).encode()).digest(), 'big'))
+
+
+def _number(id, modulo):
+    return int(hashlib.md5(id.encode()).hexdigest()[:8], 16) % modulo
+
+
+class Catalog:
+    """
+    Synthetic objects, `markets` sets the length of `available_markets` lists
+    (the bulk of real catalog payloads) and `total` the size of every collection.
+    Paging `next` links point at `base`.
+    """
+
+    def __init__(self, markets=20, total=1000, base='https://api.spotify.com/v1'):
+        self.markets = markets
+        self.total = total
+        self.base = base
+
+    def _markets(self):
+        return [MARKETS[i % len(MARKETS)] for i in range(self.markets)]
+
+    def artist_simple(self, id):
+        return {
+            'id': id, 'name': 'Artist ' + id[:6], 'type': 'artist', 'uri': 'spotify:artist:' + id,
+            'href': 'https://api.spotify.com/v1/artists/' + id,
+            'external_urls': {'spotify': 'https://open.spotify.com/artist/' + id},
+        }
+
+    def artist(self, id):
+        return dict(
+            self.artist_simple(id),
+            genres=[GENRES[_number(id, len(GENRES))]], popularity=_number(id, 100),
+            followers={'href': None, 'total': _number(id, 10 ** 6)},
+            images=[{'url': 'https://i.scdn.co/image/' + id, 'height': 640, 'width': 640}],
+        )
+
+    def year(self, id):
+        """
+        Release year of an object, 1950 to 2025 with more objects in recent years.
+        """
+        return 1950 + math.isqrt(_number(id, 76 * 76))
+
+    @lru_cache(maxsize=1024)
+    def search_ids(self, q, type):
+        """
+        Ids matching the search `q`: `total` ids of the query without its
+        `year:` filter, those released in the filter's years.
+        """
+        match = SEARCH_YEAR.search(q)
+        released = self._released(SEARCH_YEAR.sub('', q).strip(), type)
+        if match is None:
+            return [id for id, year in released]
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        return [id for id, year in released if first <= year <= last]
+
+    @lru_cache(maxsize=64)
+    def _released(self, q, type):
+        ids = (derive_id(q, type, i) for i in range(self.total))
+        return [(id, self.year(id)) for id in ids]
+
+    def album_simple(self, id):
+        return {
+            'id': id, 'name': 'Album ' + id[:6], 'type': 'album', 'uri': 'spotify:album:' + id,
+            'album_type': 'album', 'href': 'https://api.spotify.com/v1/albums/' + id,
+            'release_date': '{}-01-01'.format(self.year(id)),
+            'release_date_precision': 'day', 'total_tracks': 12,
+            'artists': [self.artist_simple(derive_id(id, 'artist'))],
+            'available_markets': self._markets(),
+            'images': [{'url': 'https://i.scdn.co/image/' + id, 'height': 640, 'width': 640}],
+            'external_urls': {'spotify': 'https://open.spotify.com/album/' + id},
+        }
+
+    def album(self, id):
+        album = self.album_simple(id)
+        album.update(
+            label='Label ' + id[:3], popularity=_number(id, 100), genres=[],
+            copyrights=[{'text': '(C) Label', 'type': 'C'}],
+            external_ids={'upc': str(_number(id, 10 ** 12))},
+            tracks=self.page(
+                '/albums/{}/tracks'.format(id), {},
+                lambda i: self.track_simple(derive_id(id, i)), total=12
+            ),
+        )
+        return album
+
+    def track_simple(self, id):
+        return {
+            'id': id, 'name': 'Track ' + id[:6], 'type': 'track', 'uri': 'spotify:track:' + id,
+            'href': 'https://api.spotify.com/v1/tracks/' + id,
+            'duration_ms': 120000 + _number(id, 240000), 'explicit': False,
+            'disc_number': 1, 'track_number': 1 + _number(id, 12), 'is_local': False,
+            'preview_url': None, 'artists': [self.artist_simple(derive_id(id, 'artist'))],
+            'available_markets': self._markets(),
+            'external_urls': {'spotify': 'https://open.spotify.com/track/' + id},
+        }
+
+    def track(self, id):
+        return dict(
+            self.track_simple(id), album=self.album_simple(derive_id(id, 'album')),
+            popularity=_number(id, 100), external_ids={'isrc': 'US' + id[:10].upper()},
+        )
+
+    def audio_features(self, id):
+        n = _number(id, 1000)
+        return {
+            'id': id, 'type': 'audio_features', 'uri': 'spotify:track:' + id,
+            'danceability': n / 1000, 'energy': (n * 7 % 1000) / 1000, 'key': n % 12,
+            'loudness': -(n % 30) - 0.5, 'mode': n % 2, 'speechiness': (n % 100) / 1000,
+            'acousticness': (n * 3 % 1000) / 1000, 'instrumentalness': (n * 5 % 1000) / 1000,
+            'liveness': (n * 11 % 1000) / 1000, 'valence': (n * 13 % 1000) / 1000,
+            'tempo': 60 + n % 140 + 0.5, 'duration_ms': 120000 + n * 240,
+            'time_signature': 4,
+        }
+
+    def user(self, id):
+        return {'id': id, 'type': 'user', 'uri': 'spotify:user:' + id, 'display_name': id,
+                'followers': {'href': None, 'total': 0}, 'country': 'US', 'product': 'premium'}
+
+    def playlist_simple(self, id, owner_id):
+        return {
+            'id': id, 'name': 'Playlist ' + id[:6], 'type': 'playlist',
+            'uri': 'spotify:playlist:' + id, 'collaborative': False, 'public': True,
+            'owner': self.user(owner_id), 'snapshot_id': derive_id(id, 'snapshot'),
+            'href': 'https://api.spotify.com/v1/playlists/' + id,
+            'tracks': {'href': None, 'total': self.total},
+        }
+
+    def playlist(self, id, owner_id):
+        return dict(
+            self.playlist_simple(id, owner_id), description='', followers={'total': 0},
+            tracks=self.playlist_tracks(id, owner_id, {}),
+        )
+
+    def playlist_tracks(self, id, owner_id, query):
+        return self.page(
+            '/users/{}/playlists/{}/tracks'.format(owner_id, id), query,
+            lambda i: self.saved(self.track(derive_id(id, i)), i), limit=100
+        )
+
+    def saved(self, obj, i, key='track'):
+        return {'added_at': '2020-01-01T00:00:{:02d}Z'.format(i % 60), key: obj}
+
+    def page(self, path, query, item, total=None, limit=20):
+        """
+        Offset paging object of `total` items built by `item(index)`.
+        """
+        total = self.total if total is None else total
+        offset = int(query.get('offset', 0))
+        limit = int(query.get('limit', limit))
+        end = min(total, offset + limit)
+        next_url = None
+        if end < total:
+            next_url = '{}{}?{}'.format(
+                self.base, path, urlencode(dict(query, offset=end, limit=limit))
+            )
+        return {
+            'href': self.base + path, 'items': [item(i) for i in range(offset, end)],
+            'limit': limit, 'offset': offset, 'total': total, 'next': next_url,
+            'previous': None,
+        }
+
+    def cursor_page(self, path, query, item, cursor='after', total=None):
+        """
+        Cursor paging object, the cursor is the index of the next item.
+        """
+        total = self.total if total is None else total
+        start = int(query.get(cursor) or 0)
+        limit = int(query.get('limit', 20))
+        end = min(total, start + limit)
+        next_url = None
+        if end < total:
+            next_url = '{}{}?{}'.format(
+                self.base, path, urlencode(dict(query, **{cursor: end}))
+            )
+        return {
+            'href': self.base + path, 'items': [item(i) for i in range(start, end)],
+            'limit': limit, 'next': next_url, 'cursors': {cursor: str(end)}, 'total': total,
+        }
+
+
+def _ids(query):
+    return [id for id in query.get('ids', '').split(',') if id]
+
+
+def _parse_fields(fields):
+    # Spotify's fields filter, 'a,b(c,d(e))' -> {'a': None, 'b': {'c': None, 'd': {'e': None}}}
+    tree = node = {}
+    parents = []
+    name = ''
+    for char in fields + ',':
+        if char == '(':
+            parents.append(node)
+            node[name] = {}
+            node = node[name]
+            name = ''
+        elif char in ',)':
+            if name:
+                node[name] = None
+            name = ''
+            if char == ')':
+                node = parents.pop()
+        else:
+            name += char
+    return tree
+
+
+def _select(value, tree):
+    # The fields of `tree` in `value`, applied to every element of lists
+    if tree is None or not isinstance(value, (dict, list)):
+        return value
+    if isinstance(value, list):
+        return [_select(element, tree) for element in value]
+    return {key: _select(value[key], subtree) for key, subtree in tree.items() if key in value}
+
+
+def _known(id):
+    # Ids starting with 000000 play the part of unknown tracks, albums and artists
+    return not id.startswith('000000')
+
+
+class MockSpotify:
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, throttle=0.0,
+                 retry_after=0.1, errors=0.0, markets=20, total=1000, seed=None):
+        """
+        Args:
+            host(str), port(int): Address to listen on, port 0 picks a free one
+            latency(float): Seconds added to every response
+            jitter(float): Max random seconds added on top of `latency`
+            throttle(float): Fraction of API requests answered with 429
+            retry_after(float): `Retry-After` seconds of the 429 responses
+            errors(float): Fraction of API requests answered with 503
+            markets(int): Length of `available_markets` lists, scales payload size
+            total(int): Number of items of every paged collection
+            seed(int): Optional, seeds the fault injection
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.errors = errors
+        self.catalog = Catalog(markets, total)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._snapshots = 0
+        self._users = {}  # Access token -> user (the refresh token)
+        self._listeners = {}  # User -> (start, seconds between plays)
+        self._local = threading.local()
+        self.counts = {'requests': 0, 'token': 0, 'throttled': 0, 'errors': 0,
+                       'not_modified': 0}
+        self.log = None  # Set to a list to record the (method, path, body) of API requests
+        self._routes = [
+            (method, re.compile('^/v1' + pattern + '$'), handler)
+            for method, pattern, handler in self._route_table()
+        ]
+        self.httpd = _Server((host, port), self._handler_class())
+        self.catalog.base = self.url + '/v1'
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def auth(self, token=None, **kwargs):
+        """
+        `OAuth` requesting its tokens from this server.
+        """
+        from spotify import OAuth
+        auth = OAuth('CLIENT_ID', 'CLIENT_SECRET', **kwargs)
+        auth.TOKEN_URL = self.url + '/api/token'
+        auth.token = token
+        if token is None:
+            auth.request_client_credentials()
+        return auth
+
+    def user_token(self, user, expires_in=3600):
+        """
+        Token of a user authorized on this server, `user` is its refresh token.
+        """
+        token = self._token(user, expires_in)
+        token['expires_at'] = int(time.time()) + expires_in
+        return token
+
+    def listen(self, user, every):
+        """
+        Make `user` play a track every `every` seconds from now on, None for never.
+        Their plays are served by the recently played and currently playing routes.
+        """
+        with self._lock:
+            self._listeners[user] = (time.time(), every)
+
+    def _token(self, user=None, expires_in=3600):
+        token = {'access_token': derive_id('token', time.monotonic(), user),
+                 'token_type': 'Bearer', 'expires_in': expires_in, 'scope': ''}
+        if user is not None:
+            token['refresh_token'] = user
+            with self._lock:
+                self._users[token['access_token']] = user
+        return token
+
+    def _plays(self):
+        # Play times (ms) of the requesting user so far, oldest first
+        with self._lock:
+            user = self._users.get(self._local.token)
+            start, every = self._listeners.get(user, (0, None))
+        if every is None:
+            return user, []
+        count = int((time.time() - start) / every)
+        return user, [int((start + every * (k + 1)) * 1000) for k in range(count)]
+
+    def session(self, pool_maxsize=64):
+        session = requests.Session()
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize))
+        return session
+
+    def client(self, auth=None, client_class=None, **kwargs):
+        """
+        `Client` (or `client_class`) sending its requests to this server.
+        """
+        if client_class is None:
+            from spotify import Client as client_class
+        if 'requests_session' not in kwargs and client_class.__name__ == 'Client':
+            kwargs['requests_session'] = self.session()
+        client = client_class(auth or self.auth(), **kwargs)
+        client.prefix = self.url + '/v1'
+        return client
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def _snapshot(self):
+        with self._lock:
+            self._snapshots += 1
+            return derive_id('snapshot', self._snapshots)
+
+    def handle(self, method, path, query, body, token=None, if_none_match=None):
+        """
+        Returns `(status, headers, body)` for a request, `body` is JSON-able or None.
+        Playlist responses carry an ETag, matching `if_none_match` gives a 304.
+        """
+        self._local.token = token
+        if path == '/api/token':
+            self._count('token')
+            grant = body.get('grant_type')
+            user = None
+            if grant in ('authorization_code', 'refresh_token'):
+                user = body.get('refresh_token') or derive_id('refresh')
+            return 200, {}, self._token(user)
+        self._count('requests')
+        if self.log is not None:
+            self.log.append((method, path, body))
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        roll = self._random.random()
+        if roll < self.throttle:
+            self._count('throttled')
+            return 429, {'Retry-After': str(self.retry_after)}, {
+                'error': {'status': 429, 'message': 'API rate limit exceeded'}}
+        if roll < self.throttle + self.errors:
+            self._count('errors')
+            return 503, {}, {'error': {'status': 503, 'message': 'Service unavailable'}}
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(path)
+            if match and route_method == method:
+                result = handler(query, body, *match.groups())
+                if isinstance(result, tuple):
+                    return result[0], {}, result[1]
+                if query.get('fields'):
+                    result = _select(result, _parse_fields(query['fields']))
+                if method == 'GET' and '/playlists/' in path:
+                    etag = '"{}"'.format(hashlib.md5(
+                        json.dumps(result, sort_keys=True).encode()).hexdigest())
+                    if etag == if_none_match:
+                        self._count('not_modified')
+                        return 304, {'ETag': etag}, None
+                    return 200, {'ETag': etag}, result
+                return 200, {}, result
+        return 404, {}, {'error': {'status': 404, 'message': 'Service not found'}}
+
+    def _route_table(self):
+        c = self.catalog
+
+        def several(key, build, limit):
+            def handler(query, body):
+                ids = _ids(query)
+                if len(ids) > limit:
+                    return 400, {'error': {'status': 400, 'message': 'Too many ids requested'}}
+                return {key: [build(id) if _known(id) else None for id in ids]}
+            return handler
+
+        def one(build):
+            def handler(query, body, id):
+                if not _known(id):
+                    return 404, {'error': {'status': 404, 'message': 'non existing id'}}
+                return build(id)
+            return handler
+
+        def contains(query, body, *args):
+            return [bool(_number(id, 2)) for id in _ids(query)]
+
+        def empty(query, body, *args):
+            return None
+
+        def snapshot(query, body, *args):
+            if len((body or {}).get('uris') or (body or {}).get('tracks') or ()) > 100:
+                return 400, {'error': {'status': 400, 'message': 'Too many tracks'}}
+            return 201, {'snapshot_id': self._snapshot()}
+
+        def search(query, body):
+            if int(query.get('offset', 0)) + int(query.get('limit', 20)) > SEARCH_OFFSET_LIMIT:
+                return 400, {'error': {'status': 400, 'message': 'Bad search offset'}}
+            builds = {'track': c.track, 'album': c.album_simple, 'artist': c.artist,
+                      'playlist': lambda id: c.playlist_simple(id, 'owner')}
+            results = {}
+            for type in query.get('type', 'track').split(','):
+                ids = c.search_ids(query.get('q', ''), type)
+                results[type + 's'] = c.page(
+                    '/search', query, lambda i: builds[type](ids[i]), total=len(ids)
+                )
+            return results
+
+        def recently_played(query, body):
+            user, plays = self._plays()
+            if user is None:
+                # Users not listening through `listen` get a fixed history
+                return c.cursor_page(
+                    '/me/player/recently-played', query,
+                    lambda i: {'played_at': '2020-01-01T00:00:00Z',
+                               'track': c.track(derive_id('played', i))},
+                    cursor='before', total=min(c.total, 50))
+            limit = int(query.get('limit', 20))
+            if query.get('after'):
+                # The oldest plays after the cursor
+                plays = [t for t in plays if t > int(query['after'])][:limit]
+            else:
+                if query.get('before'):
+                    plays = [t for t in plays if t < int(query['before'])]
+                plays = plays[-limit:]
+            items = [{
+                'played_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(t // 1000))
+                + '.{:03d}Z'.format(t % 1000),
+                'track': c.track_simple(derive_id('played', user, t)),
+                'context': None,
+            } for t in reversed(plays)]
+            cursors = {'after': str(plays[-1]), 'before': str(plays[0])} if plays else None
+            return {'items': items, 'limit': limit, 'cursors': cursors, 'next': None,
+                    'href': c.base + '/me/player/recently-played'}
+
+        def currently_playing(query, body):
+            user, plays = self._plays()
+            if not plays:
+                return None
+            return {'is_playing': True, 'timestamp': plays[-1], 'progress_ms': 0,
+                    'item': c.track_simple(derive_id('playing', user, plays[-1])),
+                    'context': None, 'currently_playing_type': 'track'}
+
+        def me_following(query, body):
+            return {'artists': c.cursor_page(
+                '/me/following', query, lambda i: c.artist(derive_id('following', i))
+            )}
+
+        return [
+            ('GET', r'/albums/([^/]+)', one(c.album)),
+            ('GET', r'/albums', several('albums', c.album, 20)),
+            ('GET', r'/albums/([^/]+)/tracks', lambda q, b, id: c.page(
+                '/albums/{}/tracks'.format(id), q, lambda i: c.track_simple(derive_id(id, i)),
+                total=12)),
+            ('GET', r'/artists/([^/]+)', one(c.artist)),
+            ('GET', r'/artists', several('artists', c.artist, 50)),
+            ('GET', r'/artists/([^/]+)/albums', lambda q, b, id: c.page(
+                '/artists/{}/albums'.format(id), q,
+                lambda i: c.album_simple(derive_id(id, 'album', i)), total=min(c.total, 60))),
+            ('GET', r'/artists/([^/]+)/top-tracks', lambda q, b, id: {
+                'tracks': [c.track(derive_id(id, 'top', i)) for i in range(10)]}),
+            ('GET', r'/artists/([^/]+)/related-artists', lambda q, b, id: {
+                'artists': [c.artist(derive_id(id, 'related', i)) for i in range(20)]}),
+            ('GET', r'/tracks/([^/]+)', one(c.track)),
+            ('GET', r'/tracks', several('tracks', c.track, 50)),
+            ('GET', r'/audio-features/([^/]+)', one(c.audio_features)),
+            ('GET', r'/audio-features', several('audio_features', c.audio_features, 100)),
+            ('GET', r'/browse/features-playlists', lambda q, b: {
+                'message': 'Featured', 'playlists': c.page(
+                    '/browse/featured-playlists', q,
+                    lambda i: c.playlist_simple(derive_id('featured', i), 'spotify'))}),
+            ('GET', r'/browse/new-releases', lambda q, b: {'albums': c.page(
+                '/browse/new-releases', q, lambda i: c.album_simple(derive_id('new', i)))}),
+            ('GET', r'/browse/categories', lambda q, b: {'categories': c.page(
+                '/browse/categories', q,
+                lambda i: {'id': 'category{}'.format(i), 'name': 'Category {}'.format(i)})}),
+            ('GET', r'/browse/categories/([^/]+)', lambda q, b, id: {'id': id, 'name': id}),
+            ('GET', r'/browse/categories/([^/]+)/playlists', lambda q, b, id: {'playlists': c.page(
+                '/browse/categories/{}/playlists'.format(id), q,
+                lambda i: c.playlist_simple(derive_id(id, i), 'spotify'))}),
+            ('GET', r'/recommendations', lambda q, b: {'seeds': [], 'tracks': [
+                c.track(derive_id('recommended', q.get('seed_tracks'), i))
+                for i in range(int(q.get('limit', 20)))]}),
+            ('GET', r'/me', lambda q, b: c.user('mock-user')),
+            ('GET', r'/me/following', me_following),
+            ('PUT', r'/me/following', empty),
+            ('DELETE', r'/me/following', empty),
+            ('GET', r'/me/following/contains', contains),
+            ('PUT', r'/users/([^/]+)/playlists/([^/]+)/followers', empty),
+            ('DELETE', r'/users/([^/]+)/playlists/([^/]+)/followers', empty),
+            ('GET', r'/users/([^/]+)/playlists/([^/]+)/followers/contains', contains),
+            ('GET', r'/me/tracks', lambda q, b: c.page(
+                '/me/tracks', q, lambda i: c.saved(c.track(derive_id('saved', i)), i))),
+            ('PUT', r'/me/tracks', empty),
+            ('DELETE', r'/me/tracks', empty),
+            ('GET', r'/me/tracks/contains', contains),
+            ('GET', r'/me/albums', lambda q, b: c.page(
+                '/me/albums', q, lambda i: c.saved(c.album(derive_id('saved', i)), i, 'album'))),
+            ('PUT', r'/me/albums', empty),
+            ('DELETE', r'/me/albums', empty),
+            ('GET', r'/me/albums/contains', contains),
+            ('GET', r'/me/top/([^/]+)', lambda q, b, type: c.page(
+                '/me/top/' + type, q, lambda i: (c.artist if type == 'artists' else c.track)(
+                    derive_id('top', type, i)), total=min(c.total, 50))),
+            ('GET', r'/me/player/recently-played', recently_played),
+            ('GET', r'/users/([^/]+)/playlists', lambda q, b, user_id: c.page(
+                '/users/{}/playlists'.format(user_id), q,
+                lambda i: c.playlist_simple(derive_id(user_id, 'playlist', i), user_id))),
+            ('GET', r'/me/playlists', lambda q, b: c.page(
+                '/me/playlists', q,
+                lambda i: c.playlist_simple(derive_id('mock-user', 'playlist', i), 'mock-user'))),
+            ('GET', r'/users/([^/]+)/playlists/([^/]+)', lambda q, b, user_id, id: c.playlist(
+                id, user_id)),
+            ('GET', r'/users/([^/]+)/playlists/([^/]+)/tracks', lambda q, b, user_id, id: (
+                c.playlist_tracks(id, user_id, q))),
+            ('POST', r'/users/([^/]+)/playlists', lambda q, b, user_id: (201, dict(
+                c.playlist_simple(derive_id(user_id, b.get('name')), user_id),
+                name=b.get('name')))),
+            ('POST', r'/users/([^/]+)/playlists/([^/]+)/tracks', snapshot),
+            ('PUT', r'/users/([^/]+)/playlists/([^/]+)/tracks', snapshot),
+            ('DELETE', r'/users/([^/]+)/playlists/([^/]+)/tracks', snapshot),
+            ('PUT', r'/playlists/([^/]+)/images', empty),
+            ('GET', r'/me/player/devices', lambda q, b: {'devices': []}),
+            ('GET', r'/search', search),
+            ('GET', r'/me/player/currently-playing', currently_playing),
+            ('PUT', r'/me/player/play', empty),
+            ('PUT', r'/me/player/pause', empty),
+            ('POST', r'/me/player/next', empty),
+            ('POST', r'/me/player/previous', empty),
+            ('PUT', r'/me/player/volume', empty),
+        ]
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True  # Headers and body are written separately
+
+            def _respond(self):
+                split = urlsplit(self.path)
+                query = {key: values[0] for key, values in parse_qs(split.query).items()}
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b''
+                if self.headers.get('Content-Type', '').startswith('application/json'):
+                    body = json.loads(raw or b'null') or {}
+                else:
+                    body = {key: values[0] for key, values in parse_qs(raw.decode()).items()}
+                if split.path.startswith('/v1') and not self.headers.get('Authorization'):
+                    status, headers, content = 401, {}, {
+                        'error': {'status': 401, 'message': 'No token provided'}}
+                else:
+                    status, headers, content = server.handle(
+                        self.command, split.path, query, body,
+                        self.headers.get('Authorization', '')[len('Bearer '):],
+                        self.headers.get('If-None-Match')
+                    )
+                if content is None and status == 200:
+                    status = 204
+                encoded = b'' if content is None else json.dumps(content).encode()
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--throttle', type=float, default=0.0)
+    parser.add_argument('--errors', type=float, default=0.0)
+    parser.add_argument('--markets', type=int, default=20)
+    parser.add_argument('--total', type=int, default=1000)
+    args = parser.parse_args()
+    server = MockSpotify(args.host, args.port, args.latency, args.jitter, args.throttle,
+                         errors=args.errors, markets=args.markets, total=args.total)
+    print('Serving on {}'.format(server.url))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
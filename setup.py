@@ -12,5 +12,13 @@ setup(
     url='https://github.com/steinitzu/spotify-api',
     license='MIT',
     install_requires=['requests>=2.18.1'],
+    extras_require={
+        'async': ['httpx>=0.23'],
+        'fast': ['orjson'],
+        'stream': ['ijson>=3.1'],
+        'parquet': ['pyarrow'],
+        'numpy': ['numpy'],
+        'http2': ['httpx[http2]>=0.23'],
+    },
     packages=['spotify']
 )
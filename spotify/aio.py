@@ -0,0 +1,292 @@
+"""
+Asyncio client for the Spotify web API.
+
+Uses the same endpoint functions as the blocking `Client`, requests are sent
+over a pooled `httpx.AsyncClient`.
+Requires `httpx` (`pip install spotify-api[async]`).
+
+ex.
+    auth = AsyncOAuth('MY_CLIENT_ID', 'MY_CLIENT_SECRET')
+    await auth.request_client_credentials()
+    async with AsyncClient(auth, max_connections=200) as client:
+        album = await client.api.album('6ra4GIOgCZQZMOaUECftGN')
+"""
+import asyncio
+from collections import deque
+import httpx
+
+from .api import api_class
+from .auth import OAuth
+from . import chunking
+from . import endpoints
+from . import models as models_module
+from . import paging
+from .cache import ResponseCache
+from .scheduler import AsyncRequestScheduler
+
+
+def _http_client(max_connections):
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections
+    )
+    return httpx.AsyncClient(limits=limits)
+
+
+class AsyncOAuth(OAuth):
+
+    def __init__(self, client_id, client_secret, redirect_uri=None, scopes=(), state=None,
+                 auto_refresh=None, http_client=None, token_store=None):
+        """
+        OAuth with coroutine token requests, for use with `AsyncClient`.
+        Takes the same arguments as `OAuth` except:
+
+        Args:
+            http_client(httpx.AsyncClient): Optional, defaults to a new `httpx.AsyncClient()`.
+                Pass the `AsyncClient.session` to share its connection pool.
+
+        Since token refresh needs a request, `token` never refreshes on access here,
+        use `await get_token()` instead.
+        Refresh is single-flight within the event loop. A `token_store` is read and
+        written but not locked, so processes may each refresh a stored token once.
+        """
+        super().__init__(
+            client_id, client_secret, redirect_uri=redirect_uri, scopes=scopes,
+            state=state, auto_refresh=auto_refresh, requests=http_client or httpx.AsyncClient(),
+            token_store=token_store
+        )
+        self._async_refresh_lock = asyncio.Lock()
+
+    @property
+    def token(self):
+        if self._token is None and self.token_store is not None:
+            self._token = self.token_store.load()
+        return self._token
+
+    @token.setter
+    def token(self, value):
+        self._token = value
+
+    async def get_token(self):
+        """
+        Returns the current token, refreshing it first when `auto_refresh` is set.
+        """
+        if self.auto_refresh:
+            await self.refresh_token_if_needed(self.auto_refresh)
+        return self._token
+
+    async def _post_token(self, params):
+        response = await self.session.post(
+            self.TOKEN_URL, data=params, auth=(self.client_id, self.client_secret)
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def request_token(self, url_or_code):
+        """
+        Async version of `OAuth.request_token`
+        """
+        params = self._authorization_code_params(url_or_code)
+        self._set_token(await self._post_token(params))
+
+    async def request_client_credentials(self):
+        """
+        Async version of `OAuth.request_client_credentials`
+        """
+        params = {'grant_type': 'client_credentials'}
+        self._set_token(await self._post_token(params))
+
+    async def refresh_token(self):
+        """
+        Async version of `OAuth.refresh_token`
+        """
+        refresh_token = self._token['refresh_token']
+        params = {
+            'refresh_token': refresh_token,
+            'grant_type': 'refresh_token'
+        }
+        self._set_token(await self._post_token(params), refresh_token=refresh_token)
+
+    async def refresh_token_if_needed(self, expires_in=300):
+        """
+        Async version of `OAuth.refresh_token_if_needed`
+        """
+        if not self.token_expires_soon(expires_in):
+            return
+        async with self._async_refresh_lock:
+            if self.token_store is not None and self.token_expires_soon(expires_in):
+                self._token = self.token_store.load() or self._token
+            if not self.token_expires_soon(expires_in):
+                return
+            if self._token is not None and 'refresh_token' in self._token:
+                await self.refresh_token()
+            else:
+                await self.request_client_credentials()
+
+
+def _api_method(func):
+    if func.__name__ in endpoints._batched:
+        async def method(self, *args, **kwargs):
+            return await self.client._chunked_request(func, args, kwargs)
+    else:
+        async def method(self, *args, **kwargs):
+            return await self.client._call(func(*args, **kwargs))
+    return method
+
+
+_AsyncApi = api_class('AsyncApi', _api_method)
+
+
+class AsyncClient:
+    prefix = 'https://api.spotify.com/v1'
+
+    api = endpoints  # So static analysis is useful
+
+    def __init__(self, auth: AsyncOAuth, http_client=None, max_connections=100,
+                 cache: ResponseCache = None, scheduler: AsyncRequestScheduler = None,
+                 json_loads=None, models=False):
+        """
+        Args:
+            auth(AsyncOAuth): Authentication, a plain `OAuth` works as well
+                without `auto_refresh` (its refresh would block the event loop)
+                and is never refreshed.
+            http_client(httpx.AsyncClient): Optional, defaults to a new client
+                pooling at most `max_connections` connections.
+            max_connections(int): Connection limit of the default http client.
+            cache(ResponseCache): Optional cache for GET responses
+            scheduler(AsyncRequestScheduler): Optional, retries throttled and failed requests
+                and limits concurrency and rate of all requests made through this client
+            json_loads(callable): Optional, parses response bodies from bytes,
+                ex. `spotify.decoding.fast_loads`
+            models(bool): When True endpoint calls (and `paginate`) return
+                `spotify.models` objects instead of dicts
+        """
+        if not hasattr(auth, 'get_token') and getattr(auth, 'auto_refresh', None):
+            raise ValueError('Use AsyncOAuth for auto_refresh with AsyncClient, '
+                             'OAuth would refresh with blocking requests')
+        self.session = http_client or _http_client(max_connections)
+        self.auth = auth
+        self.cache = cache
+        self.scheduler = scheduler
+        self.json_loads = json_loads
+        self._models = models_module.load if models else None
+
+        self.api = _AsyncApi(self)
+
+    async def _chunked_request(self, func, args, kwargs):
+        # Id list endpoints, longer lists are split and the chunks requested concurrently
+        specs, key = chunking.split(func, args, kwargs)
+        if len(specs) == 1:
+            return await self._call(specs[0])
+        responses = await asyncio.gather(*[self._send(spec) for spec in specs])
+        return self._loaded(chunking.merge(responses, key))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the pooled connections.
+        """
+        await self.session.aclose()
+
+    async def paginate(self, endpoint, *args, prefetch=4, **kwargs):
+        """
+        Async generator version of `Client.paginate`
+
+            async for saved in client.paginate(client.api.me_tracks):
+                ...
+        """
+        spec = paging.endpoint_spec(endpoint, *args, **kwargs)
+        first = await self._send(spec)
+        for key, page in paging.paging_objects(first):
+            for item in self._loaded(page['items']):
+                yield item
+            if paging.is_offset_paged(page):
+                specs = (paging.offset_spec(spec, offset)
+                         for offset in paging.remaining_offsets(page, spec.endpoint))
+                async for response in self._prefetch(specs, prefetch):
+                    for item in self._loaded(paging.unwrap(response, key)['items']):
+                        yield item
+            else:
+                next_spec = paging.next_spec(spec, page)
+                while next_spec:
+                    page = paging.unwrap(await self._send(next_spec), key)
+                    for item in self._loaded(page['items']):
+                        yield item
+                    next_spec = paging.next_spec(spec, page)
+
+    async def _prefetch(self, specs, window):
+        # Yields responses to `specs` in order, keeping up to `window` requests in flight
+        pending = deque()
+        try:
+            for spec in specs:
+                pending.append(asyncio.ensure_future(self._send(spec)))
+                if len(pending) >= window:
+                    yield await pending.popleft()
+            while pending:
+                yield await pending.popleft()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _call(self, spec):
+        return self._loaded(await self._send(spec))
+
+    def _loaded(self, result):
+        # Endpoint calls return models when enabled
+        return result if self._models is None else self._models(result)
+
+    async def _send(self, spec):
+        return await self.request(
+            spec.method, spec.url, spec.params, spec.payload, spec.data,
+            spec.additional_headers, spec.endpoint
+        )
+
+    async def headers(self):
+        if hasattr(self.auth, 'get_token'):
+            token = await self.auth.get_token()
+        else:
+            token = self.auth.token
+        return {'Authorization': 'Bearer '+token['access_token']}
+
+    async def request(self, method, url, params=None, payload=None, data=None,
+                      additional_headers=None, endpoint=None):
+        if additional_headers is None:
+            additional_headers = {}
+
+        url = url if url.startswith('http') else self.prefix+url
+        headers = {**(await self.headers()), **additional_headers}
+
+        cache_key = entry = None
+        if self.cache is not None:
+            cache_key, entry = self.cache.lookup(endpoint, method, url, params)
+            if entry is not None:
+                if entry.fresh:
+                    return entry.value
+                headers['If-None-Match'] = entry.etag
+
+        # httpx takes raw bodies as `content`, form fields as `data`
+        content = data if isinstance(data, (bytes, str)) else None
+        if content is not None:
+            data = None
+
+        def send():
+            return self.session.request(
+                method, url, params=params, json=payload, headers=headers,
+                data=data, content=content
+            )
+        response = await (send() if self.scheduler is None else self.scheduler.send(send))
+        if entry is not None and response.status_code == 304:
+            self.cache.revalidated(cache_key, endpoint, entry)
+            return entry.value
+        response.raise_for_status()
+        if not response.content:
+            return
+        result = response.json() if self.json_loads is None else self.json_loads(response.content)
+        if cache_key is not None:
+            self.cache.store(cache_key, endpoint, result, response.headers.get('ETag'))
+        return result
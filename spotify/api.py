@@ -0,0 +1,36 @@
+"""
+Classes binding the endpoint functions to a client.
+
+An api class with one method per endpoint is generated once per process,
+`client.api` is an instance of it holding nothing but a reference to the client.
+"""
+import inspect
+from functools import wraps
+
+from . import endpoints
+
+
+def api_class(name, make_method):
+    """
+    Generate a class with a method for every endpoint function.
+
+    Args:
+        name(str): Class name
+        make_method(callable): Called with each endpoint function,
+            returns the function to use as its method.
+    """
+    def __init__(self, client):
+        self.client = client
+        self.request = client.request
+
+    namespace = {'__slots__': ('client', 'request'), '__init__': __init__}
+    for endpoint_name, func in endpoints._endpoints.items():
+        method = wraps(func)(make_method(func))
+        # Keep the endpoint's signature for help() and IDEs
+        signature = inspect.signature(func)
+        method.__signature__ = signature.replace(parameters=[
+            inspect.Parameter('self', inspect.Parameter.POSITIONAL_ONLY),
+            *signature.parameters.values()
+        ])
+        namespace[endpoint_name] = method
+    return type(name, (), namespace)
@@ -1,16 +1,19 @@
+import threading
 import time
 from urllib.parse import parse_qs, urlencode, urlsplit
 
 import requests
 from requests.auth import HTTPBasicAuth
 
+_requests = requests
+
 
 class OAuth:
     AUTHORIZE_URL = 'https://accounts.spotify.com/authorize'
     TOKEN_URL = 'https://accounts.spotify.com/api/token'
 
     def __init__(self, client_id, client_secret, redirect_uri=None, scopes=(), state=None,
-                 auto_refresh=None, requests=requests):
+                 auto_refresh=None, requests=requests, token_store=None):
         """
         Handles OAuth authentication for the Spotify web API.
         Supports client credentials and user auth flows.
@@ -24,7 +27,14 @@ class OAuth:
             state(str): Optional unique state value to verify requests
             auto_refresh(int): Optional, when set the token is auto refreshed
                 as needed on access if it expires in less than the value given in seconds.
-            requests_session(requests.Session() or compatible object), defaults to a new requests.Sesssion()
+            requests(requests.Session or compatible object, ex. a `spotify.transport`
+                transport): Sends the token requests, defaults to the `requests` module
+            token_store(TokenStore): Optional store sharing the token with other processes,
+                see `spotify.tokenstore`. With `auto_refresh` set, a missing token is
+                loaded from the store or fetched with client credentials on first access.
+
+        Token refresh is single-flight, threads accessing `token` while it is
+        being refreshed wait for the new token.
         """
         self.client_id = client_id
         self.client_secret = client_secret
@@ -36,8 +46,10 @@ class OAuth:
         self.state = state
         self._token = None
         self.auto_refresh = auto_refresh
+        self.token_store = token_store
+        self._refresh_lock = threading.Lock()
 
-        self.session = requests or requests.Session()
+        self.session = requests or _requests.Session()
 
     @property
     def authorize_url(self):
@@ -63,6 +75,8 @@ class OAuth:
     def token(self):
         if self.auto_refresh:
             self.refresh_token_if_needed(self.auto_refresh)
+        elif self._token is None and self.token_store is not None:
+            self._token = self.token_store.load()
         return self._token
 
     @token.setter
@@ -81,27 +95,12 @@ class OAuth:
 
         Raises HTTPError on any non 2xx response code
         """
-        if url_or_code.startswith('http'):
-            code = self.parse_response_code(url_or_code)
-        else:
-            code = url_or_code
-
-        params = {
-            'redirect_uri': self.redirect_uri,
-            'code': code,
-            'grant_type': 'authorization_code'
-        }
-        if self.scopes:
-            params['scope'] = self.scopes
-        if self.state:
-            params['state'] = self.state
+        params = self._authorization_code_params(url_or_code)
         auth = HTTPBasicAuth(self.client_id, self.client_secret)
 
         response = self.session.post(self.TOKEN_URL, data=params, auth=auth, verify=True)
         response.raise_for_status()
-        token = response.json()
-        token['expires_at'] = int(time.time()) + token['expires_in']
-        self.token = token
+        self._set_token(response.json())
 
     def request_client_credentials(self):
         """
@@ -114,9 +113,7 @@ class OAuth:
         auth = HTTPBasicAuth(self.client_id, self.client_secret)
         response = self.session.post(self.TOKEN_URL, data=params, auth=auth, verify=True)
         response.raise_for_status()
-        token = response.json()
-        token['expires_at'] = int(time.time()) + token['expires_in']
-        self.token = token
+        self._set_token(response.json())
 
     def refresh_token(self):
         """
@@ -124,7 +121,7 @@ class OAuth:
 
         Raises HTTPError on any non 2xx response code
         """
-        refresh_token = self._token['refresh_token']        
+        refresh_token = self._token['refresh_token']
         params = {
             'refresh_token': refresh_token,
             'grant_type': 'refresh_token'
@@ -133,11 +130,7 @@ class OAuth:
 
         response = self.session.post(self.TOKEN_URL, data=params, auth=auth)
         response.raise_for_status()
-        token = response.json()
-        token['expires_at'] = int(time.time()) + token['expires_in']
-        if 'refresh_token' not in token:
-            token['refresh_token'] = refresh_token
-        self.token = token
+        self._set_token(response.json(), refresh_token=refresh_token)
 
     def refresh_token_if_needed(self, expires_in=300):
         """
@@ -145,8 +138,56 @@ class OAuth:
 
         Raises HTTPError on failed token refresh
         """
-        if self._token['expires_at'] <= time.time() + expires_in:
-            if 'refresh_token' in self._token:
-                self.refresh_token()
-            else:
-                self.request_client_credentials()
+        if not self.token_expires_soon(expires_in):
+            return
+        with self._refresh_lock:
+            # Another thread may have refreshed it while we waited
+            if self.token_store is None:
+                if self.token_expires_soon(expires_in):
+                    self._renew_token()
+                return
+            with self.token_store.lock():
+                stored = self.token_store.load()
+                if stored is not None:
+                    self._token = stored
+                if self.token_expires_soon(expires_in):
+                    self._renew_token()
+
+    def token_expires_soon(self, expires_in=300):
+        """
+        Whether the current token expires in < `expires_in` seconds
+        (or there is no token).
+        """
+        return self._token is None or self._token['expires_at'] <= time.time() + expires_in
+
+    def _renew_token(self):
+        if self._token is not None and 'refresh_token' in self._token:
+            self.refresh_token()
+        else:
+            self.request_client_credentials()
+
+    def _authorization_code_params(self, url_or_code):
+        if url_or_code.startswith('http'):
+            code = self.parse_response_code(url_or_code)
+        else:
+            code = url_or_code
+
+        params = {
+            'redirect_uri': self.redirect_uri,
+            'code': code,
+            'grant_type': 'authorization_code'
+        }
+        if self.scopes:
+            params['scope'] = self.scopes
+        if self.state:
+            params['state'] = self.state
+        return params
+
+    def _set_token(self, token, refresh_token=None):
+        # Token responses carry a relative `expires_in`, store the absolute time
+        token['expires_at'] = int(time.time()) + token['expires_in']
+        if refresh_token and 'refresh_token' not in token:
+            token['refresh_token'] = refresh_token
+        self.token = token
+        if self.token_store is not None:
+            self.token_store.save(token)
@@ -0,0 +1,96 @@
+"""
+Coalescing of single object lookups into batched requests.
+
+With batching enabled on a `Client`, calls like `client.api.track(id)` from
+concurrent threads are held for a short window (or until the batch is full)
+and sent as one `tracks` request. Every caller gets its own object back,
+lookups of the same id share one result.
+"""
+import threading
+from concurrent.futures import Future
+
+from . import chunking
+from . import endpoints
+
+# Single object endpoint -> the endpoint fetching several at once
+COALESCED = {
+    'track': 'tracks',
+    'album': 'albums',
+    'artist': 'artists',
+    'track_audio_features': 'tracks_audio_features',
+}
+
+
+class Batcher:
+
+    def __init__(self, client, window=0.005, max_size=None):
+        """
+        Args:
+            client(Client): Client performing the batched requests
+            window(float): Seconds to hold a lookup waiting for others to join its batch
+            max_size(int): Optional, send batches at this many ids instead of the
+                endpoint's id limit.
+        """
+        self.client = client
+        self.window = window
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._pending = {}  # group -> {id: Future}
+        self._in_flight = {}  # (group, id) -> Future
+
+    def lookup(self, func, *args, **kwargs):
+        """
+        Performs the single object lookup `func(*args, **kwargs)` as part of a batch.
+        Returns the object or None if Spotify doesn't know the id.
+        """
+        bound = chunking._signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        params = dict(bound.arguments)
+        id = params.pop(next(iter(params)))
+        group = (func.__name__, tuple(sorted(params.items())))
+
+        flush = None
+        with self._lock:
+            future = self._in_flight.get((group, id))
+            if future is None:
+                batch = self._pending.get(group)
+                if batch is None:
+                    batch = self._pending[group] = {}
+                    timer = threading.Timer(self.window, self._flush, (group, batch))
+                    timer.daemon = True
+                    timer.start()
+                future = batch[id] = self._in_flight[(group, id)] = Future()
+                if len(batch) >= self._batch_size(func.__name__):
+                    flush = self._pending.pop(group)
+        if flush is not None:
+            self._send(group, flush)
+        return future.result()
+
+    def _batch_size(self, name):
+        limit = endpoints._batched[COALESCED[name]][1]
+        return min(limit, self.max_size or limit)
+
+    def _flush(self, group, batch):
+        with self._lock:
+            if self._pending.get(group) is not batch:
+                return  # Already sent when it filled up
+            del self._pending[group]
+        self._send(group, batch)
+
+    def _send(self, group, batch):
+        name, params = group
+        many = COALESCED[name]
+        key = endpoints._batched[many][2]
+        try:
+            spec = endpoints._endpoints[many](list(batch), **dict(params))
+            results = self.client._send(spec)[key]
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+        else:
+            for future, result in zip(batch.values(), results):
+                future.set_result(result)
+        finally:
+            with self._lock:
+                for id in batch:
+                    del self._in_flight[(group, id)]
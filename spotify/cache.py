@@ -0,0 +1,125 @@
+"""
+In-memory response cache for GET requests.
+
+Responses are cached per endpoint, only endpoints with a TTL are cached.
+Entries are keyed on method, URL and normalized query params and evicted least
+recently used first once the cache is full. Stale entries that came with an
+ETag are revalidated with `If-None-Match`, a `304 Not Modified` response
+renews the cached entry.
+
+Cached responses are shared between callers, treat them as read-only.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# Catalog objects rarely change, playlists carry ETags and are always revalidated
+# so an entry is never served without the current token having access to it.
+DEFAULT_TTLS = {
+    'album': 24 * 3600,
+    'albums': 24 * 3600,
+    'album_tracks': 24 * 3600,
+    'artist': 3600,
+    'artists': 3600,
+    'artist_albums': 3600,
+    'artist_top_tracks': 3600,
+    'artist_related_artists': 3600,
+    'track': 24 * 3600,
+    'tracks': 24 * 3600,
+    'track_audio_features': 24 * 3600,
+    'tracks_audio_features': 24 * 3600,
+    'user_playlist': 0,
+    'user_playlist_tracks': 0,
+}
+
+
+class CacheEntry:
+    __slots__ = ('value', 'etag', 'expires_at')
+
+    def __init__(self, value, etag, expires_at):
+        self.value = value
+        self.etag = etag
+        self.expires_at = expires_at
+
+    @property
+    def fresh(self):
+        return self.expires_at > time.monotonic()
+
+
+class ResponseCache:
+
+    def __init__(self, maxsize=4096, ttls=None):
+        """
+        Args:
+            maxsize(int): Maximum number of cached responses
+            ttls(dict): Optional, `{endpoint name: seconds}` overriding `DEFAULT_TTLS`.
+                A TTL of None disables caching for that endpoint, 0 caches the
+                response but revalidates it on every request.
+        """
+        self.maxsize = maxsize
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(method, url, params=None):
+        params = tuple(sorted((k, str(v)) for k, v in (params or {}).items()))
+        return method, url, params
+
+    def lookup(self, endpoint, method, url, params=None):
+        """
+        Returns `(key, entry)` for a request.
+        `key` is None when the request isn't cacheable, `entry` is None on a miss.
+        """
+        if method != 'GET' or self.ttls.get(endpoint) is None:
+            return None, None
+        key = self.key(method, url, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                if entry.fresh:
+                    self.hits += 1
+                elif not entry.etag:
+                    self.misses += 1
+                    entry = None
+        return key, entry
+
+    def store(self, key, endpoint, value, etag=None):
+        entry = CacheEntry(value, etag, time.monotonic() + self.ttls[endpoint])
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def revalidated(self, key, endpoint, entry):
+        """
+        Renew `entry` after a 304 response.
+        """
+        with self._lock:
+            self.revalidations += 1
+        self.store(key, endpoint, entry.value, entry.etag)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+            'evictions': self.evictions,
+        }
+
+    def __len__(self):
+        return len(self._entries)
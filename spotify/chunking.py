@@ -0,0 +1,58 @@
+"""
+Splitting of id list endpoint calls that exceed the per request id limit.
+
+Endpoints marked with `endpoints._batch` accept any number of ids, the client
+sends one request per chunk and merges the responses back in input order.
+Ids Spotify doesn't know come back as `None` in their position.
+"""
+import inspect
+from functools import lru_cache
+
+from . import endpoints
+
+
+@lru_cache(maxsize=None)
+def _signature(function):
+    return inspect.signature(function)
+
+
+def id_list(ids):
+    """
+    List of the ids of an id list argument, a string is taken as comma separated ids.
+    """
+    return ids.split(',') if isinstance(ids, str) else list(ids)
+
+
+def chunks(ids, size):
+    """
+    Split the iterable `ids` (see `id_list`) into lists of at most `size` ids.
+    """
+    ids = id_list(ids)
+    return [ids[i:i+size] for i in range(0, len(ids), size)]
+
+
+def split(function, args, kwargs):
+    """
+    Request specs for calling endpoint `function` with `args` and `kwargs`,
+    one for each chunk of its id list.
+    Returns `(specs, key)` where `key` is the response key to merge on.
+    """
+    arg, limit, key = endpoints._batched[function.__name__]
+    bound = _signature(function).bind(*args, **kwargs)
+    ids = chunks(bound.arguments[arg], limit)
+    specs = []
+    for chunk in ids or [[]]:
+        bound.arguments[arg] = chunk
+        specs.append(function(*bound.args, **bound.kwargs))
+    return specs, key
+
+
+def merge(responses, key):
+    """
+    Merge the responses of chunked requests in order.
+    """
+    if key is not None:
+        return {key: [item for response in responses for item in response[key]]}
+    if any(isinstance(response, list) for response in responses):
+        return [item for response in responses for item in response]
+    return None
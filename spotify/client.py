@@ -1,51 +1,426 @@
+import os
+import threading
+import time
+
 import requests
-from functools import wraps
+import requests.adapters
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from .auth import OAuth
+from .api import api_class
+from . import batching
+from . import chunking
+from .cache import ResponseCache
+from .instrumentation import Instrumentation
+from .scheduler import RequestScheduler
+from .store import CatalogStore
 from . import endpoints
+from . import execution
+from . import models as models_module
+from . import paging
+from . import store as store_module
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def _shared_session():
+    with _shared_lock:
+        if 'session' not in _shared:
+            session = requests.Session()
+            # Keep more connections than the default 10 for concurrent requests
+            session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=64))
+            _shared['session'] = session
+        return _shared['session']
+
+
+def _shared_executor(max_workers):
+    with _shared_lock:
+        key = ('executor', max_workers)
+        if key not in _shared:
+            _shared[key] = ThreadPoolExecutor(max_workers)
+        return _shared[key]
+
+
+def _api_method(func):
+    if func.__name__ in endpoints._batched:
+        def method(self, *args, **kwargs):
+            return self.client._chunked_request(func, args, kwargs)
+    elif func.__name__ in batching.COALESCED:
+        def method(self, *args, **kwargs):
+            client = self.client
+            if client._batcher is not None:
+                return client._loaded(client._batcher.lookup(func, *args, **kwargs))
+            return client._call(func(*args, **kwargs))
+    else:
+        def method(self, *args, **kwargs):
+            return self.client._call(func(*args, **kwargs))
+    if func.__name__ in store_module.STORED:
+        request = method
+
+        def method(self, *args, **kwargs):
+            client = self.client
+            if client.store is None:
+                return request(self, *args, **kwargs)
+            return client._loaded(client._stored_request(func, args, kwargs))
+    return method
+
+
+def _each(load, items):
+    return items if load is None else map(load, items)
+
+
+_Api = api_class('Api', _api_method)
+_Plan = api_class('Plan', execution.plan_method)
 
 
 class Client:
     prefix = 'https://api.spotify.com/v1'
 
     api = endpoints  # So static analysis is useful
+    plan = endpoints
 
-    def __init__(self, auth: OAuth, requests_session=None):
-        self.session = requests_session or requests.Session()
+    def __init__(self, auth: OAuth, requests_session=None, max_workers=8,
+                 batch_window=None, batch_size=None, cache: ResponseCache = None,
+                 scheduler: RequestScheduler = None, json_loads=None, models=False,
+                 instrumentation: Instrumentation = None, store: CatalogStore = None):
+        """
+        Args:
+            auth(OAuth): Authentication
+            requests_session(requests.Session() or compatible object), defaults to a
+                session shared by all clients so their connections are pooled.
+                `spotify.transport.HTTP2Transport` multiplexes requests over HTTP/2.
+            max_workers(int): Size of the thread pool used for concurrent requests
+                (ex. page prefetching in `paginate`), pools are shared by clients as well
+            batch_window(float): Optional, when set `track`, `album`, `artist` and
+                `track_audio_features` lookups from concurrent threads are held up to
+                this many seconds and sent together as one batched request.
+                Unknown ids then return None instead of raising HTTPError.
+            batch_size(int): Optional, send held lookups once this many are waiting
+                (defaults to the endpoint's id limit)
+            cache(ResponseCache): Optional cache for GET responses, can be shared by clients
+            scheduler(RequestScheduler): Optional, retries throttled and failed requests
+                and limits concurrency and rate of all requests made through this client
+            json_loads(callable): Optional, parses response bodies from bytes,
+                ex. `spotify.decoding.fast_loads`
+            models(bool): When True endpoint calls (and `paginate`) return
+                `spotify.models` objects instead of dicts
+            instrumentation(Instrumentation): Optional, hooks called before and after
+                every request (see `spotify.instrumentation`)
+            store(CatalogStore): Optional persistent store of albums, tracks and artists,
+                their lookups only request the ids it doesn't have
+        """
+        self.session = requests_session or _shared_session()
         self.auth = auth
+        self.cache = cache
+        self.scheduler = scheduler
+        self.max_workers = max_workers
+        self.json_loads = json_loads
+        self._models = models_module.load if models else None
+        self.instrumentation = instrumentation
+        self.store = store
+        self._batcher = None
+        if batch_window is not None:
+            self._batcher = batching.Batcher(self, batch_window, batch_size)
+
+        self.api = _Api(self)
+        self.plan = _Plan(self)
+
+    def _chunked_request(self, func, args, kwargs):
+        # Id list endpoints, longer lists are split and the chunks requested concurrently
+        return self._loaded(self._chunked_send(func, args, kwargs))
+
+    def _chunked_send(self, func, args, kwargs):
+        specs, key = chunking.split(func, args, kwargs)
+        if len(specs) == 1:
+            return self._send(specs[0])
+        return chunking.merge(list(self.executor.map(self._send, specs)), key)
+
+    def _stored_request(self, func, args, kwargs):
+        # Catalog lookups answered from the store where possible, the rest requested
+        # and stored. Returns the parsed response.
+        type, ids_arg = store_module.STORED[func.__name__]
+        bound = chunking._signature(func).bind(*args, **kwargs)
+        arguments = bound.arguments
+        market = arguments.get('market')
+        if ids_arg is None:
+            id = next(iter(arguments.values()))
+            obj = self.store.get(type, id, market)
+            if obj is None:
+                if self._batcher is not None:
+                    obj = self._batcher.lookup(func, *args, **kwargs)
+                else:
+                    obj = self._send(func(*args, **kwargs))
+                if obj is not None:
+                    self.store.put(type, id, obj, market)
+            return obj
+        ids = chunking.id_list(arguments[ids_arg])
+        found = self.store.get_many(type, ids, market)
+        missing = [id for id in dict.fromkeys(ids) if id not in found]
+        if missing:
+            arguments[ids_arg] = missing
+            key = endpoints._batched[func.__name__][2]
+            fetched = self._chunked_send(func, bound.args, bound.kwargs)[key]
+            new = [(id, obj) for id, obj in zip(missing, fetched) if obj is not None]
+            self.store.put_many(type, new, market)
+            found.update(new)
+        return {type + 's': [found.get(id) for id in ids]}
+
+    @property
+    def executor(self):
+        return _shared_executor(self.max_workers)
+
+    def stream(self, endpoint, *args, **kwargs):
+        """
+        Request a page of a paged endpoint and parse it as it downloads.
+        Returns a `spotify.streaming.StreamedPage`, iterate it for the items,
+        paging metadata (`total`, `next`, ...) is available after the items.
+        Requires `ijson`.
+
+            page = client.stream(client.api.user_playlist_tracks, user_id, playlist_id)
+            for item in page:
+                ...
+        """
+        from .streaming import StreamedPage, paging_paths
+
+        spec = paging.endpoint_spec(endpoint, *args, **kwargs)
+        path = paging_paths(spec)[0]
+        return StreamedPage(self._open(spec), path, self._models)
+
+    def _stream_pages(self, spec, load):
+        # Items of all pages of `spec`, each page parsed as it downloads
+        from .streaming import StreamedPage, paging_paths
+
+        first_path, next_path = paging_paths(spec)
+        page = StreamedPage(self._open(spec), first_path, load)
+        while True:
+            yield from page
+            next_spec = paging.next_spec(spec, page.metadata)
+            if next_spec is None:
+                return
+            page = StreamedPage(self._open(next_spec), next_path, load)
+
+    def paginate(self, endpoint, *args, prefetch=4, stream=False, **kwargs):
+        """
+        Generator yielding every item of a paged endpoint, one by one.
 
-        class Api:
-            pass
-        self.api = Api()  # So endpoints module is not modified
-        self.api.request = self.request
+            for saved in client.paginate(client.api.me_tracks, limit=50):
+                print(saved['track']['name'])
 
-        for name, member in endpoints.__dict__.items():
-            if name.startswith('_'):
-                continue
-            method = self._build_request(member)
-            setattr(self.api, name, method)
+        Once the first page reports a `total`, the remaining offset pages are fetched
+        concurrently, at most `prefetch` pages ahead of the consumer.
+        Cursor paged endpoints (ex. `me_following`, `me_player_recently_played`)
+        are followed through their `next` links in order.
+        Responses with several paging objects (ex. `search` for multiple types)
+        yield all items of each in turn.
 
-    def _build_request(self, func):
-        # Takes endpoint functions and performs actual requests
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            return self.request(**func(*args, **kwargs))
-        return wrapper
+        With `stream=True` each page is parsed as it downloads (see `stream`)
+        and pages are followed in order, keeping memory use constant.
+        """
+        spec = paging.endpoint_spec(endpoint, *args, **kwargs)
+        return self._paginate(spec, prefetch, stream, self._models)
+
+    def _paginate(self, spec, prefetch, stream, load):
+        # Items of every page of `spec`, passed through `load` unless it's None
+        if stream:
+            yield from self._stream_pages(spec, load)
+            return
+        first = self._send(spec)
+        for key, page in paging.paging_objects(first):
+            yield from _each(load, page['items'])
+            if paging.is_offset_paged(page):
+                specs = (paging.offset_spec(spec, offset)
+                         for offset in paging.remaining_offsets(page, spec.endpoint))
+                for response in self._prefetch(specs, prefetch):
+                    yield from _each(load, paging.unwrap(response, key)['items'])
+            else:
+                next_spec = paging.next_spec(spec, page)
+                while next_spec:
+                    page = paging.unwrap(self._send(next_spec), key)
+                    yield from _each(load, page['items'])
+                    next_spec = paging.next_spec(spec, page)
+
+    def project(self, endpoint, paths, *args, records=False, prefetch=4, stream=False,
+                **kwargs):
+        """
+        Request only the fields at `paths` (see `spotify.projection`) and shape
+        the result into flat tuples, or named tuples with `records=True`.
+        For `user_playlist_tracks` the paths are into the items, which are
+        returned as an iterator of tuples over all pages (see `paginate`).
+        For `user_playlist` a single tuple is returned.
+
+            rows = client.project(client.api.user_playlist_tracks,
+                                  ['added_at', 'track.id', 'track.artists.name'],
+                                  user_id, playlist_id)
+            for added_at, track_id, artist_names in rows:
+                ...
+        """
+        from .projection import PROJECTED, Projection
+
+        projection = paths if isinstance(paths, Projection) else Projection(paths, records)
+        if endpoint.__name__ not in PROJECTED:
+            raise ValueError('{} has no fields parameter'.format(endpoint.__name__))
+        if not PROJECTED[endpoint.__name__]:
+            spec = paging.endpoint_spec(endpoint, *args, fields=projection.fields, **kwargs)
+            return projection(self._send(spec))
+        spec = paging.endpoint_spec(endpoint, *args, fields=projection.paged_fields(), **kwargs)
+        return self._paginate(spec, prefetch, stream, projection)
+
+    def audio_features_matrix(self, track_ids, cache=None, prefetch=8):
+        """
+        Audio features of `track_ids` as a `spotify.features.FeatureMatrix`,
+        a float32 matrix with a row per id (NaN and masked for tracks without
+        features) and a column per feature. Requires `numpy`.
+
+        Args:
+            track_ids(list): Any number of track ids, requested 100 per call,
+                `prefetch` calls at once
+            cache(str): Optional .npy path (the suffix is added if missing). A matrix
+                saved there for the same ids is loaded memory mapped instead of
+                requested, otherwise the requested matrix is saved there.
+        """
+        from . import features
+
+        track_ids = list(track_ids)
+        if cache is not None:
+            cache = features.npy_path(cache)
+        if cache is not None and os.path.exists(cache):
+            matrix = features.FeatureMatrix.load(cache)
+            if matrix.ids.tolist() == [id.encode() for id in track_ids]:
+                return matrix
+        matrix = features.fetch(self, track_ids, prefetch)
+        if cache is not None:
+            matrix.save(cache)
+        return matrix
+
+    def execute_many(self, specs, concurrency=8, ordered=True):
+        """
+        Send request specs of any endpoints, planned with `client.plan`, at most
+        `concurrency` at once. Generator yielding a `spotify.execution.PlanResult`
+        (index, spec, result, error) for each spec, an error doesn't stop the others.
+
+            specs = [client.plan.track(id) for id in track_ids]
+            for result in client.execute_many(specs, concurrency=16, ordered=False):
+                ...
+
+        Args:
+            specs(iterable): `RequestSpec`s (or `ChunkedSpec`s of `client.plan`),
+                consumed as requests complete
+            concurrency(int): Requests in flight
+            ordered(bool): Yield results in the order of `specs`, else as they complete
+        """
+        return execution.execute_many(self, specs, concurrency, ordered)
+
+    def _prefetch(self, specs, window):
+        # Yields responses to `specs` in order, keeping up to `window` requests in flight
+        pending = deque()
+        specs = iter(specs)
+        try:
+            for spec in specs:
+                pending.append(self.executor.submit(self._send, spec))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _call(self, spec):
+        return self._loaded(self._send(spec))
+
+    def _loaded(self, result):
+        # Endpoint calls return models when enabled
+        return result if self._models is None else self._models(result)
+
+    def _send(self, spec):
+        if self.instrumentation is None:
+            return self._request(
+                spec.method, spec.url, spec.params, spec.payload, spec.data,
+                spec.additional_headers, spec.endpoint
+            )
+        return self.request(
+            spec.method, spec.url, spec.params, spec.payload, spec.data,
+            spec.additional_headers, spec.endpoint
+        )
+
+    def _open(self, spec):
+        # Streamed response to `spec`, bypassing the cache
+        url = spec.url if spec.url.startswith('http') else self.prefix+spec.url
+        headers = {**self.headers(), **(spec.additional_headers or {})}
+
+        def send():
+            return self.session.request(
+                spec.method, url, params=spec.params, json=spec.payload, headers=headers,
+                data=spec.data, stream=True
+            )
+        response = send() if self.scheduler is None else self.scheduler.send(send)
+        response.raise_for_status()
+        return response
 
     def headers(self):
         return {'Authorization': 'Bearer '+self.auth.token['access_token']}
 
     def request(self, method, url, params=None, payload=None, data=None,
-                additional_headers=None):
+                additional_headers=None, endpoint=None):
+        if self.instrumentation is None:
+            return self._request(method, url, params, payload, data, additional_headers, endpoint)
+        event = self.instrumentation.start(endpoint, method, url)
+        try:
+            result = self._request(
+                method, url, params, payload, data, additional_headers, endpoint, event
+            )
+        except Exception as e:
+            self.instrumentation.finish(event, e)
+            raise
+        self.instrumentation.finish(event)
+        return result
+
+    def _request(self, method, url, params, payload, data, additional_headers, endpoint,
+                 event=None):
+        # `event` is the RequestEvent to fill in when instrumented
         if additional_headers is None:
             additional_headers = {}
 
         url = url if url.startswith('http') else self.prefix+url
-        headers = {**self.headers(), **additional_headers}
-        response = self.session.request(
-            method, url, params=params, json=payload, headers=headers, data=data
-        )
+        if event is None:
+            headers = {**self.headers(), **additional_headers}
+        else:
+            token = getattr(self.auth, '_token', None)
+            started = time.perf_counter()
+            headers = {**self.headers(), **additional_headers}
+            if getattr(self.auth, '_token', None) is not token:
+                event.token_refresh = time.perf_counter() - started
+
+        cache_key = entry = None
+        if self.cache is not None:
+            cache_key, entry = self.cache.lookup(endpoint, method, url, params)
+            if entry is not None:
+                if entry.fresh:
+                    if event is not None:
+                        event.cache = 'hit'
+                    return entry.value
+                headers['If-None-Match'] = entry.etag
+
+        def send():
+            return self.session.request(
+                method, url, params=params, json=payload, headers=headers, data=data
+            )
+        if event is not None:
+            send = event.counting(send)
+        response = send() if self.scheduler is None else self.scheduler.send(send)
+        if event is not None:
+            event.received(response)
+            if cache_key is not None:
+                event.cache = 'revalidated' if response.status_code == 304 else 'miss'
+        if entry is not None and response.status_code == 304:
+            self.cache.revalidated(cache_key, endpoint, entry)
+            return entry.value
         response.raise_for_status()
-        if not response.text:
+        if not response.content:
             return
-        return response.json()
+        result = response.json() if self.json_loads is None else self.json_loads(response.content)
+        if cache_key is not None:
+            self.cache.store(cache_key, endpoint, result, response.headers.get('ETag'))
+        return result
@@ -0,0 +1,280 @@
+"""
+Related artist graph crawler.
+
+Expands artists breadth first from seed ids through `artist_related_artists`,
+several artists at a time, and yields every `(artist_id, related_artist_id)`
+edge as it's discovered. Visited artists are kept as sorted 64 bit hashes
+(8 bytes each) instead of a set of id strings, artists waiting to be expanded
+as packed 128 bit ids (16 bytes each, see `spotify.ids`).
+
+With a `checkpoint` file the visited artists, the frontier and the edges are
+saved to SQLite as the crawl goes, a crawl started again with the same file
+resumes where it stopped. Edges found after the last checkpoint are yielded
+again on resume.
+Requires `numpy`.
+
+ex.
+    crawler = ArtistCrawler(client, checkpoint='graph.db', concurrency=16)
+    for artist_id, related_id in crawler.crawl(['0OdUWJ0sBjDrqHygGUXeCF']):
+        ...
+"""
+import sqlite3
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy
+import requests
+
+from . import ids
+
+# Artist states in the checkpoint
+FRONTIER = 0
+EXPANDED = 1
+LEAF = 2  # Beyond max_depth, never expanded
+
+
+class VisitedSet:
+    """
+    Set of ids stored as a sorted array of their 64 bit hashes, with recent
+    additions in a small set merged in batches. False positives are possible
+    but negligible (about 1 in 10^6 at 10 million ids).
+    """
+
+    def __init__(self, merge_at=65536):
+        self.merge_at = merge_at
+        self._sorted = numpy.empty(0, dtype=numpy.int64)
+        self._recent = set()
+
+    def __contains__(self, id):
+        key = hash(id)
+        if key in self._recent:
+            return True
+        i = self._sorted.searchsorted(key)
+        return i < len(self._sorted) and self._sorted[i] == key
+
+    def add(self, id):
+        self._recent.add(hash(id))
+        if len(self._recent) >= self.merge_at:
+            self._merge()
+
+    def _merge(self):
+        recent = numpy.fromiter(self._recent, dtype=numpy.int64, count=len(self._recent))
+        self._sorted = numpy.union1d(self._sorted, recent)
+        self._recent = set()
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+    @property
+    def nbytes(self):
+        return self._sorted.nbytes
+
+
+class Frontier:
+    """
+    FIFO queue of `(id, depth)`, ids packed into blocks of `block` ids of the
+    same depth, only the block at the front is unpacked. Blocks with ids that
+    aren't Spotify ids are kept as lists.
+    """
+
+    def __init__(self, block=4096):
+        self.block = block
+        self._blocks = deque()  # (depth, high, low), or (depth, None, ids)
+        self._tail = []  # Ids appended since the last block, all of `_tail_depth`
+        self._tail_depth = None
+        self._head = deque()  # Unpacked (id, depth) of the front block
+        self._length = 0
+
+    def append(self, id, depth):
+        if depth != self._tail_depth or len(self._tail) >= self.block:
+            self._pack()
+            self._tail_depth = depth
+        self._tail.append(id)
+        self._length += 1
+
+    def popleft(self):
+        if not self._head:
+            if not self._blocks:
+                self._pack()
+            if not self._blocks:
+                raise IndexError('pop from an empty frontier')
+            depth, high, low = self._blocks.popleft()
+            unpacked = low if high is None else ids.decode_many(high, low)
+            self._head = deque((id, depth) for id in unpacked)
+        self._length -= 1
+        return self._head.popleft()
+
+    def _pack(self):
+        if self._tail:
+            try:
+                high, low = ids.encode_many(self._tail)
+            except ValueError:
+                high, low = None, self._tail
+            self._blocks.append((self._tail_depth, high, low))
+            self._tail = []
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def nbytes(self):
+        return sum(high.nbytes + low.nbytes for _, high, low in self._blocks
+                   if high is not None)
+
+
+class ArtistCrawler:
+
+    def __init__(self, client, checkpoint=None, concurrency=16, max_depth=None,
+                 max_artists=None, expand=(), country='US', on_artist=None,
+                 checkpoint_every=1000):
+        """
+        Args:
+            client(Client): Client returning dicts (not `models`)
+            checkpoint(str): Optional SQLite file to save progress to and resume from
+            concurrency(int): Artists expanded at once
+            max_depth(int): Optional, don't expand artists further than this from the seeds
+            max_artists(int): Optional, stop after expanding this many artists (in total
+                when resuming), the rest of the frontier is kept for a later crawl
+            expand(tuple): Also fetch 'top_tracks' and/or 'albums' of every artist
+            country(str): Market of the top tracks
+            on_artist(callable): Optional, called as each artist is expanded with its id
+                and a dict of the responses: 'related_artists' (the artist objects),
+                'top_tracks' and 'albums' when in `expand`
+            checkpoint_every(int): Expanded artists between checkpoints
+        """
+        self.client = client
+        self.checkpoint = checkpoint
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self.max_artists = max_artists
+        self.expand = expand
+        self.country = country
+        self.on_artist = on_artist
+        self.checkpoint_every = checkpoint_every
+
+        self.visited = VisitedSet()
+        self.expanded = 0
+        self._frontier = Frontier()
+        self._db = None
+        self._discovered = []  # (id, depth, state) since the last checkpoint
+        self._done = []  # Ids expanded since the last checkpoint
+        self._edges = []
+
+    def crawl(self, seeds=()):
+        """
+        Generator of `(artist_id, related_artist_id)` edges, in the order they're found.
+        Resumes from the checkpoint when there is one, `seeds` not visited yet are added.
+        """
+        if self.checkpoint is not None and self._db is None:
+            self._resume()
+        for id in seeds:
+            self._discover(id, 0)
+
+        pending = {}
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            try:
+                while True:
+                    while self._frontier and len(pending) < self.concurrency and (
+                            self.max_artists is None
+                            or self.expanded + len(pending) < self.max_artists):
+                        id, depth = self._frontier.popleft()
+                        pending[executor.submit(self._fetch, id)] = (id, depth)
+                    if not pending:
+                        break
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        id, depth = pending.pop(future)
+                        responses = future.result()
+                        for related in responses['related_artists']:
+                            if self._db is not None:
+                                self._edges.append((id, related['id']))
+                            self._discover(related['id'], depth + 1)
+                            yield id, related['id']
+                        if self._db is not None:
+                            self._done.append(id)
+                        self.expanded += 1
+                        if self.on_artist is not None:
+                            self.on_artist(id, responses)
+                    if len(self._done) >= self.checkpoint_every:
+                        self._save()
+            finally:
+                for future in pending:
+                    future.cancel()
+                # Unfinished artists stay in the saved frontier
+                self._save()
+
+    def _discover(self, id, depth):
+        if id in self.visited:
+            return
+        self.visited.add(id)
+        if self.max_depth is not None and depth > self.max_depth:
+            state = LEAF
+        else:
+            state = FRONTIER
+            self._frontier.append(id, depth)
+        if self._db is not None:
+            self._discovered.append((id, depth, state))
+
+    def _fetch(self, id):
+        api = self.client.api
+        try:
+            related = api.artist_related_artists(id)['artists']
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            related = []  # Unknown artist, expanded without edges
+        responses = {'related_artists': related}
+        if 'top_tracks' in self.expand:
+            responses['top_tracks'] = api.artist_top_tracks(id, self.country)['tracks']
+        if 'albums' in self.expand:
+            responses['albums'] = list(self.client.paginate(api.artist_albums, id, limit=50))
+        return responses
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.checkpoint)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS artists (id TEXT PRIMARY KEY, depth INTEGER, '
+            'state INTEGER) WITHOUT ROWID'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS edges (source TEXT, target TEXT, '
+            'PRIMARY KEY (source, target)) WITHOUT ROWID'
+        )
+
+    def _resume(self):
+        self._connect()
+        rows = self._db.execute('SELECT id, depth, state FROM artists ORDER BY depth')
+        for id, depth, state in rows:
+            self.visited.add(id)
+            if state == FRONTIER:
+                self._frontier.append(id, depth)
+            elif state == EXPANDED:
+                self.expanded += 1
+
+    def _save(self):
+        if self._db is None:
+            return
+        with self._db:
+            self._db.executemany(
+                'INSERT OR IGNORE INTO artists (id, depth, state) VALUES (?, ?, ?)',
+                self._discovered
+            )
+            self._db.executemany(
+                'UPDATE artists SET state = ? WHERE id = ?',
+                [(EXPANDED, id) for id in self._done]
+            )
+            self._db.executemany('INSERT OR IGNORE INTO edges VALUES (?, ?)', self._edges)
+        self._discovered, self._done, self._edges = [], [], []
+
+    def edges(self):
+        """
+        Generator of the checkpointed edges.
+        """
+        if self._db is None:
+            self._connect()
+        yield from self._db.execute('SELECT source, target FROM edges')
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,22 @@
+"""
+JSON decoding of response bodies.
+
+`fast_loads` parses the raw response bytes in one pass with `orjson` when it's
+installed (`pip install spotify-api[fast]`) and falls back to the standard library.
+
+ex.
+    client = Client(auth, json_loads=fast_loads)
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _stdlib_loads(data):
+    return json.loads(data)
+
+
+fast_loads = orjson.loads if orjson is not None else _stdlib_loads
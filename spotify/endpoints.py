@@ -5,17 +5,39 @@ All functions return a tuple of `method (str), url (str), params (dict), payload
 in that order (`params` and `payload` are optional).
 ex. ('GET', '/me/tracks', {'limit': 40})
 
-All functions defined here are decorated to convert the return value to a dict with keys {method, url, params, payload}.
+All functions defined here are wrapped to convert the return value to a `RequestSpec`,
+a read-only dict like object with keys {method, url, params, payload, data, additional_headers}
+and `endpoint`, the name of the function. `None` valued params and payload values are dropped.
+
+Functions taking a list of ids are marked with `_batch`, clients split longer
+id lists into several requests and merge the results.
 """
-from decorator import decorator as _deco
-import sys as _sys
-import inspect as _inspect
+from functools import wraps as _wraps
+from types import FunctionType as _FunctionType
+
+from .spec import RequestSpec as _RequestSpec
+
+
+_batched = {}
+
+
+def _batch(arg, limit, key=None):
+    """
+    Mark an endpoint function whose `arg` argument is a list of at most `limit` ids.
+    `key` is the response key holding the list of results, None when the response
+    is the list itself (or empty).
+    """
+    def mark(function):
+        _batched[function.__name__] = (arg, limit, key)
+        return function
+    return mark
 
 
 def album(id, market=None):
     return 'GET', '/albums/{}'.format(id), {'market': market}
 
 
+@_batch('ids', 20, 'albums')
 def albums(ids, market=None):
     ids = ','.join(ids)
     return 'GET', '/albums', dict(ids=ids, market=market)
@@ -29,6 +51,7 @@ def artist(id):
     return 'GET', '/artists/{}'.format(id),
 
 
+@_batch('ids', 50, 'artists')
 def artists(ids):
     ids = ','.join(ids)
     return 'GET', '/artists', {'ids': ids}
@@ -49,10 +72,12 @@ def track_audio_features(track_id):
     return 'GET', '/audio-features/{}'.format(track_id)
 
 
+@_batch('ids', 50, 'tracks')
 def tracks(ids, market=None):
     return 'GET', '/tracks', {'market': market, 'ids': ','.join(ids)}
 
 
+@_batch('track_ids', 100, 'audio_features')
 def tracks_audio_features(track_ids):
     return 'GET', '/audio-features', dict(ids=','.join(track_ids))
 
@@ -126,19 +151,22 @@ def me_following(type='artist', limit=50, after=None):
     return 'GET', '/me/following', dict(type=type, limit=limit, after=after)
 
 
+@_batch('ids', 50)
 def me_follow(type, ids):
     """
     Follow artists or users. Max 50 ids
     """
-    return 'PUT', '/me/following', {'type': type}, {'ids': ids}
+    return 'PUT', '/me/following', {'type': type}, {'ids': list(ids)}
 
 
+@_batch('ids', 50)
 def me_unfollow(type, ids):
-    return 'DELETE', '/me/following', {'type': type}, {'ids': ids}
+    return 'DELETE', '/me/following', {'type': type}, {'ids': list(ids)}
 
 
+@_batch('ids', 50)
 def me_following_contains(type, ids):
-    return 'GET', '/me/following/contains', {'type': type, 'ids': ids},
+    return 'GET', '/me/following/contains', {'type': type, 'ids': ','.join(ids)},
 
 
 def me_follow_playlist(owner_id, playlist_id, public=True):
@@ -160,6 +188,7 @@ def users_following_contains_playlists(owner_id, playlist_id, user_ids):
     )
 
 
+@_batch('ids', 50)
 def me_tracks_add(ids):
     return 'PUT', '/me/tracks', {'ids': ','.join(ids)}
 
@@ -168,14 +197,17 @@ def me_tracks(limit=50, offset=0, market=None):
     return 'GET', '/me/tracks', dict(limit=limit, offset=offset, market=market)
 
 
+@_batch('ids', 50)
 def me_tracks_remove(ids):
-    return 'DELETE', '/me/tracks', dict(ids=ids)
+    return 'DELETE', '/me/tracks', dict(ids=','.join(ids))
 
 
+@_batch('ids', 50)
 def me_tracks_contains(ids):
-    return 'GET', '/me/tracks/contains', dict(ids=ids)
+    return 'GET', '/me/tracks/contains', dict(ids=','.join(ids))
 
 
+@_batch('ids', 20)
 def me_albums_add(ids):
     return 'PUT', '/me/albums', {'ids': ','.join(ids)}
 
@@ -184,12 +216,14 @@ def me_albums(limit=50, offset=0, market=None):
     return 'GET', '/me/albums', dict(limit=limit, offset=offset, market=market)
 
 
+@_batch('ids', 20)
 def me_albums_remove(ids):
-    return 'DELETE', '/me/albums', dict(ids=ids)
+    return 'DELETE', '/me/albums', dict(ids=','.join(ids))
 
 
+@_batch('ids', 20)
 def me_albums_contains(ids):
-    return 'GET', '/me/albums/contains', dict(ids=ids)
+    return 'GET', '/me/albums/contains', dict(ids=','.join(ids))
 
 
 def me_top(type, limit=50, offset=0, time_range='medium_term'):
@@ -237,8 +271,14 @@ def user_playlist_create(user_id, name, public=True, collaborative=False, descri
     )
 
 
+def _uris(track_uris):
+    # Lists of URIs or an `ids.IdSet`
+    uris = getattr(track_uris, 'uris', None)
+    return list(uris() if uris is not None else track_uris)
+
+
 def user_playlist_tracks_add(user_id, playlist_id, track_uris, position=None):
-    payload = {'uris': track_uris}
+    payload = {'uris': _uris(track_uris)}
     if position is not None:
         payload['position'] = position
     return (
@@ -246,8 +286,15 @@ def user_playlist_tracks_add(user_id, playlist_id, track_uris, position=None):
     )
 
 
+def user_playlist_tracks_replace(user_id, playlist_id, track_uris):
+    return (
+        'PUT', '/users/{}/playlists/{}/tracks'.format(user_id, playlist_id), {},
+        {'uris': _uris(track_uris)}
+    )
+
+
 def user_playlist_tracks_remove_all_occurences(user_id, playlist_id, track_uris, snapshot_id=None):
-    payload = {'tracks': [{'uri': uri} for uri in track_uris]}
+    payload = {'tracks': [{'uri': uri} for uri in _uris(track_uris)]}
     if snapshot_id:
         payload['snapshot_id'] = snapshot_id
     return (
@@ -317,47 +364,22 @@ def me_player_volume(volume_percent, device_id=None):
 
 
 
-@_deco
-def _clear_none_params(function, *args, **kwargs):
+def _request_spec(function):
     """
-    Decorator to clear any None value query and payload params from
-    endpoint function results.
+    Wrap an endpoint function to return a `RequestSpec` of its result tuple.
     """
-    result = function(*args, **kwargs)
-    if 'params' in result:
-        result['params'] = {k: v for k,
-                            v in result['params'].items() if v is not None}
-    if 'payload' in result:
-        result['payload'] = {k: v for k,
-                             v in result['payload'].items() if v is not None}
-    return result
-
-
-@_deco
-def _tuple_to_dict(function, *args, **kwargs):
-    rtuple = function(*args, **kwargs)
-    result = {}
-    keys = ('method', 'url', 'params', 'payload', 'data', 'additional_headers')
-    for i, value in enumerate(rtuple):
-        result[keys[i]] = value
-    return result
+    name = function.__name__
 
-
-# Apply _clear_none_params decorator to all endpoint functions in this module
-_current_module = _sys.modules[__name__]
-
-
-def _is_resource(obj):
-    return (
-        _inspect.isfunction(obj)
-        and obj.__module__ == __name__
-        and not obj.__name__.startswith('_')
-    )
+    @_wraps(function)
+    def endpoint(*args, **kwargs):
+        return _RequestSpec(*function(*args, **kwargs), endpoint=name)
+    return endpoint
 
 
+# Wrap all endpoint functions in this module
 _endpoints = {}
 
-for name, function in _inspect.getmembers(_current_module, _is_resource):
-    function = _clear_none_params(_tuple_to_dict(function))
-    _endpoints[name] = function
-    setattr(_current_module, name, function)
+for _name, _function in list(globals().items()):
+    if (isinstance(_function, _FunctionType) and _function.__module__ == __name__
+            and not _name.startswith('_')):
+        _endpoints[_name] = globals()[_name] = _request_spec(_function)
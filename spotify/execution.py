@@ -0,0 +1,102 @@
+"""
+Planned requests, executed in bulk.
+
+`client.plan` has a method per endpoint returning the request spec instead of
+sending it, `client.execute_many` sends any number of specs (of any
+endpoints) with bounded concurrency and yields a `PlanResult` for each,
+holding the response or the exception it raised, as they complete.
+
+ex.
+    specs = [client.plan.track(id) for id in track_ids]
+    specs.append(client.plan.artists(artist_ids))
+    for result in client.execute_many(specs, concurrency=16):
+        if result.error is None:
+            ...
+"""
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from . import chunking
+from . import endpoints
+
+PlanResult = namedtuple('PlanResult', 'index spec result error')
+PlanResult.__doc__ = """
+`index` of the spec in the executed specs, the parsed `result` (None on error)
+and the `error` raised (None on success).
+"""
+
+
+class ChunkedSpec:
+    """
+    Planned call of an id list endpoint with more ids than one request takes,
+    executed as one request per chunk, sent concurrently like the chunks of
+    `client.api` calls, and merged.
+    """
+    __slots__ = ('specs', 'key', 'endpoint')
+
+    def __init__(self, specs, key):
+        self.specs = specs
+        self.key = key
+        self.endpoint = specs[0].endpoint
+
+    def __repr__(self):
+        return 'ChunkedSpec({}, {} requests)'.format(self.endpoint, len(self.specs))
+
+
+def plan_method(func):
+    # Methods of `client.plan`, see `api.api_class`
+    if func.__name__ in endpoints._batched:
+        def method(self, *args, **kwargs):
+            specs, key = chunking.split(func, args, kwargs)
+            return specs[0] if len(specs) == 1 else ChunkedSpec(specs, key)
+    else:
+        def method(self, *args, **kwargs):
+            return func(*args, **kwargs)
+    return method
+
+
+def execute_many(client, specs, concurrency, ordered):
+    # Generator of `PlanResult`, see `Client.execute_many`
+    def execute(index, spec):
+        try:
+            if isinstance(spec, ChunkedSpec):
+                responses = client.executor.map(client._send, spec.specs)
+                response = chunking.merge(list(responses), spec.key)
+            else:
+                response = client._send(spec)
+            return PlanResult(index, spec, client._loaded(response), None)
+        except Exception as e:
+            return PlanResult(index, spec, None, e)
+
+    specs = enumerate(specs)
+    # Own threads, chunks are sent on the client's executor and could wait on
+    # its own workers otherwise
+    with ThreadPoolExecutor(concurrency) as executor:
+        if ordered:
+            pending = deque()
+            try:
+                for index, spec in specs:
+                    pending.append(executor.submit(execute, index, spec))
+                    if len(pending) >= concurrency:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+        else:
+            pending = set()
+            try:
+                for index, spec in specs:
+                    pending.add(executor.submit(execute, index, spec))
+                    if len(pending) >= concurrency:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield future.result()
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            finally:
+                for future in pending:
+                    future.cancel()
@@ -0,0 +1,318 @@
+"""
+Bulk export of the current user's library.
+
+Saved tracks and albums, followed artists, playlists with their tracks and the
+audio features of every distinct track are streamed to a writer in bounded
+batches. Pages are fetched concurrently through `Client.paginate`.
+
+Tables written:
+    tracks: one flattened row per saved or playlist track, `source` is 'saved_tracks' or
+        'playlists'
+    albums: saved albums
+    artists: followed artists
+    playlists: the user's playlists
+    audio_features: one row per distinct track id
+
+ex.
+    exporter = LibraryExporter(client, NDJSONWriter('export/'))
+    stats = exporter.export()
+"""
+import json
+import os
+import time
+
+TRACK_COLUMNS = (
+    'source', 'playlist_id', 'position', 'added_at', 'track_id', 'track_name', 'track_uri',
+    'duration_ms', 'explicit', 'popularity', 'isrc', 'album_id', 'album_name',
+    'album_release_date', 'artist_ids', 'artist_names'
+)
+ALBUM_COLUMNS = (
+    'added_at', 'album_id', 'album_name', 'album_type', 'release_date', 'total_tracks',
+    'label', 'popularity', 'artist_ids', 'artist_names'
+)
+ARTIST_COLUMNS = ('artist_id', 'artist_name', 'genres', 'popularity', 'followers')
+PLAYLIST_COLUMNS = (
+    'playlist_id', 'playlist_name', 'owner_id', 'snapshot_id', 'tracks_total', 'public',
+    'collaborative'
+)
+AUDIO_FEATURE_COLUMNS = (
+    'track_id', 'danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness',
+    'acousticness', 'instrumentalness', 'liveness', 'valence', 'tempo', 'duration_ms',
+    'time_signature'
+)
+
+TABLE_COLUMNS = {
+    'tracks': TRACK_COLUMNS,
+    'albums': ALBUM_COLUMNS,
+    'artists': ARTIST_COLUMNS,
+    'playlists': PLAYLIST_COLUMNS,
+    'audio_features': AUDIO_FEATURE_COLUMNS,
+}
+
+# Columnar types of the non-string columns
+COLUMN_TYPES = {
+    'position': 'int64', 'duration_ms': 'int64', 'explicit': 'bool_', 'popularity': 'int64',
+    'total_tracks': 'int64', 'followers': 'int64', 'tracks_total': 'int64', 'public': 'bool_',
+    'collaborative': 'bool_', 'key': 'int64', 'mode': 'int64', 'time_signature': 'int64',
+    'danceability': 'float64', 'energy': 'float64', 'loudness': 'float64',
+    'speechiness': 'float64', 'acousticness': 'float64', 'instrumentalness': 'float64',
+    'liveness': 'float64', 'valence': 'float64', 'tempo': 'float64',
+}
+
+SOURCES = ('saved_tracks', 'saved_albums', 'followed_artists', 'playlists', 'audio_features')
+
+
+def _joined(objects, key):
+    return ','.join(obj.get(key) or '' for obj in objects or ())
+
+
+def track_row(track, source, added_at=None, playlist_id=None, position=None):
+    """
+    Flatten a track object into a row of `TRACK_COLUMNS`.
+    """
+    album = track.get('album') or {}
+    return {
+        'source': source,
+        'playlist_id': playlist_id,
+        'position': position,
+        'added_at': added_at,
+        'track_id': track.get('id'),
+        'track_name': track.get('name'),
+        'track_uri': track.get('uri'),
+        'duration_ms': track.get('duration_ms'),
+        'explicit': track.get('explicit'),
+        'popularity': track.get('popularity'),
+        'isrc': (track.get('external_ids') or {}).get('isrc'),
+        'album_id': album.get('id'),
+        'album_name': album.get('name'),
+        'album_release_date': album.get('release_date'),
+        'artist_ids': _joined(track.get('artists'), 'id'),
+        'artist_names': _joined(track.get('artists'), 'name'),
+    }
+
+
+def album_row(saved):
+    album = saved['album']
+    return {
+        'added_at': saved.get('added_at'),
+        'album_id': album.get('id'),
+        'album_name': album.get('name'),
+        'album_type': album.get('album_type'),
+        'release_date': album.get('release_date'),
+        'total_tracks': album.get('total_tracks'),
+        'label': album.get('label'),
+        'popularity': album.get('popularity'),
+        'artist_ids': _joined(album.get('artists'), 'id'),
+        'artist_names': _joined(album.get('artists'), 'name'),
+    }
+
+
+def artist_row(artist):
+    return {
+        'artist_id': artist.get('id'),
+        'artist_name': artist.get('name'),
+        'genres': ','.join(artist.get('genres') or ()),
+        'popularity': artist.get('popularity'),
+        'followers': (artist.get('followers') or {}).get('total'),
+    }
+
+
+def playlist_row(playlist):
+    return {
+        'playlist_id': playlist.get('id'),
+        'playlist_name': playlist.get('name'),
+        'owner_id': (playlist.get('owner') or {}).get('id'),
+        'snapshot_id': playlist.get('snapshot_id'),
+        'tracks_total': (playlist.get('tracks') or {}).get('total'),
+        'public': playlist.get('public'),
+        'collaborative': playlist.get('collaborative'),
+    }
+
+
+def audio_features_row(features):
+    return {column: features.get(column if column != 'track_id' else 'id')
+            for column in AUDIO_FEATURE_COLUMNS}
+
+
+class NDJSONWriter:
+
+    def __init__(self, directory):
+        """
+        Writes each table to `<directory>/<table>.ndjson`, one JSON object per line.
+        """
+        self.directory = directory
+        self._files = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, table, rows):
+        f = self._files.get(table)
+        if f is None:
+            f = self._files[table] = open(
+                os.path.join(self.directory, table + '.ndjson'), 'w', encoding='utf-8'
+            )
+        f.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+
+class ParquetWriter:
+
+    def __init__(self, directory, compression='snappy'):
+        """
+        Writes each table to `<directory>/<table>.parquet`, one row group per batch.
+        Requires `pyarrow`.
+        """
+        import pyarrow
+        import pyarrow.parquet
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.directory = directory
+        self.compression = compression
+        self._writers = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def schema(self, table):
+        pa = self._pa
+        return pa.schema([
+            (column, getattr(pa, COLUMN_TYPES.get(column, 'string'))())
+            for column in TABLE_COLUMNS[table]
+        ])
+
+    def write(self, table, rows):
+        writer = self._writers.get(table)
+        if writer is None:
+            writer = self._writers[table] = self._pq.ParquetWriter(
+                os.path.join(self.directory, table + '.parquet'), self.schema(table),
+                compression=self.compression
+            )
+        writer.write_table(self._pa.Table.from_pylist(rows, schema=writer.schema))
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+class LibraryExporter:
+
+    def __init__(self, client, writer, batch_size=1000, prefetch=8, progress=None):
+        """
+        Args:
+            client(Client): Client authorized as the user to export, returning dicts
+                (not `models`)
+            writer: `NDJSONWriter`, `ParquetWriter` or any object with
+                `write(table, rows)` and `close()`
+            batch_size(int): Rows buffered per table before they're written
+            prefetch(int): Pages fetched ahead while paginating
+            progress(callable): Optional, called with the stats dict after every written batch
+        """
+        self.client = client
+        self.writer = writer
+        self.batch_size = batch_size
+        self.prefetch = prefetch
+        self.progress = progress
+        self.stats = {}
+        self._buffers = {}
+        self._track_ids = set()
+        self._pending_features = []
+        self._features = False
+        self._started = None
+
+    def export(self, sources=SOURCES):
+        """
+        Export `sources` (a subset of `SOURCES`) and close the writer.
+        Audio features are fetched for the distinct tracks of the other sources.
+
+        Returns the stats dict: rows written per table, `seconds` and `rows_per_second`.
+        """
+        self._started = time.monotonic()
+        self.stats = {'rows': {}, 'seconds': 0.0, 'rows_per_second': 0.0}
+        self._features = 'audio_features' in sources
+        try:
+            if 'saved_tracks' in sources:
+                self._export_saved_tracks()
+            if 'saved_albums' in sources:
+                self._export_saved_albums()
+            if 'followed_artists' in sources:
+                self._export_followed_artists()
+            if 'playlists' in sources:
+                self._export_playlists()
+            self._fetch_features(flush=True)
+            for table in list(self._buffers):
+                self._flush(table)
+        finally:
+            self.writer.close()
+        return self.stats
+
+    def _paginate(self, endpoint, *args, **kwargs):
+        return self.client.paginate(endpoint, *args, prefetch=self.prefetch, **kwargs)
+
+    def _export_saved_tracks(self):
+        for saved in self._paginate(self.client.api.me_tracks, limit=50):
+            self._add_track(saved.get('track'), 'saved_tracks', saved.get('added_at'))
+
+    def _export_saved_albums(self):
+        for saved in self._paginate(self.client.api.me_albums, limit=50):
+            self._add('albums', album_row(saved))
+
+    def _export_followed_artists(self):
+        for artist in self._paginate(self.client.api.me_following, 'artist', limit=50):
+            self._add('artists', artist_row(artist))
+
+    def _export_playlists(self):
+        playlists = list(self._paginate(self.client.api.me_playlists, limit=50))
+        for playlist in playlists:
+            self._add('playlists', playlist_row(playlist))
+        for playlist in playlists:
+            items = self._paginate(
+                self.client.api.user_playlist_tracks, playlist['owner']['id'], playlist['id'],
+                limit=100
+            )
+            for position, item in enumerate(items):
+                self._add_track(
+                    item.get('track'), 'playlists', item.get('added_at'), playlist['id'], position
+                )
+
+    def _add_track(self, track, source, added_at=None, playlist_id=None, position=None):
+        if not track or track.get('type', 'track') != 'track':
+            return  # Removed tracks and podcast episodes
+        self._add('tracks', track_row(track, source, added_at, playlist_id, position))
+        track_id = track.get('id')
+        if self._features and track_id and track_id not in self._track_ids:
+            self._track_ids.add(track_id)
+            self._pending_features.append(track_id)
+            self._fetch_features()
+
+    def _fetch_features(self, flush=False):
+        # Requests features in batches, the chunks of each batch concurrently
+        if not self._pending_features:
+            return
+        if not flush and len(self._pending_features) < self.batch_size:
+            return
+        ids, self._pending_features = self._pending_features, []
+        response = self.client.api.tracks_audio_features(ids)
+        for features in response['audio_features']:
+            if features:
+                self._add('audio_features', audio_features_row(features))
+
+    def _add(self, table, row):
+        buffer = self._buffers.setdefault(table, [])
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self._flush(table)
+
+    def _flush(self, table):
+        rows = self._buffers.pop(table, None)
+        if not rows:
+            return
+        self.writer.write(table, rows)
+        counts = self.stats['rows']
+        counts[table] = counts.get(table, 0) + len(rows)
+        seconds = time.monotonic() - self._started
+        self.stats['seconds'] = seconds
+        self.stats['rows_per_second'] = sum(counts.values()) / seconds if seconds else 0.0
+        if self.progress is not None:
+            self.progress(self.stats)
@@ -0,0 +1,129 @@
+"""
+Audio features as NumPy arrays.
+
+`Client.audio_features_matrix` requests the features of any number of tracks,
+100 ids per call and several calls at once, and fills a preallocated float32
+matrix with one row per track id and one column per feature in `COLUMNS`.
+Rows of tracks without features are NaN and masked.
+Requires `numpy` (`pip install spotify-api[numpy]`).
+
+ex.
+    matrix = client.audio_features_matrix(track_ids, cache='features.npy')
+    matrix.column('tempo'), matrix['4uLU6hMCjMI75M1A2tKUQC']
+"""
+from operator import itemgetter
+
+import numpy
+
+from . import endpoints
+
+COLUMNS = (
+    'danceability', 'energy', 'key', 'loudness', 'mode', 'speechiness', 'acousticness',
+    'instrumentalness', 'liveness', 'valence', 'tempo', 'duration_ms', 'time_signature'
+)
+CHUNK_SIZE = 100
+ID_DTYPE = 'S22'
+
+
+class FeatureMatrix:
+
+    def __init__(self, ids, values):
+        """
+        Args:
+            ids(numpy.ndarray): Track ids as bytes (`S22`), one per row
+            values(numpy.ndarray): float32 matrix of shape (len(ids), len(COLUMNS))
+        """
+        self.ids = ids
+        self.values = values
+        self.columns = COLUMNS
+        self._index = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def mask(self):
+        """
+        Boolean array, True for the rows of tracks without features (or with
+        some missing), the rows masked by `masked()`.
+        """
+        return numpy.isnan(self.values).any(axis=1)
+
+    @property
+    def index(self):
+        """
+        Dict of track id to row, built on first use.
+        """
+        if self._index is None:
+            self._index = {id.decode(): row for row, id in enumerate(self.ids.tolist())}
+        return self._index
+
+    def __getitem__(self, track_id):
+        return self.values[self.index[track_id]]
+
+    def column(self, name):
+        return self.values[:, self.columns.index(name)]
+
+    def masked(self):
+        """
+        The values as a `numpy.ma.MaskedArray`, rows without features masked.
+        """
+        return numpy.ma.masked_array(
+            self.values, numpy.broadcast_to(self.mask[:, None], self.values.shape)
+        )
+
+    def save(self, path):
+        """
+        Write the matrix to `path` (.npy is added if missing) and the ids next to
+        it (`<path>.ids.npy`).
+        """
+        path = npy_path(path)
+        numpy.save(path, self.values)
+        numpy.save(_ids_path(path), self.ids)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Load a saved matrix, memory mapped (read only) by default.
+        """
+        path = npy_path(path)
+        return cls(
+            numpy.load(_ids_path(path), mmap_mode=mmap_mode),
+            numpy.load(path, mmap_mode=mmap_mode)
+        )
+
+
+def npy_path(path):
+    """
+    `path` ending in .npy, as `numpy.save` writes it.
+    """
+    return path if path.endswith('.npy') else path + '.npy'
+
+
+def _ids_path(path):
+    return path[:-len('.npy')] + '.ids.npy'
+
+
+def fetch(client, track_ids, prefetch=8):
+    """
+    Request the audio features of `track_ids` into a new `FeatureMatrix`.
+    """
+    track_ids = list(track_ids)
+    values = numpy.full((len(track_ids), len(COLUMNS)), numpy.nan, dtype=numpy.float32)
+    row_of = itemgetter(*COLUMNS)
+    specs = (
+        endpoints.tracks_audio_features(track_ids[start:start + CHUNK_SIZE])
+        for start in range(0, len(track_ids), CHUNK_SIZE)
+    )
+    offset = 0
+    for response in client._prefetch(specs, prefetch):
+        # Results come in the order of the requested ids, null for unknown tracks
+        results = response['audio_features']
+        rows = [i for i, features in enumerate(results) if features]
+        if rows:
+            # None values convert to NaN
+            values[numpy.asarray(rows) + offset] = numpy.array(
+                [row_of(results[i]) for i in rows], dtype=numpy.float32
+            )
+        offset += CHUNK_SIZE
+    return FeatureMatrix(numpy.array(track_ids, dtype=ID_DTYPE), values)
@@ -0,0 +1,283 @@
+"""
+Listening history of many users.
+
+A `HistoryPoller` polls `me_player_recently_played` for any number of users,
+each with their own token (refreshed as needed) and `after` cursor, over one
+shared connection pool and thread pool. Users with new plays are polled every
+`min_interval` seconds, each poll without any doubles a user's interval up to
+`max_interval`. Polls and token refreshes are jittered so users added
+together don't stay in step.
+
+New plays are yielded as `ListeningEvent`s by `events()`, which runs until
+`stop()` is called.
+
+ex.
+    poller = HistoryPoller(CLIENT_ID, CLIENT_SECRET, concurrency=32)
+    for user_id, token, after in saved_users:
+        poller.add_user(user_id, token, after=after)
+    for event in poller.events():
+        save(event.user_id, event.played_at, event.track['id'])
+        cursors = poller.cursors()  # Persist now and then
+"""
+import heapq
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+import requests
+
+from .auth import OAuth
+from .client import Client
+
+ListeningEvent = namedtuple('ListeningEvent', 'type user_id played_at track item')
+ListeningEvent.__doc__ = """
+`type` is 'played' for plays from the recently played history, 'playing' when
+a user's currently playing track changes (with `currently_playing=True`) and
+'error' for failed polls (`item` holds the exception).
+`played_at` is in milliseconds since the epoch.
+"""
+
+
+class _User:
+    __slots__ = ('id', 'auth', 'client', 'after', 'interval', 'playing', 'polls', 'active')
+
+    def __init__(self, id, auth, client, after, interval):
+        self.id = id
+        self.auth = auth
+        self.client = client
+        self.after = after
+        self.interval = interval
+        self.playing = None
+        self.polls = 0
+        self.active = True
+
+
+class HistoryPoller:
+
+    def __init__(self, client_id, client_secret, concurrency=16, min_interval=60,
+                 max_interval=1800, backoff=2.0, jitter=0.1, refresh_margin=300,
+                 currently_playing=False, requests_session=None, scheduler=None,
+                 **client_kwargs):
+        """
+        Args:
+            client_id(str), client_secret(str): The app the users authorized
+            concurrency(int): Polls running at once
+            min_interval(float): Seconds between polls of active users
+            max_interval(float): Longest seconds between polls of idle users,
+                recently played only keeps 50 tracks so keep it under their length
+            backoff(float): Factor an idle user's interval grows by after each poll
+            jitter(float): Random fraction intervals are shortened or lengthened by
+            refresh_margin(float): Tokens are refreshed when they expire in less
+                than between this and twice this many seconds, random per user
+            currently_playing(bool): Also poll `me_player_currently_playing`, users
+                playing something count as active
+            requests_session: Session shared by all users, defaults to the session
+                shared by clients
+            scheduler(RequestScheduler): Optional, retries throttled requests and
+                limits the rate of the requests of all users together
+            client_kwargs: Passed to every user's `Client`
+        """
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.refresh_margin = refresh_margin
+        self.currently_playing = currently_playing
+        self.requests_session = requests_session
+        self.scheduler = scheduler
+        self.client_kwargs = client_kwargs
+
+        self.polls = 0
+        self.plays = 0
+        self.errors = 0
+        self._users = {}
+        self._queue = []  # (time of next poll, sequence, _User)
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._wakeup = Future()  # Completed when a poll may be due sooner than expected
+        self._running = False
+        self._random = random.Random()
+
+    def add_user(self, user_id, token, after=None):
+        """
+        Start polling a user, replacing them if already added.
+
+        Args:
+            user_id(str): Any key identifying the user in events
+            token(dict): The user's token, as stored by `OAuth.token`
+            after(int): Optional cursor, only plays after it (ms since the epoch)
+                are emitted. Defaults to emitting the history Spotify still has.
+        """
+        auth = OAuth(
+            self.client_id, self.client_secret,
+            auto_refresh=self.refresh_margin * (1 + self._random.random()),
+            **({'requests': self.requests_session} if self.requests_session else {})
+        )
+        auth.token = token
+        client = Client(auth, requests_session=self.requests_session,
+                        scheduler=self.scheduler, **self.client_kwargs)
+        user = _User(user_id, auth, client, after, self.min_interval)
+        with self._lock:
+            old = self._users.get(user_id)
+            if old is not None:
+                old.active = False
+            self._users[user_id] = user
+            # First polls spread over the shortest interval
+            self._schedule(user, self._random.uniform(0, self.min_interval))
+
+    def remove_user(self, user_id):
+        with self._lock:
+            user = self._users.pop(user_id, None)
+            if user is not None:
+                user.active = False
+
+    def cursors(self):
+        """
+        Dict of user id to their `after` cursor, to pass to `add_user` when resuming.
+        """
+        with self._lock:
+            return {user.id: user.after for user in self._users.values()}
+
+    def token(self, user_id):
+        """
+        The current token of a user, it changes as it's refreshed.
+        """
+        return self._users[user_id].auth._token
+
+    def _schedule(self, user, delay):
+        self._sequence += 1
+        heapq.heappush(self._queue, (time.monotonic() + delay, self._sequence, user))
+        self._wake()
+
+    def _wake(self):
+        if not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    def _due(self, limit):
+        # Users due for a poll, at most `limit`, seconds until the next one
+        # and a future completed when that may change
+        users = []
+        with self._lock:
+            now = time.monotonic()
+            while self._queue and len(users) < limit:
+                at, _, user = self._queue[0]
+                if at > now:
+                    break
+                heapq.heappop(self._queue)
+                if user.active:
+                    users.append(user)
+            wait = None
+            if self._queue and len(users) < limit:
+                wait = max(0.0, self._queue[0][0] - now)
+            if self._wakeup.done():
+                self._wakeup = Future()
+        return users, wait, self._wakeup
+
+    def events(self):
+        """
+        Generator of `ListeningEvent`s, polls users until `stop()` is called.
+        Each user's plays are yielded oldest first. A user's cursor moves past
+        their plays once all of them were yielded.
+        """
+        self._running = True
+        pending = {}
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            try:
+                while self._running or pending:
+                    timeout, wakeup = None, None
+                    if self._running:
+                        users, timeout, wakeup = self._due(self.concurrency - len(pending))
+                        for user in users:
+                            pending[executor.submit(self._poll, user)] = user
+                    done, _ = wait([*pending, wakeup] if wakeup else pending, timeout,
+                                   return_when=FIRST_COMPLETED)
+                    for future in done:
+                        user = pending.pop(future, None)
+                        if user is None:
+                            continue
+                        events, active, after = future.result()
+                        self._reschedule(user, active, events)
+                        yield from events
+                        user.after = after
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def stop(self):
+        """
+        Make `events()` return, after yielding the events of the polls in flight.
+        """
+        self._running = False
+        with self._lock:
+            self._wake()
+
+    def _reschedule(self, user, active, events):
+        with self._lock:
+            self.polls += 1
+            self.plays += sum(1 for event in events if event.type == 'played')
+            self.errors += sum(1 for event in events if event.type == 'error')
+            if not user.active:
+                return
+            if active:
+                user.interval = self.min_interval
+            else:
+                user.interval = min(self.max_interval, user.interval * self.backoff)
+            delay = user.interval * self._random.uniform(1 - self.jitter, 1 + self.jitter)
+            self._schedule(user, delay)
+
+    def _poll(self, user):
+        # Returns the user's new events, whether they were active and their new cursor
+        events = []
+        api = user.client.api
+        after = user.after
+        user.polls += 1
+        try:
+            while True:
+                page = api.me_player_recently_played(limit=50, after=after)
+                items = [item for item in page['items'] if item is not None]
+                for item in sorted(items, key=lambda item: item['played_at']):
+                    played_at = _milliseconds(item['played_at'])
+                    events.append(ListeningEvent(
+                        'played', user.id, played_at, item['track'], item
+                    ))
+                cursors = page.get('cursors') or {}
+                if cursors.get('after'):
+                    after = int(cursors['after'])
+                elif events:
+                    after = events[-1].played_at
+                # A full page may have more plays after it
+                if len(items) < page.get('limit', 50) or not items:
+                    break
+            active = bool(events)
+            if self.currently_playing:
+                playing = api.me_player_currently_playing()
+                if playing and playing.get('is_playing') and playing.get('item'):
+                    active = True
+                    track = playing['item']
+                    if track.get('id') != user.playing:
+                        user.playing = track.get('id')
+                        events.append(ListeningEvent(
+                            'playing', user.id, playing.get('timestamp'), track, playing
+                        ))
+            return events, active, after
+        except (requests.RequestException, KeyError, ValueError) as e:
+            events.append(ListeningEvent('error', user.id, None, None, e))
+            return events, False, after
+
+    def stats(self):
+        with self._lock:
+            return {'users': len(self._users), 'polls': self.polls, 'plays': self.plays,
+                    'errors': self.errors}
+
+
+def _milliseconds(timestamp):
+    # '2020-01-01T00:00:00.123Z', the fraction is left out when it's 0
+    seconds, _, fraction = timestamp.rstrip('Z').partition('.')
+    parsed = datetime.strptime(seconds, '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp()) * 1000 + int((fraction + '000')[:3])
@@ -0,0 +1,401 @@
+"""
+Compact Spotify ids.
+
+Spotify ids are 128 bit integers written as 22 base62 digits. `encode` and
+`decode` convert between the two, `encode_many` and `decode_many` do the same
+for arrays of ids at once. Ids can be given as URIs (`spotify:track:<id>`).
+
+`IdSet` and `IdMap` keep ids as two sorted uint64 arrays, 16 bytes per id
+against ~90 for a string in a set, with vectorized membership tests and
+joins. Id list endpoints accept them in place of lists, `IdSet.uris()` gives
+the URIs for the playlist endpoints.
+Everything but `encode` and `decode` requires `numpy`
+(`pip install spotify-api[numpy]`).
+
+ex.
+    saved = IdSet(track_ids)
+    saved.contains(other_ids)  # Boolean array
+    client.api.tracks(saved - IdSet(removed_ids))
+    plays = IdMap(track_ids, counts)
+    plays.lookup(track_ids, default=0)
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+ID_LENGTH = 22
+
+_VALUES = {char: digit for digit, char in enumerate(ALPHABET)}
+if numpy is not None:
+    _CHARS = numpy.frombuffer(ALPHABET.encode(), dtype=numpy.uint8)
+    _DIGITS = numpy.full(256, 255, dtype=numpy.uint8)
+    _DIGITS[_CHARS] = numpy.arange(len(ALPHABET), dtype=numpy.uint8)
+    _MASK = numpy.uint64(0xFFFFFFFF)
+    _SHIFT = numpy.uint64(32)
+    _BASE = numpy.uint64(len(ALPHABET))
+# Digits converted per step of limb arithmetic, 62 ** 5 < 2 ** 30 leaves room
+# for the carries in uint64
+_GROUPS = (2, 5, 5, 5, 5)
+# Ids converted at once, keeps the temporary arrays in cache
+_BLOCK = 1 << 16
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError('Id arrays require numpy (pip install spotify-api[numpy])')
+
+
+def _id(id):
+    # URIs end with the id
+    return id[-ID_LENGTH:]
+
+
+def encode(id):
+    """
+    The 128 bit integer of an id or URI.
+    """
+    value = 0
+    id = _id(id)
+    if len(id) != ID_LENGTH:
+        raise ValueError('Invalid Spotify id: {!r}'.format(id))
+    try:
+        for char in id:
+            value = value * 62 + _VALUES[char]
+    except KeyError:
+        raise ValueError('Invalid Spotify id: {!r}'.format(id)) from None
+    if value >> 128:
+        raise ValueError('Spotify id out of range: {!r}'.format(id))
+    return value
+
+
+def decode(value):
+    """
+    The id of a 128 bit integer.
+    """
+    chars = []
+    for _ in range(ID_LENGTH):
+        value, digit = divmod(value, 62)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def uri(type, id):
+    return 'spotify:{}:{}'.format(type, id)
+
+
+def encode_many(ids):
+    """
+    Encode an iterable of ids or URIs.
+    Returns `(high, low)`, uint64 arrays of the upper and lower 64 bits.
+    """
+    _require_numpy()
+    chars = numpy.array([_id(id) for id in ids], dtype='S{}'.format(ID_LENGTH))
+    high = numpy.empty(len(chars), dtype=numpy.uint64)
+    low = numpy.empty(len(chars), dtype=numpy.uint64)
+    for start in range(0, len(chars), _BLOCK):
+        block = chars[start:start + _BLOCK]
+        digits = _DIGITS[block.view(numpy.uint8).reshape(-1, ID_LENGTH)]
+        invalid = (digits == 255).any(axis=1)
+        if invalid.any():
+            raise ValueError('Invalid Spotify id: {!r}'.format(
+                block[invalid.argmax()].decode()
+            ))
+        # Four 32 bit limbs, most significant first
+        limbs = numpy.zeros((4, len(block)), dtype=numpy.uint64)
+        column = 0
+        for size in _GROUPS:
+            carry = numpy.zeros(len(block), dtype=numpy.uint64)
+            for digit in digits[:, column:column + size].T:
+                carry = carry * _BASE + digit
+            column += size
+            multiplier = numpy.uint64(62 ** size)
+            for limb in limbs[::-1]:
+                value = limb * multiplier + carry
+                numpy.bitwise_and(value, _MASK, out=limb)
+                carry = value >> _SHIFT
+            if carry.any():
+                raise ValueError('Spotify id out of range: {!r}'.format(
+                    block[carry.argmax()].decode()
+                ))
+        high[start:start + _BLOCK] = limbs[0] << _SHIFT | limbs[1]
+        low[start:start + _BLOCK] = limbs[2] << _SHIFT | limbs[3]
+    return high, low
+
+
+def decode_many(high, low):
+    """
+    Decode the uint64 arrays of `encode_many` to a list of ids.
+    """
+    _require_numpy()
+    high = numpy.asarray(high, dtype=numpy.uint64)
+    low = numpy.asarray(low, dtype=numpy.uint64)
+    ids = []
+    for start in range(0, len(high), _BLOCK):
+        h, l = high[start:start + _BLOCK], low[start:start + _BLOCK]
+        limbs = [h >> _SHIFT, h & _MASK, l >> _SHIFT, l & _MASK]
+        digits = numpy.empty((len(h), ID_LENGTH), dtype=numpy.uint8)
+        column = ID_LENGTH
+        for size in reversed(_GROUPS):
+            # Long division of the limbs by 62 ** size
+            divisor = numpy.uint64(62 ** size)
+            remainder = numpy.zeros(len(h), dtype=numpy.uint64)
+            for limb in limbs:
+                value = remainder << _SHIFT | limb
+                numpy.floor_divide(value, divisor, out=limb)
+                remainder = value % divisor
+            remainder = remainder.astype(numpy.uint32)
+            for _ in range(size):
+                column -= 1
+                remainder, digits[:, column] = numpy.divmod(remainder, numpy.uint32(62))
+        ids.extend(_CHARS[digits].view('S{}'.format(ID_LENGTH)).ravel().astype(str).tolist())
+    return ids
+
+
+def _keys(ids):
+    # (high, low) of an IdSet, IdMap or iterable of ids
+    if isinstance(ids, (IdSet, IdMap)):
+        return ids.high, ids.low
+    if isinstance(ids, str):
+        ids = [ids]
+    return encode_many(ids)
+
+
+def _positions(high, low, ids):
+    # Positions of `ids` in the sorted `high`, `low` arrays, -1 where missing
+    query_high, query_low = _keys(ids)
+    if not len(high):
+        return numpy.full(len(query_high), -1, dtype=numpy.intp)
+    # Searching in sorted order is cache friendly
+    order = query_high.argsort()
+    positions = numpy.empty(len(query_high), dtype=numpy.intp)
+    positions[order] = high.searchsorted(query_high[order])
+    clipped = numpy.minimum(positions, len(high) - 1)
+    following = numpy.minimum(positions + 1, len(high) - 1)
+    # Ids sharing their upper 64 bits, practically never
+    shared = (following != clipped) & (high[following] == query_high)
+    for i in numpy.flatnonzero(shared):
+        end = high.searchsorted(query_high[i], side='right')
+        positions[i] += low[positions[i]:end].searchsorted(query_low[i])
+    clipped = numpy.minimum(positions, len(high) - 1)
+    found = (high[clipped] == query_high) & (low[clipped] == query_low)
+    return numpy.where(found, positions, -1)
+
+
+def _sorted(high, low):
+    # Order of the keys, and a mask of the last of each run of equal keys
+    order = numpy.lexsort((low, high))
+    high, low = high[order], low[order]
+    last = numpy.ones(len(high), dtype=bool)
+    last[:-1] = (high[1:] != high[:-1]) | (low[1:] != low[:-1])
+    return order, last
+
+
+class IdSet:
+    """
+    Immutable set of ids, iterated in the order of their integer values.
+    """
+
+    def __init__(self, ids=(), type=None):
+        """
+        Args:
+            ids(iterable): Ids or URIs, or another `IdSet` or `IdMap`
+            type(str): Object type for `uris()`, taken from the URIs when not given
+        """
+        _require_numpy()
+        if not isinstance(ids, (IdSet, IdMap, numpy.ndarray)):
+            ids = list(ids)
+            if type is None and ids and ids[0].startswith('spotify:'):
+                type = ids[0].split(':')[1]
+        elif type is None and not isinstance(ids, numpy.ndarray):
+            type = ids.type
+        high, low = _keys(ids)
+        order, last = _sorted(high, low)
+        order = order[last]
+        self.high = high[order]
+        self.low = low[order]
+        self.type = type
+
+    @classmethod
+    def _from_sorted(cls, high, low, type):
+        self = cls.__new__(cls)
+        self.high, self.low, self.type = high, low, type
+        return self
+
+    def __len__(self):
+        return len(self.high)
+
+    def __iter__(self):
+        for start in range(0, len(self), _BLOCK):
+            yield from decode_many(self.high[start:start + _BLOCK], self.low[start:start + _BLOCK])
+
+    def __contains__(self, id):
+        return bool(self.contains([id])[0])
+
+    def contains(self, ids):
+        """
+        Boolean array, True for each of `ids` in the set.
+        """
+        return _positions(self.high, self.low, ids) >= 0
+
+    def uris(self):
+        """
+        Generator of the URIs of the ids, `type` has to be known.
+        """
+        if self.type is None:
+            raise ValueError('URIs of an IdSet without a type')
+        prefix = 'spotify:{}:'.format(self.type)
+        return (prefix + id for id in self)
+
+    def _select(self, mask):
+        return IdSet._from_sorted(self.high[mask], self.low[mask], self.type)
+
+    def union(self, other):
+        other = other if isinstance(other, IdSet) else IdSet(other)
+        return IdSet._from_sorted(
+            *_merged(self.high, self.low, other.high, other.low), self.type or other.type
+        )
+
+    def intersection(self, other):
+        return self._select(_contained(self, other))
+
+    def difference(self, other):
+        return self._select(~_contained(self, other))
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def __eq__(self, other):
+        if not isinstance(other, IdSet):
+            return NotImplemented
+        return (numpy.array_equal(self.high, other.high)
+                and numpy.array_equal(self.low, other.low))
+
+    @property
+    def nbytes(self):
+        return self.high.nbytes + self.low.nbytes
+
+    def save(self, path):
+        """
+        Write the set to a .npy file.
+        """
+        numpy.save(path, numpy.stack([self.high, self.low]))
+
+    @classmethod
+    def load(cls, path, type=None, mmap=True):
+        _require_numpy()
+        keys = numpy.load(path, mmap_mode='r' if mmap else None)
+        return cls._from_sorted(keys[0], keys[1], type)
+
+    def __repr__(self):
+        return '<IdSet of {} {}ids>'.format(len(self), self.type + ' ' if self.type else '')
+
+
+def _contained(ids, other):
+    # Mask of the `ids` (IdSet) that are in `other`
+    if not isinstance(other, (IdSet, IdMap)):
+        other = IdSet(other)
+    return _positions(other.high, other.low, ids) >= 0
+
+
+def _merged(high, low, other_high, other_low):
+    high = numpy.concatenate([high, other_high])
+    low = numpy.concatenate([low, other_low])
+    order, last = _sorted(high, low)
+    order = order[last]
+    return high[order], low[order]
+
+
+class IdMap:
+    """
+    Immutable mapping of ids to the rows of a NumPy array of values.
+    """
+
+    def __init__(self, ids, values, type=None):
+        """
+        Args:
+            ids(iterable): Ids or URIs, later ones win when repeated
+            values(array_like): One value (or row) per id
+            type(str): Object type of the ids
+        """
+        _require_numpy()
+        if not isinstance(ids, (IdSet, IdMap)):
+            ids = list(ids)
+        high, low = _keys(ids)
+        values = numpy.asarray(values)
+        if len(values) != len(high):
+            raise ValueError('{} values for {} ids'.format(len(values), len(high)))
+        order, last = _sorted(high, low)
+        order = order[last]
+        self.high = high[order]
+        self.low = low[order]
+        self.values = values[order]
+        self.type = type
+
+    def __len__(self):
+        return len(self.high)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    @property
+    def ids(self):
+        return IdSet._from_sorted(self.high, self.low, self.type)
+
+    def __contains__(self, id):
+        return bool(self.index([id])[0] >= 0)
+
+    def index(self, ids):
+        """
+        Rows of `ids` in `values`, -1 for ids not in the map.
+        """
+        return _positions(self.high, self.low, ids)
+
+    def __getitem__(self, id):
+        position = self.index([id])[0]
+        if position < 0:
+            raise KeyError(id)
+        return self.values[position]
+
+    def get(self, id, default=None):
+        position = self.index([id])[0]
+        return default if position < 0 else self.values[position]
+
+    def lookup(self, ids, default=None):
+        """
+        Array of the values of `ids`, `default` for ids not in the map.
+        """
+        positions = self.index(ids)
+        missing = positions < 0
+        if not len(self):
+            result = numpy.empty((len(positions),) + self.values.shape[1:], self.values.dtype)
+        else:
+            result = self.values[numpy.where(missing, 0, positions)]
+        if missing.any():
+            if default is None and result.dtype.kind != 'O':
+                result = result.astype(object)
+            result[missing] = default
+        return result
+
+    def join(self, other):
+        """
+        Inner join on the ids with another `IdMap`.
+        Returns `(ids, values, other_values)`, an `IdSet` of the common ids and the
+        values of both maps in its order.
+        """
+        positions = _positions(other.high, other.low, self)
+        found = positions >= 0
+        ids = IdSet._from_sorted(self.high[found], self.low[found], self.type or other.type)
+        return ids, self.values[found], other.values[positions[found]]
+
+    def items(self):
+        return zip(self.ids, self.values)
+
+    @property
+    def nbytes(self):
+        return self.high.nbytes + self.low.nbytes + self.values.nbytes
+
+    def __repr__(self):
+        return '<IdMap of {} {}ids>'.format(len(self), self.type + ' ' if self.type else '')
@@ -0,0 +1,337 @@
+"""
+Request instrumentation.
+
+An `Instrumentation` passed to `Client` calls its `before_request` hooks with a
+`RequestEvent` as each request starts and its `after_request` hooks with the
+same, completed, event once it's done (or failed). Clients without one skip
+all of it.
+
+`Metrics` is a built-in after-request hook keeping per endpoint latency,
+time to first byte and size histograms plus retry, cache and token refresh
+counts, with `snapshot()` and Prometheus text export.
+
+ex.
+    metrics = Metrics()
+    client = Client(auth, instrumentation=Instrumentation(metrics))
+    ...
+    print(metrics.prometheus())
+"""
+import inspect
+import threading
+import time
+from functools import lru_cache
+
+from . import endpoints
+
+# `le` bounds of the exported Prometheus histograms
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+@lru_cache(maxsize=None)
+def url_template(endpoint):
+    """
+    The URL of `endpoint` (an endpoint function name) with `{}` in place of its
+    arguments, ex. '/users/{}/playlists/{}/tracks'. None when unknown.
+    """
+    function = endpoints._endpoints.get(endpoint)
+    if function is None:
+        return None
+    parameters = inspect.signature(function).parameters.values()
+    args = ['{}' for p in parameters
+            if p.default is p.empty and p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]
+    try:
+        return function(*args).url
+    except Exception:
+        return None
+
+
+class RequestEvent:
+    """
+    A request as seen by the hooks.
+
+    Attributes:
+        endpoint(str): Name of the endpoint function, None for raw `request` calls
+        method(str), url(str): The URL is templated (see `url_template`) when the
+            endpoint is known
+        status(int): Status of the final response, None when served from the cache
+            or when no response was received
+        seconds(float): Wall time of the whole call
+        ttfb(float): Seconds until the final response's headers arrived
+        bytes(int): Size of the final response body
+        retries(int): Requests repeated by the scheduler
+        cache(str): 'hit', 'revalidated' or 'miss' with a response cache, else None
+        token_refresh(float): Seconds spent renewing the access token, if it was
+        error(Exception): What the call raised, if anything
+    """
+    __slots__ = (
+        'endpoint', 'method', 'url', 'status', 'started', 'seconds', 'ttfb', 'bytes',
+        'retries', 'cache', 'token_refresh', 'error', '_attempts'
+    )
+
+    def __init__(self, endpoint, method, url):
+        self.endpoint = endpoint
+        self.method = method
+        self.url = url
+        self.status = None
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.ttfb = None
+        self.bytes = None
+        self.retries = 0
+        self.cache = None
+        self.token_refresh = None
+        self.error = None
+        self._attempts = 0
+
+    def counting(self, send):
+        # `send` counting its calls, for retries
+        def counted():
+            self._attempts += 1
+            return send()
+        return counted
+
+    def received(self, response):
+        self.status = response.status_code
+        self.bytes = len(response.content)
+        self.retries = max(0, self._attempts - 1)
+        elapsed = getattr(response, 'elapsed', None)
+        if elapsed is not None:
+            self.ttfb = elapsed.total_seconds()
+
+    def __repr__(self):
+        return 'RequestEvent({} {} status={} seconds={})'.format(
+            self.method, self.url, self.status, self.seconds
+        )
+
+
+class Instrumentation:
+
+    def __init__(self, *after_request, before_request=()):
+        """
+        Args:
+            after_request(callable): Hooks called with each completed `RequestEvent`,
+                ex. a `Metrics`
+            before_request(list): Hooks called with each `RequestEvent` as it starts
+        Hooks run on the requesting thread and should be quick, exceptions they
+        raise propagate to the caller.
+        """
+        self.before_request = list(before_request)
+        self.after_request = list(after_request)
+
+    def start(self, endpoint, method, url):
+        if endpoint is not None:
+            url = url_template(endpoint) or url
+        event = RequestEvent(endpoint, method, url)
+        for hook in self.before_request:
+            hook(event)
+        return event
+
+    def finish(self, event, error=None):
+        event.seconds = time.perf_counter() - event.started
+        if error is not None:
+            event.error = error
+            response = getattr(error, 'response', None)
+            if response is not None and event.status is None:
+                event.received(response)
+        for hook in self.after_request:
+            hook(event)
+
+
+class Histogram:
+    """
+    Log-linear histogram of non-negative values, HDR style: buckets are exact
+    below `2 ** precision` units and within `2 ** (1 - precision)` relative
+    error above, recording is O(1).
+    """
+
+    def __init__(self, unit=1e-6, precision=7):
+        """
+        Args:
+            unit(float): Resolution, values are recorded as integer multiples of it
+            precision(int): Bits of the linear sub-buckets
+        """
+        self.unit = unit
+        self._bits = precision
+        self._half = 1 << (precision - 1)
+        self.counts = []
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def _index(self, units):
+        exponent = units.bit_length() - self._bits
+        if exponent <= 0:
+            return units
+        return self._half * exponent + (units >> exponent)
+
+    def _lower(self, index):
+        # Smallest value of bucket `index`, in units
+        if index < 2 * self._half:
+            return index
+        exponent = index // self._half - 1
+        return (index - self._half * exponent) << exponent
+
+    def record(self, value):
+        index = self._index(int(value / self.unit))
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """
+        Value below which `fraction` (0 to 1) of the recorded values fall.
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, round(fraction * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                # Upper end of the bucket, capped at the largest value seen
+                return min(self.max, (self._lower(index + 1) - 1) * self.unit)
+        return self.max
+
+    def cumulative(self, bounds):
+        """
+        Counts of recorded values <= each of `bounds`, as Prometheus buckets.
+        """
+        result = []
+        seen = 0
+        index = 0
+        for bound in bounds:
+            limit = int(bound / self.unit)
+            while index < len(self.counts) and self._lower(index + 1) - 1 <= limit:
+                seen += self.counts[index]
+                index += 1
+            result.append(seen)
+        return result
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+        }
+
+
+class _Series:
+    __slots__ = ('seconds', 'ttfb', 'bytes', 'retries', 'errors')
+
+    def __init__(self):
+        self.seconds = Histogram()
+        self.ttfb = Histogram()
+        self.bytes = Histogram(unit=1)
+        self.retries = 0
+        self.errors = 0
+
+
+class Metrics:
+    """
+    After-request hook aggregating events per `(endpoint, method, status)`.
+    """
+
+    def __init__(self):
+        self._series = {}
+        self.cache = {'hit': 0, 'revalidated': 0, 'miss': 0}
+        self.token_refreshes = Histogram()
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        key = (event.endpoint or '', event.method, event.status or 0)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series()
+            series.seconds.record(event.seconds)
+            if event.ttfb is not None:
+                series.ttfb.record(event.ttfb)
+            if event.bytes is not None:
+                series.bytes.record(event.bytes)
+            series.retries += event.retries
+            if event.error is not None:
+                series.errors += 1
+            if event.cache is not None:
+                self.cache[event.cache] += 1
+            if event.token_refresh is not None:
+                self.token_refreshes.record(event.token_refresh)
+
+    def snapshot(self):
+        """
+        Dict of the current values: `requests` maps `(endpoint, method, status)`
+        to summaries of `seconds`, `ttfb` and `bytes` with `retries` and `errors`.
+        """
+        with self._lock:
+            return {
+                'requests': {
+                    key: {
+                        'seconds': series.seconds.summary(),
+                        'ttfb': series.ttfb.summary(),
+                        'bytes': series.bytes.summary(),
+                        'retries': series.retries,
+                        'errors': series.errors,
+                    }
+                    for key, series in self._series.items()
+                },
+                'cache': dict(self.cache),
+                'token_refreshes': self.token_refreshes.summary(),
+            }
+
+    def prometheus(self, prefix='spotify'):
+        """
+        The metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            series = sorted(self._series.items())
+            histograms = (
+                ('request_duration_seconds', 'seconds', SECONDS_BUCKETS,
+                 'Wall time of API calls'),
+                ('request_ttfb_seconds', 'ttfb', SECONDS_BUCKETS,
+                 'Time to the first byte of API responses'),
+                ('response_bytes', 'bytes', BYTES_BUCKETS, 'Size of API response bodies'),
+            )
+            for name, attribute, bounds, help in histograms:
+                name = '{}_{}'.format(prefix, name)
+                lines.append('# HELP {} {}'.format(name, help))
+                lines.append('# TYPE {} histogram'.format(name))
+                for key, values in series:
+                    histogram = getattr(values, attribute)
+                    labels = _labels(key)
+                    for bound, count in zip(bounds, histogram.cumulative(bounds)):
+                        lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, count))
+                    lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(
+                        name, labels, histogram.count))
+                    lines.append('{}_sum{{{}}} {}'.format(name, labels, histogram.sum))
+                    lines.append('{}_count{{{}}} {}'.format(name, labels, histogram.count))
+            for name, attribute, help in (('retries_total', 'retries', 'Retried requests'),
+                                          ('errors_total', 'errors', 'Failed API calls')):
+                name = '{}_{}'.format(prefix, name)
+                lines.append('# HELP {} {}'.format(name, help))
+                lines.append('# TYPE {} counter'.format(name))
+                for key, values in series:
+                    lines.append('{}{{{}}} {}'.format(name, _labels(key), getattr(values, attribute)))
+            name = prefix + '_cache_lookups_total'
+            lines.append('# HELP {} Response cache lookups by result'.format(name))
+            lines.append('# TYPE {} counter'.format(name))
+            for result, count in sorted(self.cache.items()):
+                lines.append('{}{{result="{}"}} {}'.format(name, result, count))
+            name = prefix + '_token_refresh_seconds'
+            lines.append('# HELP {} Time spent renewing access tokens'.format(name))
+            lines.append('# TYPE {} summary'.format(name))
+            lines.append('{}_sum {}'.format(name, self.token_refreshes.sum))
+            lines.append('{}_count {}'.format(name, self.token_refreshes.count))
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(key):
+    endpoint, method, status = key
+    return 'endpoint="{}",method="{}",status="{}"'.format(endpoint, method, status)
@@ -0,0 +1,212 @@
+"""
+Lightweight response models.
+
+Objects are loaded into `__slots__` classes by their `type` (track, album,
+artist, playlist), paging objects into `Paging` and saved/playlist items into
+`Item`. Nested objects are loaded in turn, lists as tuples, unknown dicts
+stay dicts. Lists of strings repeated across objects (`available_markets`,
+`genres`) share one tuple and enum-like strings (`type`, `album_type`, ...)
+are interned, so millions of loaded tracks don't hold millions of copies.
+
+Fields a model doesn't declare are kept and readable as attributes too.
+
+ex.
+    client = Client(auth, models=True)
+    track = client.api.track(id)
+    track.name, track.album.name
+"""
+import sys
+
+_MISSING = object()
+
+# Fields whose values repeat across objects
+_INTERNED = frozenset(('type', 'album_type', 'album_group', 'release_date_precision'))
+_SHARED = frozenset(('available_markets', 'genres'))
+_MAX_SHARED = 4096
+_shared = {}  # tuple -> the same tuple, the one instance loaded models share
+
+
+def _share(value):
+    key = tuple(value)
+    shared = _shared.get(key)
+    if shared is None:
+        if len(_shared) >= _MAX_SHARED:
+            _shared.clear()
+        shared = _shared[key] = key
+    return shared
+
+
+def _slot(obj, name):
+    # Value of a slot, _MISSING when unset (`__getattr__` would give None)
+    try:
+        return object.__getattribute__(obj, name)
+    except AttributeError:
+        return _MISSING
+
+
+class Model:
+    __slots__ = ('_extra',)
+
+    _fields = ()
+    _nested = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._keys = frozenset(cls._fields)
+        cls._nested_keys = frozenset(cls._nested)
+
+    def __init__(self, data):
+        extra = None
+        for key, value in data.items():
+            if key in self._keys:
+                if key in _INTERNED and type(value) is str:
+                    value = sys.intern(value)
+                setattr(self, key, value)
+            elif key in self._nested_keys:
+                if key in _SHARED and type(value) is list:
+                    value = _share(value)
+                else:
+                    value = load(value)
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        self._extra = extra
+
+    def __getattr__(self, name):
+        # Only called for unset slots and undeclared fields
+        if name in self._keys or name in self._nested_keys:
+            return None
+        extra = object.__getattribute__(self, '_extra')
+        if extra is not None and name in extra:
+            return extra[name]
+        raise AttributeError(name)
+
+    def to_dict(self):
+        """
+        The object as plain dicts and lists.
+        """
+        result = {}
+        for key in self._fields:
+            value = _slot(self, key)
+            if value is not _MISSING:
+                result[key] = value
+        for key in self._nested:
+            value = _slot(self, key)
+            if value is not _MISSING:
+                result[key] = _to_plain(value)
+        result.update(self._extra or {})
+        return result
+
+    def __repr__(self):
+        return '{}(id={!r}, name={!r})'.format(
+            type(self).__name__, getattr(self, 'id', None), getattr(self, 'name', None)
+        )
+
+
+class Artist(Model):
+    _fields = ('id', 'name', 'uri', 'href', 'type', 'popularity')
+    _nested = ('genres', 'images', 'followers', 'external_urls')
+    __slots__ = _fields + _nested
+
+
+class Album(Model):
+    _fields = (
+        'id', 'name', 'uri', 'href', 'type', 'album_type', 'album_group', 'label',
+        'popularity', 'release_date', 'release_date_precision', 'total_tracks'
+    )
+    _nested = (
+        'artists', 'tracks', 'images', 'genres', 'copyrights', 'available_markets',
+        'external_ids', 'external_urls'
+    )
+    __slots__ = _fields + _nested
+
+
+class Track(Model):
+    _fields = (
+        'id', 'name', 'uri', 'href', 'type', 'duration_ms', 'explicit', 'popularity',
+        'track_number', 'disc_number', 'is_local', 'is_playable', 'preview_url'
+    )
+    _nested = (
+        'album', 'artists', 'available_markets', 'external_ids', 'external_urls',
+        'linked_from'
+    )
+    __slots__ = _fields + _nested
+
+
+class Playlist(Model):
+    _fields = (
+        'id', 'name', 'uri', 'href', 'type', 'collaborative', 'public', 'snapshot_id',
+        'description'
+    )
+    _nested = ('owner', 'tracks', 'images', 'followers', 'external_urls')
+    __slots__ = _fields + _nested
+
+
+class Paging(Model):
+    _fields = ('href', 'limit', 'next', 'offset', 'previous', 'total')
+    _nested = ('items', 'cursors')
+    __slots__ = _fields + _nested
+
+    def __iter__(self):
+        return iter(self.items or ())
+
+    def __len__(self):
+        return len(self.items or ())
+
+    def __repr__(self):
+        return 'Paging(offset={!r}, total={!r})'.format(
+            getattr(self, 'offset', None), getattr(self, 'total', None)
+        )
+
+
+class Item(Model):
+    """
+    Saved track/album or playlist track, an object with the time it was added.
+    """
+    _fields = ('added_at', 'is_local', 'played_at')
+    _nested = ('track', 'album', 'added_by', 'context')
+    __slots__ = _fields + _nested
+
+    def __repr__(self):
+        return 'Item(added_at={!r}, track={!r})'.format(
+            getattr(self, 'added_at', None), getattr(self, 'track', None)
+        )
+
+
+TYPES = {
+    'artist': Artist,
+    'album': Album,
+    'track': Track,
+    'playlist': Playlist,
+}
+
+
+def load(value):
+    """
+    Load a parsed JSON value into models.
+    """
+    if type(value) is list:
+        return tuple(load(item) for item in value)
+    if type(value) is not dict:
+        return value
+    model = TYPES.get(value.get('type'))
+    if model is not None:
+        return model(value)
+    if 'items' in value and ('total' in value or 'next' in value):
+        return Paging(value)
+    if 'added_at' in value or 'played_at' in value:
+        return Item(value)
+    # Wrappers like {'tracks': [...]}
+    return {key: load(item) for key, item in value.items()}
+
+
+def _to_plain(value):
+    if isinstance(value, Model):
+        return value.to_dict()
+    if isinstance(value, (list, tuple)):
+        return [_to_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _to_plain(item) for key, item in value.items()}
+    return value
@@ -0,0 +1,169 @@
+"""
+Bulk playlist mutations.
+
+Spotify takes at most 100 tracks per add, replace or remove call. Edits of any
+size are split into valid calls which run in order per playlist, each removal
+carrying the `snapshot_id` returned by the previous call so positions refer to
+the playlist as it was after it. Edits of different playlists run concurrently.
+
+ex.
+    editor = PlaylistEditor(client)
+    snapshot_id = editor.replace(user_id, playlist_id, uris)
+    results = editor.run([
+        Edit('replace', user_id, playlist_a, uris_a),
+        Edit('append', user_id, playlist_b, uris_b),
+    ])
+"""
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from . import endpoints
+
+MAX_TRACKS = 100
+
+OPERATIONS = ('replace', 'append', 'insert', 'remove', 'remove_positions')
+
+Edit = namedtuple('Edit', ('operation', 'user_id', 'playlist_id', 'uris', 'position'))
+Edit.__new__.__defaults__ = (None,)
+Edit.__doc__ = """
+An edit of a playlist, `operation` is one of `OPERATIONS`:
+    replace: Make `uris` the playlist's tracks
+    append: Add `uris` at the end
+    insert: Add `uris` starting at `position`
+    remove: Remove every occurrence of `uris`
+    remove_positions: Remove `uris`, a list of `(uri, position)`
+"""
+
+MutationResult = namedtuple('MutationResult', ('playlist_id', 'snapshot_id', 'requests', 'error'))
+MutationResult.__doc__ = """
+Outcome of the edits of a playlist: the final `snapshot_id`, the number of
+requests sent and the exception that stopped them, if any.
+"""
+
+
+def _chunks(items):
+    items = list(items)
+    return [items[i:i + MAX_TRACKS] for i in range(0, len(items), MAX_TRACKS)]
+
+
+def plan(edit):
+    """
+    Returns the list of `RequestSpec` performing `edit`, to send in order.
+    """
+    user_id, playlist_id = edit.user_id, edit.playlist_id
+    if edit.operation == 'replace':
+        chunks = _chunks(edit.uris) or [[]]
+        return [endpoints.user_playlist_tracks_replace(user_id, playlist_id, chunks[0])] + [
+            endpoints.user_playlist_tracks_add(user_id, playlist_id, chunk)
+            for chunk in chunks[1:]
+        ]
+    if edit.operation == 'append':
+        return [endpoints.user_playlist_tracks_add(user_id, playlist_id, chunk)
+                for chunk in _chunks(edit.uris)]
+    if edit.operation == 'insert':
+        if edit.position is None:
+            raise ValueError('Inserting into a playlist needs a position')
+        return [
+            endpoints.user_playlist_tracks_add(
+                user_id, playlist_id, chunk, edit.position + i * MAX_TRACKS
+            )
+            for i, chunk in enumerate(_chunks(edit.uris))
+        ]
+    if edit.operation == 'remove':
+        return [
+            endpoints.user_playlist_tracks_remove_all_occurences(user_id, playlist_id, chunk)
+            for chunk in _chunks(OrderedDict.fromkeys(edit.uris))
+        ]
+    if edit.operation == 'remove_positions':
+        # Last positions first, so removing a chunk doesn't shift the next ones
+        specs = []
+        for chunk in _chunks(sorted(edit.uris, key=lambda pair: pair[1], reverse=True)):
+            positions = OrderedDict()
+            for uri, position in chunk:
+                positions.setdefault(uri, []).append(position)
+            tracks = [{'uri': uri, 'positions': p} for uri, p in positions.items()]
+            specs.append(endpoints.user_playlist_tracks_remove_specific_occurences(
+                user_id, playlist_id, tracks
+            ))
+        return specs
+    raise ValueError('Unknown playlist edit operation {!r}'.format(edit.operation))
+
+
+class PlaylistEditor:
+
+    def __init__(self, client, concurrency=8):
+        """
+        Args:
+            client(Client): Client authorized to modify the playlists
+            concurrency(int): Playlists edited at once by `run`
+        """
+        self.client = client
+        self.concurrency = concurrency
+
+    def replace(self, user_id, playlist_id, uris):
+        """
+        Replace the playlist's tracks with `uris`. Returns the final snapshot_id.
+        """
+        return self._edit(Edit('replace', user_id, playlist_id, uris))
+
+    def append(self, user_id, playlist_id, uris, snapshot_id=None):
+        return self._edit(Edit('append', user_id, playlist_id, uris), snapshot_id)
+
+    def insert(self, user_id, playlist_id, uris, position, snapshot_id=None):
+        return self._edit(Edit('insert', user_id, playlist_id, uris, position), snapshot_id)
+
+    def remove(self, user_id, playlist_id, uris, snapshot_id=None):
+        """
+        Remove every occurrence of `uris`.
+        """
+        return self._edit(Edit('remove', user_id, playlist_id, uris), snapshot_id)
+
+    def remove_positions(self, user_id, playlist_id, tracks, snapshot_id=None):
+        """
+        Remove the `(uri, position)` pairs of `tracks`, positions in the playlist
+        at `snapshot_id` (or as it is now).
+        """
+        return self._edit(Edit('remove_positions', user_id, playlist_id, tracks), snapshot_id)
+
+    def run(self, edits, snapshot_ids=None):
+        """
+        Apply `edits`, in order per playlist and concurrently across playlists.
+        A playlist's edits stop at its first failed request.
+
+        Args:
+            edits(iterable): `Edit`s
+            snapshot_ids(dict): Optional, playlist id to the snapshot the first
+                removal of that playlist applies to
+        Returns:
+            A list of `MutationResult`, one per playlist in order of first edit
+        """
+        by_playlist = OrderedDict()
+        for edit in edits:
+            by_playlist.setdefault(edit.playlist_id, []).append(edit)
+        snapshot_ids = snapshot_ids or {}
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            return list(executor.map(
+                lambda item: self._apply(item[0], item[1], snapshot_ids.get(item[0])),
+                by_playlist.items()
+            ))
+
+    def _edit(self, edit, snapshot_id=None):
+        result = self._apply(edit.playlist_id, [edit], snapshot_id)
+        if result.error is not None:
+            raise result.error
+        return result.snapshot_id
+
+    def _apply(self, playlist_id, edits, snapshot_id):
+        sent = 0
+        try:
+            for edit in edits:
+                for spec in plan(edit):
+                    if snapshot_id and 'tracks' in spec.payload:
+                        # Removals apply to the playlist as the last call left it
+                        spec = spec.replace(payload=dict(spec.payload, snapshot_id=snapshot_id))
+                    response = self.client._send(spec)
+                    sent += 1
+                    snapshot_id = (response or {}).get('snapshot_id', snapshot_id)
+        except Exception as e:
+            return MutationResult(playlist_id, snapshot_id, sent, e)
+        return MutationResult(playlist_id, snapshot_id, sent, None)
@@ -0,0 +1,81 @@
+"""
+Helpers for walking paged endpoint results.
+
+Spotify returns lists as paging objects, either offset based
+(`items`, `limit`, `offset`, `total`) or cursor based (`items`, `next`, `cursors`).
+Some endpoints wrap the paging object in a key, ex. `me_following` returns
+`{'artists': {...}}` and `search` one key per type.
+"""
+from . import endpoints
+from .spec import RequestSpec
+
+# Endpoints only paged up to an offset, offset + limit can't exceed it
+OFFSET_LIMITS = {
+    'search': 1000,
+}
+
+
+def endpoint_spec(endpoint, *args, **kwargs):
+    """
+    Build the `RequestSpec` for `endpoint` without performing the request.
+    `endpoint` is a function from `spotify.endpoints` or the matching
+    method of a client's `api`.
+    """
+    return endpoints._endpoints[endpoint.__name__](*args, **kwargs)
+
+
+def is_paging_object(obj):
+    return isinstance(obj, dict) and 'items' in obj and 'next' in obj
+
+
+def paging_objects(response):
+    """
+    Returns a list of `(key, paging_object)` in `response`.
+    `key` is None when the response itself is the paging object.
+    """
+    if is_paging_object(response):
+        return [(None, response)]
+    if not isinstance(response, dict):
+        return []
+    return [(key, value) for key, value in response.items() if is_paging_object(value)]
+
+
+def unwrap(response, key):
+    return response if key is None else response[key]
+
+
+def is_offset_paged(page):
+    return page.get('offset') is not None and page.get('total') is not None
+
+
+def remaining_offsets(page, endpoint=None):
+    """
+    Offsets of all pages after `page` of an offset paged result.
+    Pages of `endpoint` are only counted up to its offset limit, if any.
+    """
+    limit = page['limit'] or len(page['items'])
+    if not limit:
+        return range(0)
+    last = min(page['total'], OFFSET_LIMITS.get(endpoint, page['total']))
+    return range(page['offset'] + limit, last, limit)
+
+
+def offset_spec(spec, offset):
+    """
+    Copy of `spec` requesting the page at `offset`, the last page before the
+    endpoint's offset limit is shortened to end at it.
+    """
+    params = {**(spec.params or {}), 'offset': offset}
+    offset_limit = OFFSET_LIMITS.get(spec.endpoint)
+    if offset_limit is not None and params.get('limit'):
+        params['limit'] = min(params['limit'], offset_limit - offset)
+    return spec.replace(params=params)
+
+
+def next_spec(spec, page):
+    """
+    Request for the page after `page` of the request `spec`, or None if it's the last one.
+    """
+    if not page.get('next'):
+        return None
+    return RequestSpec('GET', page['next'], endpoint=spec.endpoint)
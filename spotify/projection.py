@@ -0,0 +1,106 @@
+"""
+Field projections.
+
+A `Projection` is a list of dotted paths into the objects an endpoint returns,
+ex. `['added_at', 'track.id', 'track.artists.name']` for the items of
+`user_playlist_tracks`. It compiles to Spotify's `fields` filter, so only
+those fields are sent, and shapes each object into a flat tuple (or a named
+tuple with `records=True`) of the values. Paths through lists give a list of
+values, missing values are None.
+
+`Client.project` requests a projection of `user_playlist_tracks` pages, or a
+`user_playlist`, in one call.
+
+ex.
+    rows = client.project(client.api.user_playlist_tracks, ['added_at', 'track.id'],
+                          user_id, playlist_id)
+    for added_at, track_id in rows:
+        ...
+"""
+import re
+from collections import namedtuple
+
+# Endpoints taking `fields`, and whether the paths are into the items of their pages
+PROJECTED = {
+    'user_playlist': False,
+    'user_playlist_tracks': True,
+}
+# Fields of paging objects `Client.paginate` needs
+PAGING_FIELDS = ('next', 'total', 'offset', 'limit')
+
+_NAME = re.compile(r'^\w+$')
+
+
+def compile_fields(paths):
+    """
+    Spotify's `fields` filter for a list of dotted paths,
+    ex. `['track.id', 'track.album.name']` -> 'track(id,album(name))'.
+    """
+    tree = {}
+    for path in paths:
+        parts = path.split('.')
+        if not all(_NAME.match(part) for part in parts):
+            raise ValueError('Invalid field path: {!r}'.format(path))
+        node = tree
+        for part in parts[:-1]:
+            child = node.setdefault(part, {})
+            if child is None:
+                # A parent path was requested whole
+                break
+            node = child
+        else:
+            node[parts[-1]] = None
+    return _fields(tree)
+
+
+def _fields(tree):
+    return ','.join(
+        name if node is None else '{}({})'.format(name, _fields(node))
+        for name, node in tree.items()
+    )
+
+
+def _value(obj, parts):
+    for i, part in enumerate(parts):
+        if obj is None:
+            return None
+        if isinstance(obj, list):
+            return [_value(element, parts[i:]) for element in obj]
+        obj = obj.get(part)
+    return obj
+
+
+class Projection:
+
+    def __init__(self, paths, records=False):
+        """
+        Args:
+            paths(list): Dotted paths of the values to keep, in order
+            records(bool): Shape objects into named tuples, fields named after
+                the paths with dots as underscores (`track.id` -> `track_id`),
+                instead of tuples
+        """
+        self.paths = list(paths)
+        self._parts = [path.split('.') for path in self.paths]
+        self.fields = compile_fields(self.paths)
+        self.record = None
+        if records:
+            self.record = namedtuple(
+                'Record', [path.replace('.', '_') for path in self.paths], rename=True
+            )
+
+    def paged_fields(self):
+        """
+        The `fields` filter for pages of items matching the paths.
+        """
+        return 'items({}),{}'.format(self.fields, ','.join(PAGING_FIELDS))
+
+    def __call__(self, obj):
+        """
+        Shape `obj` into a tuple (or record) of the values at the paths.
+        """
+        values = [_value(obj, parts) for parts in self._parts]
+        return tuple(values) if self.record is None else self.record(*values)
+
+    def __repr__(self):
+        return 'Projection({!r})'.format(self.paths)
@@ -0,0 +1,207 @@
+"""
+Rate limit aware scheduling of requests.
+
+A scheduler is shared by every thread (or task) using a client, so they all
+back off together:
+
+ - `429 Too Many Requests` pauses all requests for `Retry-After` seconds and
+   halves the concurrency limit, which then grows back by about one per
+   limit's worth of successful requests (AIMD). A 429 asking to wait longer
+   than `max_retry_after` is returned instead of retried.
+ - Transient 5xx responses are retried after a jittered exponential backoff.
+ - An optional token bucket caps the client-wide request rate.
+
+ex.
+    client = Client(auth, scheduler=RequestScheduler(rate=50, concurrency=16))
+"""
+import asyncio
+import random
+import threading
+import time
+
+RETRY_STATUSES = frozenset((500, 502, 503, 504))
+
+
+class RequestScheduler:
+
+    def __init__(self, rate=None, burst=None, concurrency=16, min_concurrency=1,
+                 max_concurrency=64, max_retries=5, backoff=0.5, max_backoff=30,
+                 max_retry_after=60):
+        """
+        Args:
+            rate(float): Optional, max requests per second
+            burst(int): Size of the token bucket, defaults to `rate`
+            concurrency(int): Initial limit of requests in flight
+            min_concurrency(int): Lower bound of the adaptive concurrency limit
+            max_concurrency(int): Upper bound of the adaptive concurrency limit
+            max_retries(int): Retries per request on 429 and transient 5xx responses,
+                the last response is returned when they run out.
+            backoff(float): Base delay in seconds for 5xx retries and for 429s
+                without `Retry-After`
+            max_backoff(float): Max delay in seconds between retries of a request,
+                `Retry-After` is always waited in full
+            max_retry_after(float): Longest `Retry-After` in seconds to wait for,
+                429s asking for more are returned without pausing requests
+        """
+        self.rate = rate
+        self.burst = burst or max(1, rate or 1)
+        self.limit = float(concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+
+        self.in_flight = 0
+        self.retries = 0
+        self.throttled = 0
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._paused_until = 0.0
+        self._decrease_after = 0.0
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+
+    def send(self, send):
+        """
+        Call `send()` (which performs a request and returns its response) when the
+        limits allow, retrying it as needed. Returns the last response.
+        """
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            try:
+                response = send()
+            finally:
+                self._release()
+            delay = self._feedback(response, attempt)
+            if delay is None:
+                break
+            response.close()  # Release the connection of a streamed response
+            time.sleep(delay)
+        return response
+
+    def stats(self):
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'retries': self.retries,
+            'throttled': self.throttled,
+        }
+
+    def _acquire(self):
+        while True:
+            with self._cond:
+                while self.in_flight >= int(self.limit):
+                    self._cond.wait()
+                delay = self._start_delay()
+                if delay <= 0:
+                    self.in_flight += 1
+                    return
+            time.sleep(delay)
+
+    def _release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def _start_delay(self):
+        # Seconds until a request may start, takes a token when it may start now.
+        # Called with the lock held.
+        now = time.monotonic()
+        if self._paused_until > now:
+            return self._paused_until - now
+        if self.rate is None:
+            return 0
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def _feedback(self, response, attempt):
+        # Adjusts the limits to `response`, returns seconds to wait before
+        # retrying or None when the response is final.
+        status = response.status_code
+        with self._cond:
+            if status == 429:
+                self.throttled += 1
+                now = time.monotonic()
+                retry_after = self._retry_after(response, attempt)
+                if retry_after > self.max_retry_after:
+                    return None
+                self._paused_until = max(self._paused_until, now + retry_after)
+                if now >= self._decrease_after:
+                    # Once per throttling episode
+                    self.limit = max(self.min_concurrency, self.limit / 2)
+                    self._decrease_after = now + retry_after
+                delay = 0  # The pause holds back the retry
+            elif status in RETRY_STATUSES:
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+            else:
+                before = int(self.limit)
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                if int(self.limit) > before:
+                    self._cond.notify()
+                return None
+            if attempt >= self.max_retries:
+                return None
+            self.retries += 1
+            return delay
+
+    def _retry_after(self, response, attempt):
+        try:
+            return float(response.headers['Retry-After'])
+        except (KeyError, ValueError):
+            return min(self.max_backoff, self.backoff * 2 ** attempt)
+
+
+class AsyncRequestScheduler(RequestScheduler):
+    """
+    `RequestScheduler` for `AsyncClient`, shared by the tasks of one event loop.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._async_cond = None
+
+    async def send(self, send):
+        """
+        Await `send()` when the limits allow, retrying it as needed.
+        Returns the last response.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._acquire_async()
+            try:
+                response = await send()
+            finally:
+                await self._release_async()
+            delay = self._feedback(response, attempt)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+        return response
+
+    @property
+    def _waiters(self):
+        if self._async_cond is None:
+            self._async_cond = asyncio.Condition()
+        return self._async_cond
+
+    async def _acquire_async(self):
+        while True:
+            async with self._waiters:
+                await self._waiters.wait_for(lambda: self.in_flight < int(self.limit))
+                with self._lock:
+                    delay = self._start_delay()
+                    if delay <= 0:
+                        self.in_flight += 1
+                        return
+            await asyncio.sleep(delay)
+
+    async def _release_async(self):
+        async with self._waiters:
+            with self._lock:
+                self.in_flight -= 1
+            self._waiters.notify_all()
@@ -0,0 +1,137 @@
+"""
+Exhaustive search.
+
+Spotify pages a search only up to offset 1000. `CatalogSearch` runs a query
+for several types and markets and splits every search with more results than
+that into `year:` ranges, bisecting them until each fits (or is a single
+year). The pages of all partitions are requested concurrently and the items
+yielded as they arrive, each id once.
+
+ex.
+    search = CatalogSearch(client, concurrency=16)
+    for album in search.search('label:"Blue Note"', types=('album',)):
+        ...
+    search.truncated  # Partitions with results beyond the cap
+"""
+import datetime
+import re
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from . import endpoints
+from .paging import OFFSET_LIMITS
+
+# Results reachable per query, offset + limit can't exceed it
+OFFSET_LIMIT = OFFSET_LIMITS['search']
+FIRST_YEAR = 1900
+
+_YEAR_FILTER = re.compile(r'\byear:')
+
+Partition = namedtuple('Partition', 'q type market years')
+Partition.__doc__ = """
+A single type search, `years` is a `(first, last)` range added to the query
+or None.
+"""
+
+
+class CatalogSearch:
+
+    def __init__(self, client, concurrency=8, limit=50, years=None):
+        """
+        Args:
+            client(Client): Client, items are models when it returns them
+            concurrency(int): Pages requested at once
+            limit(int): Page size, at most 50
+            years(tuple): `(first, last)` years searches are split across,
+                defaults to 1900 to the current year
+        """
+        self.client = client
+        self.concurrency = concurrency
+        self.limit = limit
+        self.years = years or (FIRST_YEAR, datetime.date.today().year)
+        self.requests = 0
+        self.partitions = 0
+        self.truncated = []  # (Partition, total) of searches that couldn't be split enough
+
+    def search(self, q, types=('track',), markets=(None,)):
+        """
+        Generator of every item found for `q`, across `types` and `markets`.
+        Items are deduplicated by type and id, in the order pages arrive.
+        """
+        seen = set()
+        queue = deque(
+            (Partition(q, type, market, None), 0) for type in types for market in markets
+        )
+        pending = {}
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            try:
+                while True:
+                    while queue and len(pending) < self.concurrency:
+                        partition, offset = queue.popleft()
+                        future = executor.submit(self._page, partition, offset)
+                        pending[future] = (partition, offset)
+                        self.requests += 1
+                    if not pending:
+                        break
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        partition, offset = pending.pop(future)
+                        page = future.result()
+                        if offset == 0:
+                            self.partitions += 1
+                            self._plan(partition, page, queue)
+                        new = []
+                        for item in page['items']:
+                            if item is None:
+                                continue
+                            key = (partition.type, item['id'])
+                            if key not in seen:
+                                seen.add(key)
+                                new.append(item)
+                        yield from self.client._loaded(new)
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _plan(self, partition, page, queue):
+        # Queue the rest of a partition from its first page: its other pages
+        # when they're reachable, else the first pages of its parts
+        total = page['total']
+        if total > OFFSET_LIMIT:
+            parts = self._split(partition, total)
+            if parts:
+                # First pages go first, they decide what else to request
+                queue.extendleft((part, 0) for part in reversed(parts))
+                return
+            self.truncated.append((partition, total))
+        last = min(total, OFFSET_LIMIT)
+        for offset in range(self.limit, last, self.limit):
+            queue.append((partition, offset))
+
+    def _split(self, partition, total):
+        # Year ranges of an oversized partition, enough of them to fit if the
+        # results were spread evenly, empty when it can't be split
+        if partition.years is None:
+            if _YEAR_FILTER.search(partition.q):
+                return []
+            first, last = self.years
+        else:
+            first, last = partition.years
+        span = last - first + 1
+        if span < 2:
+            return []
+        count = min(span, -(-total // OFFSET_LIMIT) + 1)
+        bounds = [first + span * i // count for i in range(count + 1)]
+        return [partition._replace(years=(start, end - 1))
+                for start, end in zip(bounds, bounds[1:])]
+
+    def _page(self, partition, offset):
+        q = partition.q
+        if partition.years is not None:
+            first, last = partition.years
+            q += ' year:{}'.format(first if first == last else '{}-{}'.format(first, last))
+        limit = min(self.limit, OFFSET_LIMIT - offset)
+        response = self.client._send(endpoints.search(
+            q, partition.type, limit=limit, offset=offset, market=partition.market
+        ))
+        return response[partition.type + 's']
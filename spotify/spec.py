@@ -0,0 +1,57 @@
+"""
+Request specifications returned by the endpoint functions.
+"""
+from collections.abc import Mapping
+
+_FIELDS = ('method', 'url', 'params', 'payload', 'data', 'additional_headers', 'endpoint')
+
+
+def _clear_none(values):
+    if values is None:
+        return None
+    return {k: v for k, v in values.items() if v is not None}
+
+
+class RequestSpec(Mapping):
+    """
+    A request to perform, `None` valued query and payload params are dropped.
+
+    Behaves as a read-only dict of its set fields, so `client.request(**spec)`
+    and `spec['params']` work as well as `spec.params`.
+    """
+    __slots__ = _FIELDS
+
+    def __init__(self, method, url, params=None, payload=None, data=None,
+                 additional_headers=None, endpoint=None):
+        self.method = method
+        self.url = url
+        self.params = _clear_none(params)
+        self.payload = _clear_none(payload) if isinstance(payload, dict) else payload
+        self.data = data
+        self.additional_headers = additional_headers
+        self.endpoint = endpoint
+
+    def replace(self, **fields):
+        """
+        Copy of this spec with `fields` replaced.
+        """
+        values = {field: getattr(self, field) for field in _FIELDS}
+        values.update(fields)
+        return RequestSpec(**values)
+
+    def __getitem__(self, key):
+        value = getattr(self, key, None) if key in _FIELDS else None
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return (field for field in _FIELDS if getattr(self, field) is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return 'RequestSpec({})'.format(
+            ', '.join('{}={!r}'.format(key, value) for key, value in self.items())
+        )
@@ -0,0 +1,256 @@
+"""
+Persistent store of catalog objects.
+
+Albums, tracks and artists rarely change, a `CatalogStore` keeps them in a
+SQLite database (in WAL mode, so any number of processes can read while one
+writes) keyed by object type, id and market. A `Client` with a store answers
+`album`, `albums`, `track`, `tracks`, `artist` and `artists` from it and only
+requests the ids it doesn't have.
+
+ex.
+    store = CatalogStore('catalog.db', max_bytes=2 * 1024 ** 3)
+    store.warm('catalog.ndjson')
+    client = Client(auth, store=store)
+"""
+import gzip
+import json
+import sqlite3
+import threading
+import time
+
+# Endpoint -> (object type, id list argument or None for single lookups)
+STORED = {
+    'album': ('album', None),
+    'albums': ('album', 'ids'),
+    'track': ('track', None),
+    'tracks': ('track', 'ids'),
+    'artist': ('artist', None),
+    'artists': ('artist', 'ids'),
+}
+
+# SQLite's default limit of host parameters is 999 in older versions
+_QUERY_IDS = 500
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS objects ('
+    'type TEXT, id TEXT, market TEXT, value TEXT, size INTEGER, accessed INTEGER, '
+    'PRIMARY KEY (type, id, market)) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS objects_accessed ON objects (accessed)',
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)',
+    "INSERT OR IGNORE INTO meta VALUES ('bytes', 0)",
+    # Keep the total size current for every writer
+    "CREATE TRIGGER IF NOT EXISTS objects_insert AFTER INSERT ON objects BEGIN "
+    "UPDATE meta SET value = value + new.size WHERE key = 'bytes'; END",
+    "CREATE TRIGGER IF NOT EXISTS objects_update AFTER UPDATE OF size ON objects BEGIN "
+    "UPDATE meta SET value = value + new.size - old.size WHERE key = 'bytes'; END",
+    "CREATE TRIGGER IF NOT EXISTS objects_delete AFTER DELETE ON objects BEGIN "
+    "UPDATE meta SET value = value - old.size WHERE key = 'bytes'; END",
+)
+
+
+class CatalogStore:
+
+    def __init__(self, path, max_bytes=None, touch_after=86400, timeout=60):
+        """
+        Args:
+            path(str): SQLite database file, shared by processes
+            max_bytes(int): Optional, least recently used objects are evicted
+                when the stored JSON exceeds this size
+            touch_after(float): Seconds before a read refreshes an object's last
+                use, so most reads don't write
+            timeout(float): Seconds to wait for another process' write
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.touch_after = touch_after
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        with self._transaction() as conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+    def _connection(self):
+        # One connection per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def get(self, type, id, market=None):
+        """
+        The stored object or None.
+        """
+        return self.get_many(type, [id], market).get(id)
+
+    def get_many(self, type, ids, market=None):
+        """
+        Returns a dict of id to object of the stored `ids`.
+        """
+        market = market or ''
+        ids = list(dict.fromkeys(ids))
+        conn = self._connection()
+        found = {}
+        stale = []
+        now = int(time.time())
+        for start in range(0, len(ids), _QUERY_IDS):
+            chunk = ids[start:start + _QUERY_IDS]
+            rows = conn.execute(
+                'SELECT id, value, accessed FROM objects WHERE type = ? AND market = ? '
+                'AND id IN ({})'.format(','.join('?' * len(chunk))),
+                [type, market] + chunk
+            )
+            for id, value, accessed in rows:
+                found[id] = json.loads(value)
+                if accessed < now - self.touch_after:
+                    stale.append(id)
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(ids) - len(found)
+        if stale:
+            with self._transaction() as conn:
+                conn.executemany(
+                    'UPDATE objects SET accessed = ? WHERE type = ? AND id = ? AND market = ?',
+                    [(now, type, id, market) for id in stale]
+                )
+        return found
+
+    def put(self, type, id, obj, market=None):
+        self.put_many(type, [(id, obj)], market)
+
+    def put_many(self, type, objects, market=None):
+        """
+        Store `objects`, an iterable of `(id, object)`.
+        """
+        market = market or ''
+        now = int(time.time())
+        rows = []
+        for id, obj in objects:
+            value = json.dumps(obj, separators=(',', ':'))
+            rows.append((type, id, market, value, len(value), now))
+        if not rows:
+            return
+        with self._transaction() as conn:
+            _upsert(conn, rows)
+        self._evict()
+
+    def warm(self, path, batch_size=10000):
+        """
+        Bulk load objects from an NDJSON file (gzipped when it ends with .gz),
+        as written by `dump` or one Spotify object with a `type` and `id` per line.
+        Returns the number of objects loaded.
+        """
+        opener = gzip.open if path.endswith('.gz') else open
+        count = 0
+        now = int(time.time())
+        rows = []
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if 'object' in record:
+                    obj, market = record['object'], record.get('market') or ''
+                else:
+                    obj, market = record, ''
+                value = json.dumps(obj, separators=(',', ':'))
+                rows.append((obj['type'], obj['id'], market, value, len(value), now))
+                if len(rows) >= batch_size:
+                    count += self._load(rows)
+                    rows = []
+        count += self._load(rows)
+        self._evict()
+        return count
+
+    def _load(self, rows):
+        if rows:
+            with self._transaction() as conn:
+                _upsert(conn, rows)
+        return len(rows)
+
+    def dump(self, path):
+        """
+        Write every stored object to an NDJSON file readable by `warm`.
+        """
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'wt', encoding='utf-8') as f:
+            for type, id, market, value in self._connection().execute(
+                    'SELECT type, id, market, value FROM objects'):
+                f.write('{{"type":{},"id":{},"market":{},"object":{}}}\n'.format(
+                    json.dumps(type), json.dumps(id), json.dumps(market), value
+                ))
+
+    def size(self):
+        """
+        Total bytes of stored JSON.
+        """
+        return self._connection().execute(
+            "SELECT value FROM meta WHERE key = 'bytes'"
+        ).fetchone()[0]
+
+    def __len__(self):
+        return self._connection().execute('SELECT count(*) FROM objects').fetchone()[0]
+
+    def _evict(self):
+        if self.max_bytes is None or self.size() <= self.max_bytes:
+            return
+        # Down to 90% so every put doesn't evict
+        target = self.max_bytes * 0.9
+        with self._transaction() as conn:
+            excess = conn.execute("SELECT value FROM meta WHERE key = 'bytes'").fetchone()[0]
+            excess -= target
+            # Just the oldest objects adding up to the excess
+            oldest = []
+            rows = conn.execute('SELECT type, id, market, size FROM objects ORDER BY accessed')
+            for type, id, market, size in rows:
+                if excess <= 0:
+                    break
+                oldest.append((type, id, market))
+                excess -= size
+            rows.close()
+            conn.executemany(
+                'DELETE FROM objects WHERE type = ? AND id = ? AND market = ?', oldest
+            )
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'objects': len(self),
+                'bytes': self.size()}
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def _upsert(conn, rows):
+    conn.executemany(
+        'INSERT INTO objects (type, id, market, value, size, accessed) '
+        'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (type, id, market) DO UPDATE SET '
+        'value = excluded.value, size = excluded.size, accessed = excluded.accessed',
+        rows
+    )
+
+
+class _Transaction:
+    # Write transaction taking the database lock up front
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type is not None else 'COMMIT')
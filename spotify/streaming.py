@@ -0,0 +1,127 @@
+"""
+Incremental parsing of paged responses.
+
+The body is parsed as it arrives and the paging object's `items` yielded one at
+a time, so large playlist and library pages never sit in memory whole.
+Requires `ijson` (`pip install spotify-api[stream]`).
+
+ex.
+    page = client.stream(client.api.user_playlist_tracks, user_id, playlist_id)
+    for item in page:
+        ...
+    page.total, page.next
+"""
+import ijson
+
+# Where endpoints put their paging object: (first page, following pages).
+# Pages are at the root of the response for all others, `search` puts them
+# under its type.
+PAGING_PATHS = {
+    'user_playlist': ('tracks', ''),
+    'me_following': ('artists', 'artists'),
+    'browse_featured_playlists': ('playlists', 'playlists'),
+    'browse_new_releases': ('albums', 'albums'),
+    'browse_categories': ('categories', 'categories'),
+    'browse_category_playlists': ('playlists', 'playlists'),
+}
+
+
+def paging_paths(spec):
+    """
+    `(first page, following pages)` paths of the paging object of the request `spec`.
+    """
+    if spec.endpoint == 'search':
+        types = str(spec.params['type']).split(',')
+        if len(types) != 1:
+            raise ValueError('Only searches of one type can be streamed, not {!r}'.format(
+                spec.params['type']))
+        key = types[0] + 's'
+        return key, key
+    return PAGING_PATHS.get(spec.endpoint, ('', ''))
+
+
+def _child(path, key):
+    return '{}.{}'.format(path, key) if path else key
+
+
+class StreamedPage:
+
+    def __init__(self, response, path='', load=None):
+        """
+        Args:
+            response(requests.Response): Response requested with `stream=True`
+            path(str): Dotted path of the paging object in the response, '' for the root
+            load(callable): Optional, applied to every item (ex. `models.load`)
+        """
+        self.response = response
+        self.path = path
+        self.load = load
+        self._metadata = {}
+        self._items = None
+        self._done = False
+
+    def __iter__(self):
+        if self._items is not None:
+            raise RuntimeError('A streamed page can only be iterated once')
+        self._items = self._parse()
+        return self._items
+
+    def _parse(self):
+        self.response.raw.decode_content = True
+        items_prefix = _child(self.path, 'items')
+        item_prefix = _child(items_prefix, 'item')
+        events = ijson.parse(self.response.raw, use_float=True)
+        try:
+            for prefix, event, value in events:
+                if prefix == item_prefix:
+                    item = self._build(events, event, value)
+                    yield item if self.load is None else self.load(item)
+                elif (event != 'map_key' and prefix != items_prefix
+                        and prefix.rpartition('.')[0] == self.path and prefix != self.path):
+                    # A field of the paging object
+                    key = prefix.rpartition('.')[2]
+                    self._metadata[key] = self._build(events, event, value)
+        finally:
+            self._done = True
+            self.response.close()
+
+    @staticmethod
+    def _build(events, event, value):
+        # Builds the value starting with (`event`, `value`) from the events that follow
+        if event not in ('start_map', 'start_array'):
+            return value
+        builder = ijson.ObjectBuilder()
+        builder.event(event, value)
+        depth = 1
+        for _, event, value in events:
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+                if depth == 0:
+                    break
+        return builder.value
+
+    def _finish(self):
+        # Metadata may follow the items, consume whatever is left
+        if not self._done:
+            for _ in (self._items if self._items is not None else iter(self)):
+                pass
+
+    @property
+    def metadata(self):
+        """
+        Fields of the paging object other than `items` (total, next, offset, ...).
+        Spotify sends these after the items, items not iterated yet are skipped.
+        """
+        self._finish()
+        return self._metadata
+
+    @property
+    def total(self):
+        return self.metadata.get('total')
+
+    @property
+    def next(self):
+        return self.metadata.get('next')
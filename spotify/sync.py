@@ -0,0 +1,188 @@
+"""
+Incremental playlist sync against a local SQLite index.
+
+The index holds every synced playlist's `snapshot_id` and ordered track URIs.
+A sync lists the playlists, skips those whose snapshot is unchanged and
+fetches the tracks of the others with a minimal `fields` projection,
+returning what changed in each.
+
+ex.
+    sync = PlaylistSync(client, 'playlists.db')
+    for diff in sync.sync():
+        print(diff.name, len(diff.added), len(diff.removed), len(diff.moved))
+"""
+import sqlite3
+from bisect import bisect_left
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+TRACK_FIELDS = 'items(track(uri)),limit,offset,total,next'
+
+PlaylistDiff = namedtuple('PlaylistDiff', (
+    'playlist_id', 'name', 'old_snapshot_id', 'snapshot_id', 'added', 'removed', 'moved'
+))
+PlaylistDiff.__doc__ = """
+Changes to a playlist since the last sync.
+`added` and `removed` are lists of `(position, uri)`, positions in the new and
+old track list respectively. `moved` is a list of `(old_position, new_position, uri)`.
+A deleted (or unfollowed) playlist has `snapshot_id` None and all tracks removed.
+"""
+
+
+def diff_tracks(old, new):
+    """
+    Compare two ordered lists of URIs.
+    Returns `(added, removed, moved)` as described on `PlaylistDiff`.
+    """
+    # Pair up occurrences of each uri in order, the rest were added or removed
+    old_positions = defaultdict(list)
+    for position, uri in enumerate(old):
+        old_positions[uri].append(position)
+    remaining = Counter(old)
+    kept = []  # (old_position, new_position, uri)
+    added = []
+    used = defaultdict(int)
+    for position, uri in enumerate(new):
+        if remaining[uri] > 0:
+            remaining[uri] -= 1
+            kept.append((old_positions[uri][used[uri]], position, uri))
+            used[uri] += 1
+        else:
+            added.append((position, uri))
+    removed = [
+        (position, uri) for uri, positions in old_positions.items()
+        for position in positions[used[uri]:]
+    ]
+    removed.sort()
+    # Tracks outside the longest run that kept its relative order were moved
+    in_order = set(_longest_increasing(kept))
+    moved = [k for i, k in enumerate(kept) if i not in in_order]
+    return added, removed, moved
+
+
+def _longest_increasing(kept):
+    # Indexes into `kept` of a longest subsequence with increasing old positions
+    tails, tail_indexes, previous = [], [], [None] * len(kept)
+    for i, (old_position, _, _) in enumerate(kept):
+        j = bisect_left(tails, old_position)
+        if j == len(tails):
+            tails.append(old_position)
+            tail_indexes.append(i)
+        else:
+            tails[j] = old_position
+            tail_indexes[j] = i
+        previous[i] = tail_indexes[j - 1] if j else None
+    result = []
+    i = tail_indexes[-1] if tail_indexes else None
+    while i is not None:
+        result.append(i)
+        i = previous[i]
+    return result
+
+
+class PlaylistSync:
+
+    def __init__(self, client, path, concurrency=4, prefetch=4):
+        """
+        Args:
+            client(Client): Client authorized to read the playlists, returning dicts
+                (not `models`)
+            path(str): SQLite database file of the index
+            concurrency(int): Playlists fetched at once
+            prefetch(int): Pages fetched ahead within each playlist
+        """
+        self.client = client
+        self.path = path
+        self.concurrency = concurrency
+        self.prefetch = prefetch
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS playlists ('
+            'listing TEXT, id TEXT, owner_id TEXT, name TEXT, snapshot_id TEXT, uris TEXT, '
+            'PRIMARY KEY (listing, id))'
+        )
+
+    def close(self):
+        self._db.close()
+
+    def indexed(self, playlist_id, user_id=None):
+        """
+        Returns `(snapshot_id, uris)` of a playlist indexed by syncing the current
+        user's playlists, or those of `user_id`, or None.
+        """
+        row = self._db.execute(
+            'SELECT snapshot_id, uris FROM playlists WHERE listing = ? AND id = ?',
+            (user_id or '', playlist_id)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], _split(row[1])
+
+    def sync(self, user_id=None):
+        """
+        Sync the current user's playlists, or those of `user_id`.
+        Returns a list of `PlaylistDiff` for the playlists that changed.
+        """
+        api = self.client.api
+        if user_id is None:
+            listing = self.client.paginate(api.me_playlists, limit=50, prefetch=self.prefetch)
+        else:
+            listing = self.client.paginate(
+                api.user_playlists, user_id, limit=50, prefetch=self.prefetch
+            )
+        playlists = list(listing)
+        # Playlists are indexed per listing, so syncing another user doesn't drop them
+        listing_key = user_id or ''
+        known = {
+            row[0]: (row[1], row[2], _split(row[3]))
+            for row in self._db.execute(
+                'SELECT id, snapshot_id, name, uris FROM playlists WHERE listing = ?',
+                (listing_key,)
+            )
+        }
+
+        changed = [p for p in playlists
+                   if p['id'] not in known or known[p['id']][0] != p['snapshot_id']]
+        # Everything is fetched before the index is written, a failed fetch
+        # leaves it as it was
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            fetched = list(executor.map(self._track_uris, changed))
+        diffs = []
+        with self._db:
+            for playlist, uris in zip(changed, fetched):
+                old_snapshot, _, old_uris = known.get(playlist['id'], (None, None, []))
+                added, removed, moved = diff_tracks(old_uris, uris)
+                diffs.append(PlaylistDiff(
+                    playlist['id'], playlist['name'], old_snapshot, playlist['snapshot_id'],
+                    added, removed, moved
+                ))
+                self._db.execute(
+                    'INSERT OR REPLACE INTO playlists '
+                    '(listing, id, owner_id, name, snapshot_id, uris) VALUES (?, ?, ?, ?, ?, ?)',
+                    (listing_key, playlist['id'], playlist['owner']['id'], playlist['name'],
+                     playlist['snapshot_id'], '\n'.join(uris))
+                )
+
+            listed = {p['id'] for p in playlists}
+            for playlist_id, (old_snapshot, name, old_uris) in known.items():
+                if playlist_id not in listed:
+                    diffs.append(PlaylistDiff(
+                        playlist_id, name, old_snapshot, None, [], list(enumerate(old_uris)), []
+                    ))
+                    self._db.execute(
+                        'DELETE FROM playlists WHERE listing = ? AND id = ?',
+                        (listing_key, playlist_id)
+                    )
+        return diffs
+
+    def _track_uris(self, playlist):
+        items = self.client.paginate(
+            self.client.api.user_playlist_tracks, playlist['owner']['id'], playlist['id'],
+            fields=TRACK_FIELDS, limit=100, prefetch=self.prefetch
+        )
+        # Removed tracks come back as null, keep their place
+        return [(item.get('track') or {}).get('uri') or '' for item in items]
+
+
+def _split(uris):
+    return uris.split('\n') if uris else []
@@ -0,0 +1,148 @@
+"""
+Token stores shared between processes.
+
+Give every `OAuth` on a host the same store and they share one token,
+the first process to find it expiring refreshes it while the others wait
+on the store's lock and then pick up the new token.
+
+ex.
+    auth = OAuth(CLIENT_ID, CLIENT_SECRET, auto_refresh=300,
+                 token_store=FileTokenStore('/var/run/myapp/spotify-token.json'))
+    client = Client(auth)  # Client credentials are requested on first use
+"""
+import fcntl
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+
+class TokenStore:
+    """
+    Interface of token stores.
+    """
+
+    def load(self):
+        """
+        Returns the stored token dict or None.
+        """
+        raise NotImplementedError
+
+    def save(self, token):
+        raise NotImplementedError
+
+    @contextmanager
+    def lock(self):
+        """
+        Exclusive lock across processes, held while refreshing the token.
+        `load` and `save` may be called while holding it.
+        """
+        raise NotImplementedError
+
+
+class FileTokenStore(TokenStore):
+
+    def __init__(self, path):
+        """
+        Args:
+            path(str): JSON file holding the token, `path + '.lock'` is used for locking.
+        """
+        self.path = path
+        self.lock_path = path + '.lock'
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def save(self, token):
+        # Written to a temporary file and renamed so readers never see a partial token
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.token')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(token, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @contextmanager
+    def lock(self):
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class SQLiteTokenStore(TokenStore):
+
+    def __init__(self, path, key='default', timeout=60):
+        """
+        Args:
+            path(str): SQLite database file
+            key(str): Name of the token, one database can hold several
+            timeout(float): Seconds to wait for another process holding the lock
+        """
+        self.path = path
+        self.key = key
+        self.timeout = timeout
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS spotify_tokens (key TEXT PRIMARY KEY, token TEXT)'
+            )
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+
+    @contextmanager
+    def _connection(self):
+        # The connection holding the lock when called under `lock()`
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def load(self):
+        with self._connection() as conn:
+            row = conn.execute(
+                'SELECT token FROM spotify_tokens WHERE key = ?', (self.key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, token):
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO spotify_tokens (key, token) VALUES (?, ?)',
+                (self.key, json.dumps(token))
+            )
+
+    @contextmanager
+    def lock(self):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._local.conn = conn
+            try:
+                yield
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            self._local.conn = None
+            conn.close()
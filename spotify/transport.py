@@ -0,0 +1,194 @@
+"""
+Transports sending the HTTP requests of `Client` and `OAuth`.
+
+A transport is any object with the `request` and `post` methods of
+`requests.Session`, returning responses with its interface (`status_code`,
+`headers`, `content`, `json()`, `raise_for_status()`, `raw` when streamed).
+A `requests.Session` is the default, `HTTP2Transport` multiplexes concurrent
+requests as HTTP/2 streams over a few connections.
+Requires `httpx` with HTTP/2 support (`pip install spotify-api[http2]`).
+
+ex.
+    transport = HTTP2Transport(max_connections=4)
+    auth = OAuth(client_id, client_secret, requests=transport)
+    client = Client(auth, requests_session=transport)
+    ...
+    transport.stats()
+"""
+import threading
+import weakref
+from collections import Counter
+
+import requests
+from requests.auth import HTTPBasicAuth
+
+
+class Transport:
+    """
+    Interface of transports, see the module docs.
+    """
+
+    def request(self, method, url, params=None, json=None, headers=None, data=None,
+                auth=None, stream=False, **kwargs):
+        raise NotImplementedError
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+class HTTP2Transport(Transport):
+
+    def __init__(self, max_connections=4, http1=True, timeout=30, client=None):
+        """
+        Args:
+            max_connections(int): Connections per host, each carrying many
+                concurrent streams
+            http1(bool): Allow falling back to HTTP/1.1 for servers without HTTP/2,
+                False for HTTP/2 without TLS (prior knowledge)
+            timeout(float): Seconds to wait for the connection and each read
+            client(httpx.Client): Optional, replaces the client built from the above
+        """
+        import httpx
+        self.client = client or httpx.Client(
+            http1=http1, http2=True, timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections)
+        )
+        self._lock = threading.Lock()
+        # Network streams of the open connections, `connections` counts every one seen.
+        # Held weakly, a closed connection's stream may be freed and its id reused
+        self._streams = weakref.WeakSet()
+        self._versions = Counter()
+        self.connections = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def request(self, method, url, params=None, json=None, headers=None, data=None,
+                auth=None, stream=False, **kwargs):
+        if isinstance(auth, HTTPBasicAuth):
+            auth = (auth.username, auth.password)
+        content = None
+        if isinstance(data, (str, bytes)):
+            content, data = data, None
+        request = self.client.build_request(
+            method, url, params=params, json=json, headers=headers, data=data, content=content
+        )
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            response = self.client.send(request, auth=auth, stream=stream)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        with self._lock:
+            self._versions[response.http_version] += 1
+            network_stream = response.extensions.get('network_stream')
+            if network_stream is not None and network_stream not in self._streams:
+                self._streams.add(network_stream)
+                self.connections += 1
+        return _Response(response)
+
+    def stats(self):
+        """
+        `requests` sent, `connections` used for them, `requests_per_connection`
+        on average, the most requests `max_in_flight` at once and the count of
+        responses per HTTP version.
+        """
+        with self._lock:
+            connections = self.connections
+            return {
+                'requests': self.requests,
+                'connections': connections,
+                'requests_per_connection': self.requests / connections if connections else 0.0,
+                'max_in_flight': self.max_in_flight,
+                'http_versions': dict(self._versions),
+            }
+
+    def close(self):
+        self.client.close()
+
+
+class _Response:
+    # `httpx.Response` with the `requests.Response` interface used by the clients
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.reason = response.reason_phrase
+        self.http_version = response.http_version
+        self._raw = None
+
+    @property
+    def content(self):
+        return self._response.read()
+
+    @property
+    def text(self):
+        self._response.read()
+        return self._response.text
+
+    def json(self):
+        self._response.read()
+        return self._response.json()
+
+    @property
+    def elapsed(self):
+        try:
+            return self._response.elapsed
+        except RuntimeError:
+            # Only known once a streamed response is closed
+            return None
+
+    @property
+    def raw(self):
+        if self._raw is None:
+            self._raw = _RawStream(self._response)
+        return self._raw
+
+    def close(self):
+        self._response.close()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            kind = 'Client' if self.status_code < 500 else 'Server'
+            raise requests.HTTPError(
+                '{} {} Error: {} for url: {}'.format(self.status_code, kind, self.reason, self.url),
+                response=self
+            )
+
+
+class _RawStream:
+    # File-like reader of a streamed response's decoded body
+
+    decode_content = True
+
+    def __init__(self, response):
+        self._chunks = response.iter_bytes()
+        self._buffer = bytearray()
+        self._offset = 0  # Start of the unread bytes in `_buffer`
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) - self._offset < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        end = len(self._buffer) if size < 0 else min(self._offset + size, len(self._buffer))
+        data = bytes(self._buffer[self._offset:end])
+        self._offset = end
+        if self._offset * 2 >= len(self._buffer):
+            # Drop the read bytes once they're at least half the buffer, amortized linear
+            del self._buffer[:self._offset]
+            self._offset = 0
+        return data
@@ -1,22 +1,68 @@
+import asyncio
+import inspect
+import json
 import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
+import requests
+from requests import HTTPError
 
 from spotify.auth import OAuth
+from spotify import chunking, endpoints, mutation, paging
+from spotify.cache import ResponseCache
 from spotify.client import Client
+from spotify.export import SOURCES, LibraryExporter, NDJSONWriter
+from spotify.execution import ChunkedSpec
+from spotify.history import HistoryPoller
+from spotify.instrumentation import SECONDS_BUCKETS, Histogram, Metrics, RequestEvent
+from spotify.mutation import Edit, PlaylistEditor
+from spotify.projection import Projection, compile_fields
+from spotify.scheduler import RequestScheduler
+from spotify.search import CatalogSearch
+from spotify.spec import RequestSpec
+from spotify.store import CatalogStore
+from spotify.sync import PlaylistSync, diff_tracks
+from spotify.tokenstore import FileTokenStore
 
-CLIENT_ID = os.environ['SPOTAPI_CLIENT_ID']
-CLIENT_SECRET = os.environ['SPOTAPI_CLIENT_SECRET']
-REFRESH_TOKEN = os.environ['SPOTAPI_REFRESH_TOKEN']
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from mock_server import MockSpotify, derive_id  # noqa: E402
+
+CLIENT_ID = os.environ.get('SPOTAPI_CLIENT_ID')
+CLIENT_SECRET = os.environ.get('SPOTAPI_CLIENT_SECRET')
+REFRESH_TOKEN = os.environ.get('SPOTAPI_REFRESH_TOKEN')
 FRANK_ZAPPA = '6ra4GIOgCZQZMOaUECftGN'
 
 
 @pytest.fixture
 def spotify_auth():
+    if not CLIENT_ID:
+        pytest.skip('SPOTAPI_* credentials are needed for tests against the live API')
     auth = OAuth(CLIENT_ID, CLIENT_SECRET)
     return auth
 
 
+@pytest.fixture
+def mock_server():
+    """
+    Local stand-in for the Spotify API (see benchmarks/mock_server.py).
+    """
+    with MockSpotify(total=200, seed=0) as server:
+        yield server
+
+
+@pytest.fixture
+def mock_client(mock_server):
+    """
+    Client of `mock_server`, authorized with client credentials.
+    """
+    return mock_server.client()
+
+
 @pytest.fixture
 def ccspotify(spotify_auth):
     """
@@ -32,3 +78,764 @@ def test_get_artist(ccspotify):
     frank = ccspotify.api.artist(FRANK_ZAPPA)
     assert frank['name'] == 'Frank Zappa'
     assert frank['type'] == 'artist'
+
+
+def test_paginate_artist_albums(ccspotify):
+    albums = list(ccspotify.paginate(ccspotify.api.artist_albums, FRANK_ZAPPA, limit=10))
+    first_page = ccspotify.api.artist_albums(FRANK_ZAPPA, limit=10)
+    assert len(albums) == first_page['total']
+    assert [a['id'] for a in albums[:10]] == [a['id'] for a in first_page['items']]
+
+
+def test_tracks_chunked(ccspotify):
+    top_tracks = ccspotify.api.artist_top_tracks(FRANK_ZAPPA, 'US')['tracks']
+    track_ids = [t['id'] for t in top_tracks] * 12 + ['0000000000000000000000']
+    tracks = ccspotify.api.tracks(track_ids)['tracks']
+    assert len(tracks) == len(track_ids)
+    assert [t['id'] for t in tracks[:-1]] == track_ids[:-1]
+    assert tracks[-1] is None
+
+
+def test_api_class_shared():
+    auth = OAuth('CLIENT_ID', 'CLIENT_SECRET')
+    a, b = Client(auth), Client(auth)
+    assert type(a.api) is type(b.api)
+    assert a.api.client is a and b.api.client is b
+    assert not hasattr(a.api, '__dict__')
+    assert list(inspect.signature(a.api.tracks).parameters) == ['ids', 'market']
+    # Clients without their own session pool connections and threads
+    assert a.session is b.session
+    assert a.executor is b.executor
+    session = requests.Session()
+    assert Client(auth, requests_session=session).session is session
+
+
+def test_mock_api_methods(mock_server):
+    mock_server.log = []
+    client = mock_server.client()
+    assert client.api.track(derive_id('track', 1))['id'] == derive_id('track', 1)
+    track_ids = [derive_id('track', i) for i in range(120)]
+    assert [t['id'] for t in client.api.tracks(track_ids)['tracks']] == track_ids
+    assert client.api.request('GET', '/tracks/' + track_ids[0])['id'] == track_ids[0]
+    # One request per chunk of 50 ids
+    assert [path for _, path, _ in mock_server.log] == (
+        ['/v1/tracks/' + derive_id('track', 1)] + ['/v1/tracks'] * 3
+        + ['/v1/tracks/' + track_ids[0]]
+    )
+
+
+def test_request_spec():
+    spec = endpoints.search('q', 'track', limit=20)
+    assert isinstance(spec, RequestSpec)
+    assert not hasattr(spec, '__dict__')
+    assert (spec.method, spec.url, spec.endpoint) == ('GET', '/search', 'search')
+    # None params are dropped, unset fields aren't keys
+    assert spec.params == {'q': 'q', 'type': 'track', 'limit': 20, 'offset': 0}
+    assert dict(spec) == {'method': 'GET', 'url': '/search', 'params': spec.params,
+                          'endpoint': 'search'}
+    with pytest.raises(KeyError):
+        spec['payload']
+    moved = spec.replace(url='/other')
+    assert moved.url == '/other' and spec.url == '/search' and moved.params == spec.params
+
+
+def test_paging_specs():
+    spec = endpoints.search('q', 'track', limit=30)
+    page = {'items': [None] * 30, 'limit': 30, 'offset': 0, 'total': 5000,
+            'next': 'https://api.spotify.com/v1/search?offset=30'}
+    offsets = paging.remaining_offsets(page, 'search')
+    assert (offsets[0], offsets[-1]) == (30, 990)
+    # The last page stops at the offset limit
+    assert paging.offset_spec(spec, 990).params == dict(spec.params, offset=990, limit=10)
+    assert paging.next_spec(spec, page).url == page['next']
+    assert paging.next_spec(spec, dict(page, next=None)) is None
+    assert paging.paging_objects({'tracks': page, 'href': ''}) == [('tracks', page)]
+
+
+def test_chunking_specs():
+    track_ids = [derive_id('track', i) for i in range(120)]
+    specs, key = chunking.split(endpoints.tracks, (track_ids,), {'market': 'SE'})
+    assert key == 'tracks'
+    assert [spec.params['ids'].split(',') for spec in specs] == \
+        [track_ids[:50], track_ids[50:100], track_ids[100:]]
+    assert all(spec.params['market'] == 'SE' for spec in specs)
+    responses = [{'tracks': ids[:2]} for ids in (track_ids[:50], track_ids[50:])]
+    assert chunking.merge(responses, key) == {'tracks': track_ids[:2] + track_ids[50:52]}
+
+
+def test_mock_get_artist(mock_client):
+    artist = mock_client.api.artist(derive_id('artist', 1))
+    assert artist['id'] == derive_id('artist', 1)
+    assert artist['type'] == 'artist'
+
+
+def test_mock_paginate(mock_client):
+    items = list(mock_client.paginate(mock_client.api.me_tracks, limit=50))
+    assert len(items) == 200
+    assert items[0] == mock_client.api.me_tracks(limit=1)['items'][0]
+
+
+@pytest.mark.parametrize('endpoint, args', [
+    ('me_tracks', ()),
+    ('browse_new_releases', ()),
+    ('browse_category_playlists', ('mock',)),
+    ('search', ('q', 'album')),
+])
+def test_mock_paginate_stream(mock_client, endpoint, args):
+    pytest.importorskip('ijson')
+    endpoint = getattr(mock_client.api, endpoint)
+    items = list(mock_client.paginate(endpoint, *args, limit=50))
+    assert items
+    assert list(mock_client.paginate(endpoint, *args, limit=50, stream=True)) == items
+    page = mock_client.stream(endpoint, *args, limit=50)
+    assert list(page) == items[:50]
+    assert 'items' not in page.metadata
+    assert page.total == len(items)
+
+
+def test_mock_stream_search_types(mock_client):
+    pytest.importorskip('ijson')
+    with pytest.raises(ValueError):
+        mock_client.stream(mock_client.api.search, 'q', 'album,track')
+
+
+def test_mock_tracks_chunked(mock_client):
+    track_ids = [derive_id('track', i) for i in range(120)] + ['0000000000000000000000']
+    tracks = mock_client.api.tracks(track_ids)['tracks']
+    assert [t['id'] for t in tracks[:-1]] == track_ids[:-1]
+    assert tracks[-1] is None
+
+
+def test_mock_http2_transport(mock_server):
+    pytest.importorskip('httpx')
+    pytest.importorskip('ijson')
+    from spotify.transport import HTTP2Transport
+    # The mock server speaks HTTP/1.1, the transport falls back to it
+    transport = HTTP2Transport(max_connections=2)
+    client = mock_server.client(
+        mock_server.auth(requests=transport), requests_session=transport
+    )
+    items = list(client.paginate(client.api.me_tracks, limit=50, prefetch=4))
+    assert len(items) == 200
+    assert list(client.paginate(client.api.me_tracks, limit=50, stream=True)) == items
+    track_ids = [derive_id('track', i) for i in range(120)]
+    assert [t['id'] for t in client.api.tracks(track_ids)['tracks']] == track_ids
+    stats = transport.stats()
+    assert stats['requests'] == mock_server.counts['requests'] + mock_server.counts['token']
+    assert 1 <= stats['connections'] <= 2
+    assert stats['http_versions'] == {'HTTP/1.1': stats['requests']}
+    transport.close()
+
+
+def test_raw_stream_reads():
+    from spotify.transport import _RawStream
+
+    class Response:
+        def iter_bytes(self):
+            return iter([b'abc', b'defgh', b'', b'ij'])
+    raw = _RawStream(Response())
+    assert [raw.read(2), raw.read(4), raw.read(1)] == [b'ab', b'cdef', b'g']
+    assert raw.read() == b'hij'
+    assert raw.read(3) == b''
+
+
+def test_mock_paginate_search_offset_limit(mock_server):
+    mock_server.catalog.total = 3000
+    client = mock_server.client()
+    items = list(client.paginate(client.api.search, 'q', 'track', limit=30))
+    assert len(items) == 1000
+    assert len({item['id'] for item in items}) == 1000
+
+
+def test_mock_async_paginate_search_offset_limit(mock_server):
+    from spotify.aio import AsyncClient
+
+    async def run():
+        client = mock_server.client(client_class=AsyncClient)
+        try:
+            return [item async for item in client.paginate(client.api.search, 'q', 'track')]
+        finally:
+            await client.close()
+
+    mock_server.catalog.total = 3000
+    assert len(asyncio.run(run())) == 1000
+
+
+def test_mock_catalog_search(mock_server):
+    mock_server.catalog.total = 3000
+    search = CatalogSearch(mock_server.client(), concurrency=8)
+    # Both markets find the same albums, each is yielded once
+    albums = list(search.search('q', types=('album',), markets=(None, 'SE')))
+    assert sorted(album['id'] for album in albums) == \
+        sorted(mock_server.catalog.search_ids('q', 'album'))
+    assert search.partitions > 2
+    assert search.truncated == []
+
+
+def test_mock_comma_separated_ids(mock_client):
+    track_ids = [derive_id('track', i) for i in range(3)]
+    assert mock_client.api.me_tracks_contains(','.join(track_ids)) == \
+        mock_client.api.me_tracks_contains(track_ids)
+    assert len(mock_client.api.me_tracks_contains(','.join(track_ids))) == 3
+
+
+def test_mock_batched_lookups(mock_server):
+    client = mock_server.client(batch_window=0.05)
+    track_ids = [derive_id('track', i % 4) for i in range(16)]
+    barrier = threading.Barrier(len(track_ids))
+
+    def lookup(track_id):
+        barrier.wait()
+        return client.api.track(track_id)
+
+    requests_before = mock_server.counts['requests']
+    with ThreadPoolExecutor(len(track_ids)) as executor:
+        tracks = list(executor.map(lookup, track_ids))
+    assert [track['id'] for track in tracks] == track_ids
+    assert mock_server.counts['requests'] - requests_before == 1
+
+
+def test_mock_response_cache(mock_server):
+    cache = ResponseCache(maxsize=2)
+    client = mock_server.client(cache=cache)
+    first, second, third = (derive_id('track', i) for i in range(3))
+
+    track = client.api.track(first)
+    assert client.api.track(first) is track
+    client.api.track(second)
+    client.api.track(third)
+    assert cache.stats() == {'size': 2, 'hits': 1, 'misses': 3, 'revalidations': 0,
+                             'evictions': 1}
+
+    requests_before = mock_server.counts['requests']
+    client.api.track(first)
+    assert mock_server.counts['requests'] - requests_before == 1
+    assert cache.misses == 4
+
+
+def test_mock_response_cache_revalidation(mock_server):
+    cache = ResponseCache()
+    client = mock_server.client(cache=cache)
+    playlist = client.api.user_playlist('mock-user', derive_id('playlist', 1))
+    assert client.api.user_playlist('mock-user', derive_id('playlist', 1)) is playlist
+    assert cache.revalidations == 1
+    assert mock_server.counts['not_modified'] == 1
+
+
+def test_mock_single_token_refresh(mock_server, tmp_path):
+    # Expires within the refresh margin, every client wants to refresh it at once
+    token = mock_server.user_token('mock-user', expires_in=60)
+    store = FileTokenStore(str(tmp_path / 'token.json'))
+    store.save(token)
+    clients = [
+        mock_server.client(mock_server.auth(dict(token), auto_refresh=300, token_store=store))
+        for _ in range(4)
+    ]
+    callers = [client for client in clients for _ in range(4)]
+    barrier = threading.Barrier(len(callers))
+
+    def lookup(client):
+        barrier.wait()
+        return client.api.track(derive_id('track', 1))
+
+    with ThreadPoolExecutor(len(callers)) as executor:
+        list(executor.map(lookup, callers))
+    assert mock_server.counts['token'] == 1
+    assert len({client.auth.token['access_token'] for client in clients}) == 1
+    assert store.load()['access_token'] != token['access_token']
+
+
+def test_mock_scheduler_waits_full_retry_after(mock_server):
+    mock_server.throttle = 1.0
+    mock_server.retry_after = 0.3
+    scheduler = RequestScheduler(max_retries=1, max_backoff=0.05)
+    client = mock_server.client(scheduler=scheduler)
+    started = time.monotonic()
+    with pytest.raises(HTTPError):
+        client.api.track(derive_id('track', 1))
+    assert time.monotonic() - started >= 0.3
+    assert scheduler.retries == 1
+
+
+def test_mock_scheduler_returns_long_retry_after(mock_server):
+    mock_server.throttle = 1.0
+    mock_server.retry_after = 3600
+    scheduler = RequestScheduler(max_retry_after=1)
+    client = mock_server.client(scheduler=scheduler)
+    started = time.monotonic()
+    with pytest.raises(HTTPError) as error:
+        client.api.track(derive_id('track', 1))
+    assert error.value.response.status_code == 429
+    assert time.monotonic() - started < 1
+    assert scheduler.retries == 0
+
+
+def test_mock_models(mock_server):
+    client = mock_server.client(models=True)
+    plain = mock_server.client()
+    track_ids = [derive_id('track', i) for i in range(2)]
+    tracks = client.api.tracks(track_ids)['tracks']
+    assert [track.to_dict() for track in tracks] == plain.api.tracks(track_ids)['tracks']
+    assert tracks[0].album.artists[0].type == 'artist'
+    assert tracks[0].available_markets is tracks[1].available_markets
+    assert tracks[0].linked_from is None
+
+
+def test_diff_tracks():
+    assert diff_tracks(['a', 'b'], ['a', 'b']) == ([], [], [])
+    assert diff_tracks([], ['a', 'a']) == ([(0, 'a'), (1, 'a')], [], [])
+    assert diff_tracks(['a', 'b'], []) == ([], [(0, 'a'), (1, 'b')], [])
+    added, removed, moved = diff_tracks(['a', 'b', 'c', 'd'], ['b', 'a', 'c', 'e', 'c'])
+    assert added == [(3, 'e'), (4, 'c')]
+    assert removed == [(3, 'd')]
+    assert moved == [(1, 0, 'b')]
+
+
+def test_mock_playlist_sync(mock_server, tmp_path):
+    mock_server.catalog.total = 5
+    sync = PlaylistSync(mock_server.client(), str(tmp_path / 'playlists.db'))
+    diffs = sync.sync()
+    assert len(diffs) == 5
+    assert all(diff.old_snapshot_id is None and len(diff.added) == 5 for diff in diffs)
+    assert sync.sync() == []
+    # The same playlists listed as the user's are indexed on their own
+    assert len(sync.sync('mock-user')) == 5
+    assert sync.sync() == []
+
+    playlist_id = diffs[0].playlist_id
+    snapshot_id, uris = sync.indexed(playlist_id)
+    assert sync.indexed(playlist_id, 'mock-user') == (snapshot_id, uris)
+    sync._db.execute(
+        'UPDATE playlists SET snapshot_id = ?, uris = ? WHERE listing = ? AND id = ?',
+        ('old', '\n'.join([uris[1], uris[0]] + uris[2:4]), '', playlist_id)
+    )
+    diff, = sync.sync()
+    assert (diff.old_snapshot_id, diff.snapshot_id) == ('old', snapshot_id)
+    assert diff.added == [(4, uris[4])]
+    assert diff.removed == []
+    assert len(diff.moved) == 1
+
+    mock_server.catalog.total = 4
+    diff, = sync.sync()
+    assert diff.snapshot_id is None
+    assert len(diff.removed) == 5
+    assert sync.indexed(diff.playlist_id) is None
+    assert sync.indexed(diff.playlist_id, 'mock-user') is not None
+    sync.close()
+
+
+def test_mock_playlist_sync_failure(mock_server, tmp_path):
+    mock_server.catalog.total = 5
+    sync = PlaylistSync(mock_server.client(), str(tmp_path / 'playlists.db'), concurrency=1)
+    track_uris = sync._track_uris
+    calls = []
+
+    def failing(playlist):
+        calls.append(playlist['id'])
+        if len(calls) == 3:
+            raise HTTPError('503 Server Error')
+        return track_uris(playlist)
+    sync._track_uris = failing
+    with pytest.raises(HTTPError):
+        sync.sync()
+    del sync._track_uris
+    assert len(sync.sync()) == 5
+    sync.close()
+
+
+def test_mock_export_ndjson(mock_server, tmp_path):
+    mock_server.catalog.total = 5
+    exporter = LibraryExporter(mock_server.client(), NDJSONWriter(str(tmp_path)), batch_size=7)
+    stats = exporter.export()
+    rows = {}
+    for name in os.listdir(str(tmp_path)):
+        with open(str(tmp_path / name), encoding='utf-8') as f:
+            rows[name[:-len('.ndjson')]] = [json.loads(line) for line in f]
+    assert {table: len(table_rows) for table, table_rows in rows.items()} == stats['rows'] == {
+        'tracks': 30, 'albums': 5, 'artists': 5, 'playlists': 5, 'audio_features': 30
+    }
+    sources = [row['source'] for row in rows['tracks']]
+    assert sources.count('saved_tracks') == 5 and sources.count('playlists') == 25
+    assert set(sources) <= set(SOURCES)
+    assert len({row['track_id'] for row in rows['audio_features']}) == 30
+
+
+def test_plan_playlist_edits():
+    uris = ['spotify:track:{}'.format(derive_id('track', i)) for i in range(250)]
+    specs = mutation.plan(Edit('replace', 'user', 'playlist', uris))
+    assert [spec.method for spec in specs] == ['PUT', 'POST', 'POST']
+    assert [len(spec.payload['uris']) for spec in specs] == [100, 100, 50]
+    specs = mutation.plan(Edit('replace', 'user', 'playlist', []))
+    assert [(spec.method, spec.payload['uris']) for spec in specs] == [('PUT', [])]
+    assert [len(spec.payload['uris']) for spec in
+            mutation.plan(Edit('append', 'user', 'playlist', uris[:200]))] == [100, 100]
+
+    specs = mutation.plan(Edit('insert', 'user', 'playlist', uris, 5))
+    assert [spec.payload['position'] for spec in specs] == [5, 105, 205]
+    with pytest.raises(ValueError):
+        mutation.plan(Edit('insert', 'user', 'playlist', uris))
+
+    specs = mutation.plan(Edit('remove', 'user', 'playlist', uris[:150] + uris[:150]))
+    assert [len(spec.payload['tracks']) for spec in specs] == [100, 50]
+
+    pairs = [(uris[i % 10], i) for i in range(150)]
+    specs = mutation.plan(Edit('remove_positions', 'user', 'playlist', pairs))
+    positions = [[p for track in spec.payload['tracks'] for p in track['positions']]
+                 for spec in specs]
+    assert [len(p) for p in positions] == [100, 50]
+    assert min(positions[0]) > max(positions[1])
+    assert sorted(positions[0] + positions[1]) == list(range(150))
+
+
+def test_mock_playlist_editor(mock_server):
+    uris = ['spotify:track:{}'.format(derive_id('track', i)) for i in range(150)]
+    editor = PlaylistEditor(mock_server.client())
+    mock_server.log = []
+    positions = [(uri, i) for i, uri in enumerate(uris)]
+    result, = editor.run([
+        Edit('replace', 'mock-user', 'playlist', uris),
+        Edit('remove_positions', 'mock-user', 'playlist', positions),
+    ])
+    assert result.error is None
+    assert [method for method, _, _ in mock_server.log] == ['PUT', 'POST', 'DELETE', 'DELETE']
+    assert mock_server.log[0][2]['uris'] == uris[:100]
+    assert mock_server.log[1][2]['uris'] == uris[100:]
+    # Each removal applies to the snapshot the previous call returned
+    assert [body['snapshot_id'] for _, _, body in mock_server.log[2:]] == [
+        derive_id('snapshot', 2), derive_id('snapshot', 3)]
+    assert (result.snapshot_id, result.requests) == (derive_id('snapshot', 4), 4)
+
+
+def test_mock_history_poller(mock_server):
+    mock_server.listen('alice', 0.05)
+
+    def poll(after=None, seconds=0.5):
+        poller = HistoryPoller('CLIENT_ID', 'CLIENT_SECRET', min_interval=0.1, max_interval=0.1,
+                               jitter=0, requests_session=mock_server.session())
+        poller.add_user('alice', mock_server.user_token('alice'), after=after)
+        user = poller._users['alice']
+        user.auth.TOKEN_URL = mock_server.url + '/api/token'
+        user.client.prefix = mock_server.url + '/v1'
+        timer = threading.Timer(seconds, poller.stop)
+        timer.start()
+        events = list(poller.events())
+        timer.join()
+        assert poller.polls >= 2
+        return [event for event in events if event.type == 'played'], poller.cursors()['alice']
+
+    time.sleep(0.2)
+    played, cursor = poll()
+    times = [event.played_at for event in played]
+    # Oldest first, no play emitted again by a later poll
+    assert len(times) >= 5
+    assert times == sorted(set(times))
+    assert cursor == times[-1]
+    assert [event.track['id'] for event in played] == \
+        [derive_id('played', 'alice', t) for t in times]
+
+    # Resuming from the cursor only emits the plays after it
+    resumed, resumed_cursor = poll(after=cursor)
+    resumed_times = [event.played_at for event in resumed]
+    assert resumed_times and resumed_times[0] > cursor
+    assert resumed_times == sorted(set(resumed_times))
+    assert resumed_cursor == resumed_times[-1]
+
+
+def test_histogram_buckets():
+    histogram = Histogram(precision=7)
+    values = list(range(5000)) + [2 ** k + d for k in range(8, 40) for d in (-1, 0, 1)]
+    for units in values:
+        index = histogram._index(units)
+        lower, upper = histogram._lower(index), histogram._lower(index + 1)
+        assert lower <= units < upper
+        assert upper - lower <= max(1, units * 2 ** -6)
+    assert [histogram._index(units) for units in range(128)] == list(range(128))
+
+
+def test_histogram_percentiles():
+    histogram = Histogram(unit=1)
+    assert histogram.percentile(0.5) == 0.0
+    for value in range(1, 1001):
+        histogram.record(value)
+    for fraction in (0.5, 0.9, 0.99):
+        assert abs(histogram.percentile(fraction) - fraction * 1000) <= fraction * 1000 * 2 ** -6
+    assert histogram.percentile(1.0) == 1000
+    assert histogram.summary()['mean'] == 500.5
+    # Bounds at bucket edges are exact, 1000 falls in the bucket 1000 to 1007
+    assert histogram.cumulative([0, 100, 1023, 2000]) == [0, 100, 1000, 1000]
+    assert histogram.cumulative([1000]) == [999]
+
+
+def test_metrics_prometheus():
+    metrics = Metrics()
+    for seconds, status in ((0.02, 200), (0.2, 200), (0.3, 429)):
+        event = RequestEvent('track', 'GET', '/tracks/{id}')
+        event.status, event.seconds, event.ttfb, event.bytes = status, seconds, seconds, 2000
+        event.cache = 'miss'
+        metrics(event)
+    text = metrics.prometheus()
+    assert text.endswith('\n')
+    lines = text.splitlines()
+    sample = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[^}]*\})? \S+$')
+    for line in lines:
+        assert line.startswith('# HELP ') or line.startswith('# TYPE ') or sample.match(line)
+    labels = 'endpoint="track",method="GET",status="200"'
+    assert '# TYPE spotify_request_duration_seconds histogram' in lines
+    buckets = [int(line.rsplit(' ', 1)[1]) for line in lines
+               if line.startswith('spotify_request_duration_seconds_bucket{' + labels)]
+    assert len(buckets) == len(SECONDS_BUCKETS) + 1
+    assert buckets == sorted(buckets)
+    assert buckets[SECONDS_BUCKETS.index(0.025)] == 1
+    assert buckets[-1] == 2
+    assert 'spotify_request_duration_seconds_count{{{}}} 2'.format(labels) in lines
+    assert 'spotify_errors_total{endpoint="track",method="GET",status="429"} 0' in lines
+    assert 'spotify_cache_lookups_total{result="miss"} 3' in lines
+
+
+def test_catalog_store_eviction(tmp_path):
+    store = CatalogStore(str(tmp_path / 'catalog.db'))
+    objects = [('{:02d}'.format(i), {'type': 'track', 'name': 'x' * 80}) for i in range(11)]
+    store.put_many('track', objects[:10])
+    size = store.size() // 10
+    with store._transaction() as conn:
+        conn.executemany('UPDATE objects SET accessed = ? WHERE id = ?',
+                         [(i, id) for i, (id, _) in enumerate(objects[:10])])
+    store.max_bytes = 10 * size
+    store.put('track', *objects[10])
+    # Down to 90% of max_bytes, by evicting the two least recently used
+    assert sorted(store.get_many('track', [id for id, _ in objects])) == \
+        [id for id, _ in objects[2:]]
+    assert store.size() == 9 * size
+    store.close()
+
+
+def test_mock_catalog_store_ids(mock_server, tmp_path):
+    store = CatalogStore(str(tmp_path / 'catalog.db'))
+    client = mock_server.client(store=store)
+    track_ids = [derive_id('track', i) for i in range(3)]
+    tracks = client.api.tracks(','.join(track_ids))['tracks']
+    assert [track['id'] for track in tracks] == track_ids
+    requests_before = mock_server.counts['requests']
+    tracks = client.api.tracks(','.join(track_ids))['tracks']
+    assert [track['id'] for track in tracks] == track_ids
+    assert mock_server.counts['requests'] == requests_before
+    store.close()
+
+
+def test_crawl_frontier():
+    pytest.importorskip('numpy')
+    from spotify.crawl import Frontier
+
+    artist_ids = [derive_id('artist', i) for i in range(10)]
+    frontier = Frontier(block=3)
+    for i, artist_id in enumerate(artist_ids):
+        frontier.append(artist_id, i // 4)
+    frontier.append('not-an-id', 3)
+    assert len(frontier) == 11
+    assert frontier.popleft() == (artist_ids[0], 0)
+    frontier.append(artist_ids[0], 4)
+    assert [frontier.popleft() for _ in range(len(frontier))] == (
+        [(artist_id, i // 4) for i, artist_id in enumerate(artist_ids)][1:]
+        + [('not-an-id', 3), (artist_ids[0], 4)]
+    )
+    with pytest.raises(IndexError):
+        frontier.popleft()
+
+
+def test_mock_crawl_resume(mock_server, tmp_path):
+    pytest.importorskip('numpy')
+    from spotify.crawl import ArtistCrawler
+
+    checkpoint = str(tmp_path / 'graph.db')
+    seed = derive_id('artist', 1)
+    crawler = ArtistCrawler(mock_server.client(), checkpoint, max_artists=5)
+    edges = list(crawler.crawl([seed]))
+    assert len(edges) == 5 * 20
+    assert edges[0][0] == seed
+    crawler.close()
+
+    crawler = ArtistCrawler(mock_server.client(), checkpoint, max_artists=10)
+    resumed = list(crawler.crawl())
+    assert len(resumed) == 5 * 20
+    assert not set(edges) & set(resumed)
+    # Breadth first, the seed's related artists are expanded before theirs
+    related = {target for _, target in edges[:20]}
+    assert {source for source, _ in edges + resumed} <= {seed} | related
+    assert len(list(crawler.edges())) == 10 * 20
+    crawler.close()
+
+
+def test_ids_encode_decode():
+    numpy = pytest.importorskip('numpy')
+    from spotify import ids
+
+    for value in (0, 1, 61, 62, 2 ** 64 - 1, 2 ** 64, 2 ** 128 - 1):
+        id = ids.decode(value)
+        assert len(id) == ids.ID_LENGTH
+        assert ids.encode(id) == value
+        assert ids.encode('spotify:track:' + id) == value
+    assert ids.decode(0) == '0' * 22
+    track_ids = [ids.decode(value) for value in (0, 2 ** 64 - 1, 2 ** 64, 2 ** 128 - 1)]
+    track_ids += [derive_id('track', i) for i in range(100)]
+    high, low = ids.encode_many(track_ids)
+    assert high.dtype == low.dtype == numpy.uint64
+    values = [int(h) << 64 | int(l) for h, l in zip(high, low)]
+    assert values == [ids.encode(id) for id in track_ids]
+    assert ids.decode_many(high, low) == track_ids
+
+
+def test_ids_invalid():
+    pytest.importorskip('numpy')
+    from spotify import ids
+
+    too_large = ids.decode(2 ** 128 - 1)[:-1] + 'Z'
+    for invalid in ('short', '!' * 22, too_large):
+        with pytest.raises(ValueError):
+            ids.encode(invalid)
+    for invalid in ('!' * 22, too_large):
+        with pytest.raises(ValueError):
+            ids.encode_many([derive_id('track', 1), invalid])
+
+
+def test_id_set():
+    pytest.importorskip('numpy')
+    from spotify import ids
+    from spotify.ids import IdSet
+
+    a = IdSet(derive_id('track', i) for i in range(0, 60))
+    b = IdSet(derive_id('track', i) for i in range(40, 100))
+    assert len(a) == 60
+    assert IdSet([derive_id('track', 1)] * 3 + [derive_id('track', 2)]) == \
+        IdSet([derive_id('track', 2), derive_id('track', 1)])
+    assert set(a | b) == {derive_id('track', i) for i in range(100)}
+    assert set(a & b) == {derive_id('track', i) for i in range(40, 60)}
+    assert set(a - b) == {derive_id('track', i) for i in range(40)}
+    assert list(a) == sorted(a, key=ids.encode)
+    assert derive_id('track', 1) in a and derive_id('track', 99) not in a
+    assert a.contains([derive_id('track', 1), derive_id('track', 99)]).tolist() == [True, False]
+    assert IdSet(['spotify:track:' + derive_id('track', 1)]).type == 'track'
+    with pytest.raises(ValueError):
+        next(a.uris())
+
+
+def test_id_map_lookup():
+    pytest.importorskip('numpy')
+    from spotify.ids import IdMap
+
+    plays = IdMap([derive_id('track', i) for i in range(3)], [10, 20, 30])
+    assert plays[derive_id('track', 1)] == 20
+    assert plays.get(derive_id('track', 9)) is None
+    with pytest.raises(KeyError):
+        plays[derive_id('track', 9)]
+    queried = [derive_id('track', 2), derive_id('track', 9)]
+    assert plays.lookup(queried, default=0).tolist() == [30, 0]
+    assert plays.lookup(queried, default=0).dtype.kind == 'i'
+    assert plays.lookup(queried).tolist() == [30, None]
+    assert IdMap([], []).lookup(queried, default=-1).tolist() == [-1, -1]
+
+
+def test_mock_id_set_endpoint(mock_server):
+    pytest.importorskip('numpy')
+    from spotify.ids import IdSet
+
+    mock_server.log = []
+    client = mock_server.client()
+    track_ids = IdSet(derive_id('track', i) for i in range(120))
+    tracks = client.api.tracks(track_ids)['tracks']
+    assert [track['id'] for track in tracks] == list(track_ids)
+    assert len(mock_server.log) == 3
+    some = IdSet(list(track_ids)[:50], type='track')
+    client.api.user_playlist_tracks_add('mock-user', 'playlist', some)
+    assert mock_server.log[-1][2]['uris'] == ['spotify:track:' + id for id in some]
+
+
+def test_mock_execute_many_chunked(mock_server):
+    mock_server.latency = 0.1
+    client = mock_server.client()
+    track_ids = [derive_id('track', i) for i in range(200)]
+    spec = client.plan.tracks(track_ids)
+    assert isinstance(spec, ChunkedSpec)
+    started = time.monotonic()
+    result, = client.execute_many([spec])
+    # The four chunks are sent at once
+    assert time.monotonic() - started < 0.3
+    assert result.error is None
+    assert [track['id'] for track in result.result['tracks']] == track_ids
+
+
+def test_compile_fields():
+    assert compile_fields(['track.id', 'track.album.name', 'added_at']) == \
+        'track(id,album(name)),added_at'
+    # A path requested whole wins over its subpaths, in either order
+    assert compile_fields(['track', 'track.id']) == 'track'
+    assert compile_fields(['track.id', 'track']) == 'track'
+    with pytest.raises(ValueError):
+        compile_fields(['track..id'])
+
+
+def test_projection():
+    item = {'added_at': 'now', 'track': {'id': 'a', 'artists': [{'name': 'x'}, {'name': 'y'}],
+                                         'album': None}}
+    projection = Projection(['added_at', 'track.id', 'track.artists.name', 'track.album.name',
+                             'track.missing'])
+    assert projection(item) == ('now', 'a', ['x', 'y'], None, None)
+    record = Projection(['added_at', 'track.id'], records=True)(item)
+    assert (record.added_at, record.track_id) == ('now', 'a')
+    assert Projection(['track', 'track.id'])(item) == (item['track'], 'a')
+
+
+def test_mock_project(mock_server):
+    client = mock_server.client()
+    playlist_id = derive_id('playlist', 1)
+    rows = list(client.project(client.api.user_playlist_tracks,
+                               ['track.id', 'track.artists.name'], 'mock-user', playlist_id,
+                               records=True, limit=50))
+    items = list(client.paginate(client.api.user_playlist_tracks, 'mock-user', playlist_id))
+    assert len(rows) == len(items) == 200
+    assert rows[0].track_id == items[0]['track']['id']
+    artists = items[0]['track']['artists']
+    assert rows[0].track_artists_name == [artist['name'] for artist in artists]
+    name, = client.project(client.api.user_playlist, ['name'], 'mock-user', playlist_id)
+    assert name == 'Playlist ' + playlist_id[:6]
+    with pytest.raises(ValueError):
+        client.project(client.api.me_tracks, ['track.id'])
+
+
+def test_async_client_rejects_refreshing_oauth():
+    from spotify.aio import AsyncClient, AsyncOAuth
+
+    token = {'access_token': 'token', 'expires_at': time.time() + 3600}
+    with pytest.raises(ValueError):
+        AsyncClient(OAuth('id', 'secret', auto_refresh=300))
+    auth = OAuth('id', 'secret')
+    auth.token = token
+    assert asyncio.run(AsyncClient(auth).headers()) == {'Authorization': 'Bearer token'}
+
+    async def headers():
+        auth = AsyncOAuth('id', 'secret', auto_refresh=300)
+        auth.token = token
+        return await AsyncClient(auth).headers()
+    assert asyncio.run(headers()) == {'Authorization': 'Bearer token'}
+
+
+def test_mock_audio_features_matrix(mock_server, tmp_path):
+    numpy = pytest.importorskip('numpy')
+    from spotify.features import COLUMNS
+
+    client = mock_server.client()
+    track_ids = [derive_id('track', i) for i in range(150)]
+    track_ids[120] = '0' * 22  # Unknown to the mock, no features
+    cache = str(tmp_path / 'features')
+    matrix = client.audio_features_matrix(track_ids, cache=cache)
+    assert matrix.values.shape == (150, len(COLUMNS))
+    assert matrix.mask.tolist() == [i == 120 for i in range(150)]
+    assert matrix.masked().mask[120].all() and not matrix.masked().mask[0].any()
+    features = client.api.track_audio_features(track_ids[1])
+    assert matrix.column('tempo')[1] == numpy.float32(features['tempo'])
+    assert matrix[track_ids[1]][COLUMNS.index('tempo')] == numpy.float32(features['tempo'])
+
+    requests_before = mock_server.counts['requests']
+    cached = client.audio_features_matrix(track_ids, cache=cache)
+    assert mock_server.counts['requests'] == requests_before
+    assert numpy.array_equal(cached.values, matrix.values, equal_nan=True)
+    assert cached.mask.tolist() == matrix.mask.tolist()